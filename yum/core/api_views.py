@@ -2,8 +2,17 @@
 """
 Vistas API para exponer servicios web en formato JSON
 """
-from django.http import JsonResponse
-from core.models import Recipe
+import json
+
+from django.db.models import Max
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from core.conditional import conditional_response, make_etag
+from core.models import Recipe, RecipeChange
+from core.pagination import InvalidCursor, KeysetPaginator, complete_ordering
+from core.services.api_cache import get_or_build
+from core.services.change_feed import changes_since
+from core.services.ingredient_index import filter_by_ingredients
+from core.services.search import search_recipes
 
 
 def format_duration(duration):
@@ -17,10 +26,81 @@ def format_duration(duration):
     return f"{hours:02d}:{minutes:02d}:{seconds:02d}"
 
 
+def format_rating(value):
+    return float(value) if value else 0.0
+
+
+# Campos públicos de la API: nombre en la respuesta -> (campo del modelo, conversión)
+API_FIELDS = {
+    'id': ('id', None),
+    'nombre': ('title', None),
+    'tiempo_preparacion': ('preparation_time', format_duration),
+    'porciones': ('portions', None),
+    'valor_nutricional': ('nutritional_value', None),
+    'calificacion': ('media_score', format_rating),
+}
+
+DEFAULT_LIMIT = 20
+MAX_LIMIT = 100
+STREAM_CHUNK_SIZE = 500
+CHANGES_DEFAULT_LIMIT = 100
+CHANGES_MAX_LIMIT = 1000
+
+
+def parse_fields(value):
+    """
+    Campos pedidos con ?fields=nombre,porciones (todos si no se indica).
+
+    Raises:
+        ValueError: Si algún campo no existe
+    """
+    if not value:
+        return list(API_FIELDS)
+    fields = [field.strip() for field in value.split(",") if field.strip()]
+    unknown = [field for field in fields if field not in API_FIELDS]
+    if unknown or not fields:
+        raise ValueError(f"Campos desconocidos: {', '.join(unknown)}")
+    return fields
+
+
+def serialize_row(row, fields):
+    """Convierte una fila de values() en el diccionario público."""
+    data = {}
+    for field in fields:
+        column, convert = API_FIELDS[field]
+        data[field] = convert(row[column]) if convert else row[column]
+    return data
+
+
+def parse_id_list(value):
+    """
+    Convierte "1,2,3" en [1, 2, 3].
+
+    Raises:
+        ValueError: Si algún elemento no es un número
+    """
+    return [int(item) for item in value.split(",") if item.strip()]
+
+
 def recipes_api(request):
     """
-    API endpoint público que retorna todas las recetas disponibles en formato JSON.
-    
+    API endpoint público que retorna las recetas en formato JSON.
+
+    Parámetros opcionales:
+        q: Búsqueda de texto completo (título, descripción, ingredientes e
+           instrucciones); los resultados se ordenan por relevancia.
+        all, any, exclude: Ids de tipos de ingrediente separados por comas;
+           recetas con todos, con alguno o sin ninguno de ellos.
+        pantry, max_missing: Ids de los ingredientes disponibles y máximo de
+           ingredientes faltantes; ordena de la receta a la que le faltan
+           menos a la que le faltan más.
+        fields: Campos a incluir separados por comas (por defecto todos).
+        limit, after: Paginación por cursor. Se devuelven `limit` recetas
+           (máximo 100) después del cursor `after`; la respuesta trae el
+           cursor de la página siguiente en "next".
+        stream=1: Devuelve todas las recetas como NDJSON (una receta JSON
+           por línea) a medida que se leen de la base de datos.
+
     Formato de respuesta:
     {
         "recipes": [
@@ -36,26 +116,156 @@ def recipes_api(request):
         ],
         "total": 10
     }
+    Con limit/after, en vez de "total" se incluyen "next" (cursor o null)
+    y "has_more".
+
+    Las respuestas (salvo stream=1 y los errores) se guardan en caché por
+    parámetros hasta el siguiente cambio del catálogo; el encabezado
+    X-Cache indica HIT o MISS (ver core/services/api_cache.py). Llevan
+    ETag (hash del contenido) y Last-Modified (último `updated_at` de las
+    recetas), y con If-None-Match / If-Modified-Since se responde 304.
     """
+    if request.GET.get('stream') == '1':
+        return build_recipes_response(request)
+
+    errors = []
+
+    def build():
+        # El Last-Modified se lee antes de armar la respuesta para no quedar
+        # más nuevo que el contenido si una receta cambia en el medio. El
+        # registro de cambios cubre también los borrados.
+        last_modified = max(filter(None, [
+            Recipe.objects.aggregate(last=Max('updated_at'))['last'],
+            RecipeChange.objects.order_by('-seq').values_list('changed_at', flat=True).first(),
+        ]), default=None)
+        response = build_recipes_response(request)
+        if response.status_code != 200:
+            errors.append(response)
+            return None
+        return {
+            'content': response.content,
+            'etag': make_etag(response.content.decode()),
+            'last_modified': last_modified,
+        }
+
+    cached, hit = get_or_build(request.GET, build)
+    if errors:
+        return errors[0]
+
+    response = conditional_response(
+        request, cached['etag'], cached['last_modified'],
+        lambda: HttpResponse(cached['content'], content_type='application/json'),
+    )
+    response['X-Cache'] = 'HIT' if hit else 'MISS'
+    return response
+
+
+def build_recipes_response(request):
+    """Consulta y serializa las recetas según los parámetros de `recipes_api`."""
     # Obtener todas las recetas ordenadas por fecha de creación (más recientes primero)
     recipes = Recipe.objects.all().order_by('-creation_date')
-    
-    recipes_data = []
-    for recipe in recipes:
-        # Convertir DurationField a string en formato HH:MM:SS
-        prep_time = format_duration(recipe.preparation_time)
-        
-        recipes_data.append({
-            'id': recipe.id,
-            'nombre': recipe.title,
-            'tiempo_preparacion': prep_time,
-            'porciones': recipe.portions,
-            'valor_nutricional': recipe.nutritional_value,
-            'calificacion': float(recipe.media_score) if recipe.media_score else 0.0
+
+    query = request.GET.get('q', '').strip()
+    if query:
+        recipes = search_recipes(Recipe.objects.all(), query)
+
+    try:
+        conditions = {
+            'all_of': parse_id_list(request.GET.get('all', '')),
+            'any_of': parse_id_list(request.GET.get('any', '')),
+            'pantry': parse_id_list(request.GET.get('pantry', '')),
+            'exclude': parse_id_list(request.GET.get('exclude', '')),
+            'max_missing': int(request.GET['max_missing']) if request.GET.get('max_missing') else None,
+        }
+    except ValueError:
+        return JsonResponse({'error': 'Los ids de ingredientes deben ser números'}, status=400)
+    recipes = filter_by_ingredients(recipes, **conditions)
+
+    try:
+        fields = parse_fields(request.GET.get('fields', ''))
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+
+    # Solo se leen las columnas pedidas más las del orden (para el cursor)
+    ordering = complete_ordering(recipes.query.order_by)
+    columns = {API_FIELDS[field][0] for field in fields}
+    columns.update('id' if key.lstrip('-') == 'pk' else key.lstrip('-') for key in ordering)
+    rows = recipes.order_by(*ordering).values(*columns)
+
+    if request.GET.get('stream') == '1':
+        lines = (
+            json.dumps(serialize_row(row, fields)) + '\n'
+            for row in rows.iterator(chunk_size=STREAM_CHUNK_SIZE)
+        )
+        return StreamingHttpResponse(lines, content_type='application/x-ndjson')
+
+    if 'limit' in request.GET or 'after' in request.GET:
+        try:
+            limit = min(max(int(request.GET.get('limit', DEFAULT_LIMIT)), 1), MAX_LIMIT)
+        except ValueError:
+            return JsonResponse({'error': 'limit debe ser un número'}, status=400)
+        try:
+            page = KeysetPaginator(rows, ordering, limit).page(request.GET.get('after'))
+        except InvalidCursor as e:
+            return JsonResponse({'error': str(e)}, status=400)
+        return JsonResponse({
+            'recipes': [serialize_row(row, fields) for row in page.object_list],
+            'next': page.next_cursor,
+            'has_more': page.has_next,
         })
-    
+
+    recipes_data = [serialize_row(row, fields) for row in rows.iterator(chunk_size=STREAM_CHUNK_SIZE)]
     return JsonResponse({
         'recipes': recipes_data,
         'total': len(recipes_data)
     }, safe=False)
 
+
+def recipe_changes_api(request):
+    """
+    Cambios de recetas posteriores a un cursor, para sincronizar sin
+    descargar el catálogo completo.
+
+    Parámetros:
+        since: Último `seq` procesado (0 para recibir todo el catálogo).
+        limit: Cambios por página (por defecto 100, máximo 1000).
+        fields: Campos de la receta a incluir, como en /api/recipes/.
+
+    Formato de respuesta:
+    {
+        "changes": [
+            {"seq": 41, "id": 7, "action": "upsert", "recipe": {...}},
+            {"seq": 42, "id": 3, "action": "delete"}
+        ],
+        "next": 42,
+        "has_more": false
+    }
+    El consumidor guarda "next" y lo envía como `since` en la siguiente
+    llamada; mientras "has_more" sea true hay más cambios pendientes.
+    """
+    try:
+        since = max(int(request.GET.get('since', 0)), 0)
+        limit = min(max(int(request.GET.get('limit', CHANGES_DEFAULT_LIMIT)), 1), CHANGES_MAX_LIMIT)
+    except ValueError:
+        return JsonResponse({'error': 'since y limit deben ser números'}, status=400)
+    try:
+        fields = parse_fields(request.GET.get('fields', ''))
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+
+    changes, last_seq, has_more = changes_since(since, limit)
+
+    upserts = [recipe_id for _, recipe_id, action in changes if action == 'upsert']
+    columns = {API_FIELDS[field][0] for field in fields} | {'id'}
+    recipes = {row['id']: row for row in Recipe.objects.filter(pk__in=upserts).values(*columns)}
+
+    data = []
+    for seq, recipe_id, action in changes:
+        # Si la receta se borró después, su marca de borrado llega en una página siguiente
+        if action == 'upsert' and recipe_id in recipes:
+            data.append({'seq': seq, 'id': recipe_id, 'action': 'upsert',
+                         'recipe': serialize_row(recipes[recipe_id], fields)})
+        else:
+            data.append({'seq': seq, 'id': recipe_id, 'action': 'delete'})
+
+    return JsonResponse({'changes': data, 'next': last_seq, 'has_more': has_more})
@@ -0,0 +1,61 @@
+# Autor: Ana Sofía Alfonso
+"""
+GET condicional (ETag / Last-Modified) para recetas.
+
+Las vistas calculan los validadores antes de renderizar; si el cliente ya
+tiene esa versión (If-None-Match / If-Modified-Since) se responde 304 sin
+armar la página. Las ETag son fuertes: cambian con cualquier cambio del
+contenido que se muestra.
+"""
+import hashlib
+
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+from django.utils.translation import get_language
+
+from core.models import Recipe
+
+
+def make_etag(*parts):
+    """ETag (sin comillas) a partir de los valores que determinan el contenido."""
+    return hashlib.sha256("|".join(str(part) for part in parts).encode()).hexdigest()[:32]
+
+
+def conditional_response(request, etag, last_modified, render):
+    """
+    Responde 304 si los validadores coinciden con los del cliente; si no,
+    llama a `render()` y agrega ETag y Last-Modified a la respuesta.
+
+    `last_modified` es un datetime con zona horaria (o None).
+    """
+    etag = quote_etag(etag)
+    timestamp = int(last_modified.timestamp()) if last_modified else None
+    response = get_conditional_response(request, etag=etag, last_modified=timestamp)
+    if response is None:
+        response = render()
+    if request.method in ("GET", "HEAD") and response.status_code in (200, 304):
+        response.headers["ETag"] = etag
+        if timestamp is not None:
+            response.headers["Last-Modified"] = http_date(timestamp)
+    return response
+
+
+class RecipeConditionalMixin:
+    """
+    GET condicional para DetailView de recetas, validado con
+    `Recipe.updated_at`. La página también depende del usuario (barra de
+    navegación) y del idioma, así que ambos entran en la ETag.
+
+    Debe ir después del mixin de permisos para no responder 304 a quien no
+    puede ver la página.
+    """
+
+    def get(self, request, *args, **kwargs):
+        pk = kwargs.get(self.pk_url_kwarg)
+        updated_at = Recipe.objects.filter(pk=pk).values_list("updated_at", flat=True).first()
+        render = super().get
+        if updated_at is None:
+            return render(request, *args, **kwargs)
+
+        etag = make_etag(type(self).__name__, pk, updated_at.isoformat(), request.user.pk, get_language())
+        return conditional_response(request, etag, updated_at, lambda: render(request, *args, **kwargs))
@@ -1,6 +1,7 @@
 # Autor: Ana Sofía Alfonso
 from django import forms
 from core.models import IngredientType, Ingredient, Instruction, Recipe, Review, Multimedia
+from django.db.models.functions import Lower
 from django.utils.translation import gettext_lazy as _
 
 class CommaSeparatedListField(forms.CharField):
@@ -47,7 +48,8 @@ class IngredientTypeForm(forms.ModelForm):
     
     def clean_nombre(self):
         nombre = self.cleaned_data["nombre"].strip()
-        qs = IngredientType.objects.filter(nombre__iexact=nombre)
+        # Lower() en vez de __iexact para usar el índice ingtype_lower_nombre_idx
+        qs = IngredientType.objects.annotate(nombre_lower=Lower("nombre")).filter(nombre_lower=nombre.lower())
 
         if self.instance.pk:
             qs = qs.exclude(pk=self.instance.pk)
@@ -149,6 +151,51 @@ class RecipeFilterForm(forms.Form):
         label=_("Valor nutricional máximo"),
         widget=forms.NumberInput(attrs={"class": "form-control"})
     )
+    # Búsqueda por varios ingredientes (ver core/services/ingredient_index.py)
+    ingredients = forms.ModelMultipleChoiceField(
+        queryset=IngredientType.objects.all(),
+        required=False,
+        label=_("Con todos estos ingredientes"),
+        widget=forms.SelectMultiple(attrs={"class": "form-control"})
+    )
+    any_ingredients = forms.ModelMultipleChoiceField(
+        queryset=IngredientType.objects.all(),
+        required=False,
+        label=_("Con alguno de estos ingredientes"),
+        widget=forms.SelectMultiple(attrs={"class": "form-control"})
+    )
+    pantry = forms.ModelMultipleChoiceField(
+        queryset=IngredientType.objects.all(),
+        required=False,
+        label=_("Ingredientes que tengo"),
+        widget=forms.SelectMultiple(attrs={"class": "form-control"})
+    )
+    max_missing = forms.IntegerField(
+        required=False,
+        min_value=0,
+        label=_("Máximo de ingredientes faltantes"),
+        widget=forms.NumberInput(attrs={"class": "form-control"})
+    )
+    exclude_ingredients = forms.ModelMultipleChoiceField(
+        queryset=IngredientType.objects.all(),
+        required=False,
+        label=_("Sin estos ingredientes (alergias)"),
+        widget=forms.SelectMultiple(attrs={"class": "form-control"})
+    )
+
+    def ingredient_conditions(self):
+        """Condiciones de ingredientes para filter_by_ingredients, con ids."""
+        data = self.cleaned_data
+        all_of = [tipo.pk for tipo in data.get("ingredients") or []]
+        if data.get("ingredient_type"):
+            all_of.append(data["ingredient_type"].pk)
+        return {
+            "all_of": all_of,
+            "any_of": [tipo.pk for tipo in data.get("any_ingredients") or []],
+            "pantry": [tipo.pk for tipo in data.get("pantry") or []],
+            "max_missing": data.get("max_missing"),
+            "exclude": [tipo.pk for tipo in data.get("exclude_ingredients") or []],
+        }
 
 class MultimediaForm(forms.ModelForm):
     class Meta:
@@ -0,0 +1,34 @@
+# Autor: Ana Sofía Alfonso
+"""
+Muestra la tasa de aciertos de la caché de la API pública de recetas.
+
+Uso:
+    python manage.py api_cache_stats
+    python manage.py api_cache_stats --reset      # pone los contadores en cero
+    python manage.py api_cache_stats --invalidate # descarta las respuestas guardadas
+"""
+from django.core.management.base import BaseCommand
+
+from core.services.api_cache import bump_catalog_version, get_stats, reset_stats
+
+
+class Command(BaseCommand):
+    help = "Muestra los contadores de la caché de la API de recetas"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--reset", action="store_true", help="Reinicia los contadores")
+        parser.add_argument("--invalidate", action="store_true", help="Incrementa la versión del catálogo")
+
+    def handle(self, *args, **options):
+        if options["invalidate"]:
+            bump_catalog_version()
+        stats = get_stats()
+        self.stdout.write(
+            f"Aciertos: {stats['hits']}  Fallos: {stats['misses']}  "
+            f"Reconstrucciones: {stats['rebuilds']}  Esperas: {stats['waits']}"
+        )
+        self.stdout.write(f"Tasa de aciertos: {stats['hit_rate']:.1%}")
+        self.stdout.write(f"Versión del catálogo: {stats['catalog_version']}")
+        if options["reset"]:
+            reset_stats()
+            self.stdout.write(self.style.SUCCESS("Contadores reiniciados"))
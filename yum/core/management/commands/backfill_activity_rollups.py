@@ -0,0 +1,32 @@
+# Autor: Ana Sofía Alfonso
+"""
+Recalcula desde las tablas los resúmenes de actividad por hora y por día.
+
+Uso:
+    python manage.py backfill_activity_rollups
+    python manage.py backfill_activity_rollups --metric reviews --since 2026-01-01 --until 2026-02-01
+"""
+from django.core.management.base import BaseCommand, CommandError
+
+from core.services.activity_rollups import SOURCES, backfill, parse_moment
+
+
+class Command(BaseCommand):
+    help = "Recalcula los resúmenes de actividad (recetas, reseñas y registros)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--metric", action="append", choices=list(SOURCES), help="Métrica (se puede repetir)")
+        parser.add_argument("--since", help="Primer día a recalcular (AAAA-MM-DD)")
+        parser.add_argument("--until", help="Día siguiente al último a recalcular (AAAA-MM-DD)")
+
+    def handle(self, *args, **options):
+        try:
+            since = parse_moment(options["since"]) if options["since"] else None
+            until = parse_moment(options["until"]) if options["until"] else None
+        except ValueError as e:
+            raise CommandError(f"Fecha inválida: {e}")
+
+        written = backfill(options["metric"], since, until)
+        for metric, rows in written.items():
+            self.stdout.write(f"{metric}: {rows} intervalos")
+        self.stdout.write(self.style.SUCCESS("Resúmenes de actividad recalculados"))
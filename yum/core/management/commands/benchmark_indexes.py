@@ -0,0 +1,208 @@
+# Autor: Ana Sofía Alfonso
+"""
+Compara planes de consulta y tiempos de las consultas más frecuentes
+con y sin los índices de la migración 0014_hot_query_indexes.
+
+Crea una base de datos temporal (la misma que usan las pruebas), la llena
+con datos sintéticos y la destruye al terminar; la base real no se toca.
+El resultado (planes y tiempos antes y después) se escribe en pantalla y
+en el archivo de --output, para guardarlo junto al cambio que se mide.
+
+Crear la base con todas las migraciones y generar los datos domina el
+tiempo total: con las 100.000 reseñas por defecto tarda menos de un
+minuto; con 1.000.000 (el volumen real que motivó los índices) puede
+tardar decenas de minutos.
+
+Uso:
+    python manage.py benchmark_indexes                  # 100.000 reseñas
+    python manage.py benchmark_indexes --reviews 1000000 --output bench.txt
+    python manage.py benchmark_indexes --reviews 50000 --repeat 20
+"""
+import random
+import statistics
+import time
+from datetime import timedelta
+from importlib import import_module
+from pathlib import Path
+
+from django.apps import apps
+from django.contrib.contenttypes.models import ContentType
+from django.core.management.base import BaseCommand
+from django.db import connection, migrations
+from django.db.models.functions import Lower
+from django.utils import timezone
+
+from core.models import IngredientType, Instruction, Multimedia, Recipe, Review, User
+
+
+def hot_query_indexes():
+    """(modelo, índice) de cada AddIndex de la migración 0014; los índices de otras migraciones no se tocan."""
+    migration = import_module("core.migrations.0014_hot_query_indexes").Migration
+    return [
+        (apps.get_model("core", operation.model_name), operation.index)
+        for operation in migration.operations
+        if isinstance(operation, migrations.AddIndex)
+    ]
+
+
+class Command(BaseCommand):
+    help = (
+        "Mide planes de consulta y tiempos con y sin los índices de consultas frecuentes. "
+        "Con --reviews 1000000 puede tardar decenas de minutos"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--reviews", type=int, default=100_000,
+                            help="Reseñas a generar (1.000.000 tarda decenas de minutos)")
+        parser.add_argument("--recipes", type=int, default=20_000, help="Recetas a generar")
+        parser.add_argument("--users", type=int, default=2_000, help="Usuarios a generar")
+        parser.add_argument("--repeat", type=int, default=50, help="Repeticiones por consulta")
+        parser.add_argument("--output", default="benchmark_indexes.txt",
+                            help="Archivo donde se guarda el resultado")
+
+    def handle(self, *args, **options):
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            self.seed(options)
+            queries = self.get_queries()
+
+            self.set_indexes(enabled=False)
+            before = self.measure(queries, options["repeat"])
+            self.set_indexes(enabled=True)
+            after = self.measure(queries, options["repeat"])
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+        lines = [
+            f"benchmark_indexes: {options['reviews']} reseñas, {options['recipes']} recetas, "
+            f"{options['users']} usuarios, {options['repeat']} repeticiones ({connection.vendor})"
+        ]
+        for name in queries:
+            lines.extend([
+                "",
+                name,
+                f"  sin índices: {before[name]['ms']:.3f} ms\n    {before[name]['plan']}",
+                f"  con índices: {after[name]['ms']:.3f} ms\n    {after[name]['plan']}",
+            ])
+        report = "\n".join(lines) + "\n"
+        self.stdout.write(report)
+        Path(options["output"]).write_text(report, encoding="utf-8")
+        self.stdout.write(self.style.SUCCESS(f"Resultado guardado en {options['output']}"))
+
+    def seed(self, options):
+        # auto_now_add reemplaza las fechas en bulk_create; se desactiva mientras se generan los datos
+        date_fields = [Recipe._meta.get_field("creation_date"), Review._meta.get_field("creation_date")]
+        for field in date_fields:
+            field.auto_now_add = False
+        try:
+            self._seed(options)
+        finally:
+            for field in date_fields:
+                field.auto_now_add = True
+
+    def _seed(self, options):
+        started = time.monotonic()
+        rng = random.Random(42)
+        now = timezone.now()
+        batch = 10_000
+
+        User.objects.bulk_create(
+            [User(username=f"bench{i}", password="!") for i in range(options["users"])],
+            batch_size=batch,
+        )
+        user_ids = list(User.objects.values_list("pk", flat=True))
+
+        IngredientType.objects.bulk_create(
+            [IngredientType(nombre=f"ingrediente {i}", category="vegetal") for i in range(2_000)],
+            batch_size=batch,
+        )
+
+        Recipe.objects.bulk_create(
+            [
+                Recipe(
+                    user_id=rng.choice(user_ids),
+                    title=f"Receta {i}",
+                    description="Receta de prueba",
+                    category="plato fuerte",
+                    preparation_time=timedelta(minutes=30),
+                    portions=2,
+                    nutritional_value=rng.randint(1, 100),
+                    creation_date=now - timedelta(days=rng.randint(0, 365)),
+                )
+                for i in range(options["recipes"])
+            ],
+            batch_size=batch,
+        )
+        recipe_ids = list(Recipe.objects.values_list("pk", flat=True))
+
+        instructions = [
+            Instruction(recipe_id=recipe_id, title=f"Paso {step}", details="...", complexity=1, n_step=step)
+            for recipe_id in recipe_ids
+            for step in range(1, 6)
+        ]
+        Instruction.objects.bulk_create(instructions, batch_size=batch)
+
+        recipe_type = ContentType.objects.get_for_model(Recipe)
+        Multimedia.objects.bulk_create(
+            [Multimedia(file="uploads/bench.jpg", content_type=recipe_type, object_id=recipe_id)
+             for recipe_id in recipe_ids],
+            batch_size=batch,
+        )
+
+        created = 0
+        while created < options["reviews"]:
+            size = min(batch, options["reviews"] - created)
+            Review.objects.bulk_create([
+                Review(
+                    user_id=rng.choice(user_ids),
+                    recipe_id=rng.choice(recipe_ids),
+                    score=rng.randint(0, 5),
+                    creation_date=now - timedelta(minutes=rng.randint(0, 525_600)),
+                )
+                for _ in range(size)
+            ])
+            created += size
+
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE")
+        self.stdout.write(f"Datos generados en {time.monotonic() - started:.1f}s")
+
+    def get_queries(self):
+        recipe = Recipe.objects.order_by("?").first()
+        user = User.objects.filter(username="bench7").first()
+        recipe_type = ContentType.objects.get_for_model(Recipe)
+        return {
+            "Recetas más recientes": lambda: Recipe.objects.order_by("-creation_date")[:20],
+            "Filtro por valor nutricional": lambda: Recipe.objects.filter(
+                nutritional_value__gte=60, nutritional_value__lte=62
+            ).values_list("pk", flat=True),
+            "Multimedia de una receta": lambda: Multimedia.objects.filter(
+                content_type=recipe_type, object_id=recipe.pk
+            ),
+            "Pasos de una receta": lambda: Instruction.objects.filter(recipe=recipe).order_by("n_step"),
+            "Reseñas de una receta": lambda: Review.objects.filter(recipe=recipe).order_by("-creation_date")[:20],
+            "Reseñas de un usuario": lambda: Review.objects.filter(user=user).order_by("-creation_date")[:20],
+            "Tipo de ingrediente por nombre": lambda: IngredientType.objects.annotate(
+                nombre_lower=Lower("nombre")
+            ).filter(nombre_lower="ingrediente 1500"),
+        }
+
+    def set_indexes(self, enabled):
+        with connection.schema_editor() as editor:
+            for model, index in hot_query_indexes():
+                if enabled:
+                    editor.add_index(model, index)
+                else:
+                    editor.remove_index(model, index)
+
+    def measure(self, queries, repeat):
+        results = {}
+        for name, build in queries.items():
+            plan = build().explain().replace("\n", "\n    ")
+            timings = []
+            for _ in range(repeat):
+                started = time.perf_counter()
+                list(build())
+                timings.append((time.perf_counter() - started) * 1000)
+            results[name] = {"plan": plan, "ms": statistics.median(timings)}
+        return results
@@ -0,0 +1,22 @@
+# Autor: Ana Sofía Alfonso
+"""
+Compacta el registro de cambios de recetas: deja solo la fila más nueva
+de cada receta. Pensado para ejecutarse periódicamente (por ejemplo con cron).
+
+Uso:
+    python manage.py compact_recipe_changes
+"""
+from django.core.management.base import BaseCommand
+
+from core.models import RecipeChange
+from core.services.change_feed import compact_changes
+
+
+class Command(BaseCommand):
+    help = "Borra las filas del registro de cambios reemplazadas por otra más nueva"
+
+    def handle(self, *args, **options):
+        deleted = compact_changes()
+        self.stdout.write(self.style.SUCCESS(
+            f"Filas borradas: {deleted}. Quedan {RecipeChange.objects.count()}"
+        ))
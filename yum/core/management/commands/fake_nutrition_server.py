@@ -0,0 +1,78 @@
+# Autor: Ana Sofía Alfonso
+"""
+Servidor local que simula al modelo de IA para probar y ajustar el
+cálculo en lote sin consumir la API de Gemini.
+
+Uso:
+    python manage.py fake_nutrition_server --port 8765 --latency 0.8 --malformed-rate 0.1
+
+Luego, en settings.py:
+    NUTRITION_MODEL_BACKEND = "http"
+    NUTRITION_MODEL_URL = "http://127.0.0.1:8765/"
+    NUTRITION_BATCH_SIZE = 20   # valor a ajustar
+"""
+import hashlib
+import json
+import random
+import re
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from django.core.management.base import BaseCommand
+
+RECIPE_ID_PATTERN = re.compile(r"\[id=(\d+)\]")
+
+
+def fake_score(text):
+    """Puntaje determinístico a partir del texto de la receta."""
+    return int(hashlib.sha256(text.encode("utf-8")).hexdigest(), 16) % 100 + 1
+
+
+class Command(BaseCommand):
+    help = "Inicia un servidor HTTP que imita al modelo de valor nutricional"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--host", default="127.0.0.1")
+        parser.add_argument("--port", type=int, default=8765)
+        parser.add_argument("--latency", type=float, default=0.5, help="Segundos fijos por llamada")
+        parser.add_argument("--per-recipe-latency", type=float, default=0.05,
+                            help="Segundos adicionales por receta en un lote")
+        parser.add_argument("--malformed-rate", type=float, default=0.0,
+                            help="Probabilidad (0-1) de responder texto inválido")
+
+    def handle(self, *args, **options):
+        command = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                prompt = json.loads(self.rfile.read(length) or b"{}").get("prompt", "")
+                ids = RECIPE_ID_PATTERN.findall(prompt)
+
+                time.sleep(options["latency"] + options["per_recipe_latency"] * max(len(ids), 1))
+
+                if random.random() < options["malformed_rate"]:
+                    text = "Lo siento, no puedo evaluar estas recetas."
+                elif ids:
+                    text = json.dumps([{"id": int(recipe_id), "puntaje": fake_score(recipe_id)} for recipe_id in ids])
+                else:
+                    text = str(fake_score(prompt))
+
+                body = json.dumps({"text": text}).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                command.stdout.write(format % args)
+
+        server = ThreadingHTTPServer((options["host"], options["port"]), Handler)
+        self.stdout.write(f"Servidor simulado en http://{options['host']}:{options['port']}/")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
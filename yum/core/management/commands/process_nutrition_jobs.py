@@ -0,0 +1,62 @@
+# Autor: Ana Sofía Alfonso
+"""
+Worker que procesa la cola de cálculo de valor nutricional.
+
+Uso:
+    python manage.py process_nutrition_jobs          # corre indefinidamente
+    python manage.py process_nutrition_jobs --once   # procesa lo pendiente y termina
+
+Cada --stats-interval segundos (y al terminar con --once) escribe los
+contadores del cliente del modelo y de la caché de puntajes de este proceso.
+"""
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.services.nutrition_cache import describe_cache_stats
+from core.services.nutrition_jobs import process_pending_jobs, requeue_stale_jobs
+from core.services.nutritional_value import describe_client_stats
+
+
+class Command(BaseCommand):
+    help = "Procesa los trabajos pendientes de valor nutricional"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--once", action="store_true", help="Procesa la cola una vez y termina")
+        parser.add_argument("--batch-size", type=int, default=10, help="Trabajos reservados por iteración")
+        parser.add_argument("--sleep", type=float, default=2.0, help="Segundos de espera cuando la cola está vacía")
+        parser.add_argument("--stale-timeout", type=int, default=600,
+                            help="Segundos tras los cuales un trabajo 'running' se considera abandonado")
+        parser.add_argument("--requeue-interval", type=float, default=60.0,
+                            help="Segundos entre búsquedas de trabajos abandonados")
+        parser.add_argument("--stats-interval", type=float, default=300.0,
+                            help="Segundos entre reportes de los contadores del cliente y de la caché")
+
+    def handle(self, *args, **options):
+        # Otro worker puede caerse mientras éste corre: se revisa periódicamente, no solo al arrancar
+        next_requeue = 0
+        next_stats = time.monotonic() + options["stats_interval"]
+        while True:
+            if time.monotonic() >= next_requeue:
+                requeued = requeue_stale_jobs(options["stale_timeout"])
+                if requeued:
+                    self.stdout.write(f"Trabajos recuperados: {requeued}")
+                next_requeue = time.monotonic() + options["requeue_interval"]
+
+            processed, succeeded = process_pending_jobs(options["batch_size"])
+            if processed:
+                self.stdout.write(f"Procesados: {processed} (exitosos: {succeeded})")
+
+            if time.monotonic() >= next_stats:
+                self.report_stats()
+                next_stats = time.monotonic() + options["stats_interval"]
+
+            if not processed:
+                if options["once"]:
+                    self.report_stats()
+                    break
+                time.sleep(options["sleep"])
+
+    def report_stats(self):
+        self.stdout.write(describe_client_stats())
+        self.stdout.write(describe_cache_stats())
@@ -0,0 +1,52 @@
+# Autor: Ana Sofía Alfonso
+"""
+Recalcula en lote los agregados de reseñas de todas las recetas
+(review_count, score_sum, histograma y media_score).
+
+Uso:
+    python manage.py rebuild_review_stats
+"""
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from core.models import Recipe, Review
+
+STAT_FIELDS = ["review_count", "score_sum", *[f"score_count_{score}" for score in range(6)]]
+
+
+class Command(BaseCommand):
+    help = "Recalcula los agregados de reseñas almacenados en Recipe"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000, help="Recetas por bulk_update")
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+
+        # Una sola consulta agrupada para todas las reseñas
+        stats = {
+            row.pop("recipe_id"): row
+            for row in Review.objects.values("recipe_id").annotate(**Recipe.review_stats_aggregates())
+        }
+
+        fixed = 0
+        batch = []
+        recipes = Recipe.objects.only("pk", "media_score", *STAT_FIELDS).iterator(chunk_size=batch_size)
+        for recipe in recipes:
+            if not recipe.set_review_stats(stats.get(recipe.pk, {})):
+                continue
+
+            batch.append(recipe)
+            if len(batch) >= batch_size:
+                fixed += self._flush(batch)
+
+        fixed += self._flush(batch)
+        self.stdout.write(self.style.SUCCESS(f"Recetas corregidas: {fixed}"))
+
+    def _flush(self, batch):
+        count = len(batch)
+        if batch:
+            with transaction.atomic():
+                Recipe.objects.bulk_update(batch, [*STAT_FIELDS, "media_score"])
+            batch.clear()
+        return count
@@ -0,0 +1,25 @@
+# Autor: Ana Sofía Alfonso
+"""
+Reconstruye el índice de búsqueda de texto completo de las recetas.
+
+Uso:
+    python manage.py rebuild_search_index
+"""
+from django.core.management.base import BaseCommand
+
+from core.services.search import rebuild_index, search_supported
+
+
+class Command(BaseCommand):
+    help = "Reconstruye el índice de búsqueda de recetas"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000, help="Recetas por lote")
+
+    def handle(self, *args, **options):
+        if not search_supported():
+            self.stdout.write(self.style.WARNING("La base de datos no soporta el índice de búsqueda"))
+            return
+
+        indexed = rebuild_index(batch_size=options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(f"Recetas indexadas: {indexed}"))
@@ -0,0 +1,19 @@
+# Autor: Ana Sofía Alfonso
+"""
+Recalcula los contadores de recetas, reseñas y favoritas de cada usuario
+desde las tablas (un único UPDATE con subconsultas correlacionadas).
+
+Uso:
+    python manage.py rebuild_user_counts
+"""
+from django.core.management.base import BaseCommand
+
+from core.models import User
+
+
+class Command(BaseCommand):
+    help = "Recalcula los contadores de actividad de los usuarios"
+
+    def handle(self, *args, **options):
+        updated = User.objects.update(**User.count_subqueries())
+        self.stdout.write(self.style.SUCCESS(f"Usuarios actualizados: {updated}"))
@@ -0,0 +1,24 @@
+# Autor: Ana Sofía Alfonso
+"""
+Recalcula desde las tablas los totales y rankings del panel de
+administración que mantienen las señales. Pensado para ejecutarse
+periódicamente (por ejemplo con cron) y corregir desvíos.
+
+Uso:
+    python manage.py reconcile_dashboard_stats
+"""
+from django.core.management.base import BaseCommand
+
+from core.services.dashboard_stats import reconcile
+
+
+class Command(BaseCommand):
+    help = "Recalcula las estadísticas materializadas del panel de administración"
+
+    def handle(self, *args, **options):
+        drift = reconcile()
+        for name, (stored, actual) in drift.items():
+            self.stdout.write(self.style.WARNING(f"{name}: guardado {stored}, real {actual}"))
+        self.stdout.write(self.style.SUCCESS(
+            "Estadísticas recalculadas" + (f" ({len(drift)} con diferencias)" if drift else " sin diferencias")
+        ))
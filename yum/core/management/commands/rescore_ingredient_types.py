@@ -0,0 +1,40 @@
+# Autor: Ana Sofía Alfonso
+"""
+Encola el recálculo de las recetas que usan ciertos tipos de ingrediente.
+Al editar un tipo desde las vistas esto ocurre automáticamente; el
+comando sirve para cambios hechos por fuera (shell, carga de datos).
+
+Uso:
+    python manage.py rescore_ingredient_types 3 7 --dry-run
+    python manage.py rescore_ingredient_types --all
+"""
+from django.core.management.base import BaseCommand, CommandError
+
+from core.models import IngredientType
+from core.services.ingredient_dependencies import rescore_ingredient_types
+
+
+class Command(BaseCommand):
+    help = "Recalcula las recetas que dependen de los tipos de ingrediente indicados"
+
+    def add_arguments(self, parser):
+        parser.add_argument("type_ids", nargs="*", type=int, help="Ids de IngredientType")
+        parser.add_argument("--all", action="store_true", help="Todos los tipos de ingrediente")
+        parser.add_argument("--dry-run", action="store_true", help="Solo muestra cuántas recetas se tocarían")
+
+    def handle(self, *args, **options):
+        type_ids = options["type_ids"]
+        if options["all"]:
+            type_ids = list(IngredientType.objects.values_list("pk", flat=True))
+        if not type_ids:
+            raise CommandError("Indica al menos un id de tipo de ingrediente o --all")
+
+        estimate = rescore_ingredient_types(type_ids, dry_run=options["dry_run"])
+
+        self.stdout.write(f"Recetas afectadas: {estimate['recipes']} ({estimate['already_pending']} ya en cola)")
+        self.stdout.write(f"Motor: {estimate['engine']} - llamadas al modelo: {estimate['model_calls']}")
+        self.stdout.write(f"Tiempo estimado: {estimate['estimated_minutes']} min")
+        if options["dry_run"]:
+            self.stdout.write("Modo de prueba: no se encoló nada")
+        else:
+            self.stdout.write(self.style.SUCCESS("Recálculo encolado"))
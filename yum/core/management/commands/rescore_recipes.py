@@ -0,0 +1,189 @@
+# Autor: Ana Sofía Alfonso
+"""
+Recalcula en lote el valor nutricional de las recetas, por ejemplo después
+de cambiar el prompt o el modelo (incrementando NUTRITION_SCORE_VERSION).
+
+Uso:
+    python manage.py rescore_recipes --older-than-version 2
+    python manage.py rescore_recipes --engine local --category postre
+    python manage.py rescore_recipes --resume        # continúa desde el último checkpoint
+"""
+import json
+import time
+from contextlib import nullcontext
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from core.models import Ingredient, Recipe
+from core.services.api_cache import bump_catalog_version
+from core.services.change_feed import mark_recipes_changed
+from core.services.nutrition_cache import describe_cache_stats, get_cached_score, recipe_fingerprint, store_score
+from core.services.nutrition_estimator import estimate_from_rows
+from core.services.nutritional_value import (
+    describe_client_stats, fetch_nutritional_values, get_batch_size, get_score_version, get_scoring_engine,
+)
+
+
+class Command(BaseCommand):
+    help = "Recalcula el valor nutricional de las recetas en lote, con checkpoints"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--engine", choices=["gemini", "local"], help="Por defecto NUTRITION_SCORING_ENGINE")
+        parser.add_argument("--workers", type=int, default=4, help="Hilos (gemini) o procesos (local)")
+        parser.add_argument("--chunk-size", type=int, default=200, help="Recetas por bulk_update y checkpoint")
+        parser.add_argument("--category", help="Solo recetas de esta categoría")
+        parser.add_argument("--min-score", type=int, help="Solo recetas con valor nutricional >= este")
+        parser.add_argument("--max-score", type=int, help="Solo recetas con valor nutricional <= este")
+        parser.add_argument("--older-than-version", type=int,
+                            help="Solo recetas calculadas con una versión menor a esta")
+        parser.add_argument("--checkpoint", default=str(Path(settings.BASE_DIR) / ".rescore_checkpoint.json"),
+                            help="Archivo donde se guarda el avance")
+        parser.add_argument("--resume", action="store_true", help="Continúa desde el último checkpoint")
+
+    def handle(self, *args, **options):
+        self.engine = options["engine"] or get_scoring_engine()
+        self.workers = options["workers"]
+        self.version = get_score_version()
+        checkpoint = Path(options["checkpoint"])
+
+        queryset = self.get_queryset(options)
+        if options["resume"] and checkpoint.exists():
+            last_pk = json.loads(checkpoint.read_text())["last_pk"]
+            queryset = queryset.filter(pk__gt=last_pk)
+            self.stdout.write(f"Continuando después de la receta {last_pk}")
+
+        total = queryset.count()
+        self.stdout.write(f"Recetas a recalcular: {total} (motor: {self.engine})")
+
+        done = failed = 0
+        started = time.monotonic()
+        # Los procesos se crean una vez y se reutilizan en todos los lotes
+        with self.make_pool() as self.pool:
+            for chunk in self.iter_chunks(queryset, options["chunk_size"]):
+                scores = self.score_chunk(chunk)
+                failed += len(chunk) - len(scores)
+                self.write_scores(scores)
+
+                done += len(chunk)
+                checkpoint.write_text(json.dumps({"last_pk": chunk[-1].pk, "version": self.version}))
+                self.report(done, total, failed, started)
+
+        if checkpoint.exists():
+            checkpoint.unlink()
+        self.stdout.write(self.style.SUCCESS(f"Listo: {done - failed} recalculadas, {failed} con error"))
+        if self.engine != "local":
+            self.stdout.write(describe_client_stats())
+            self.stdout.write(describe_cache_stats())
+
+    def make_pool(self):
+        if self.engine == "local" and self.workers > 1:
+            return ProcessPoolExecutor(max_workers=self.workers)
+        return nullcontext()
+
+    def get_queryset(self, options):
+        queryset = Recipe.objects.order_by("pk")
+        if options["category"]:
+            queryset = queryset.filter(category=options["category"])
+        if options["min_score"] is not None:
+            queryset = queryset.filter(nutritional_value__gte=options["min_score"])
+        if options["max_score"] is not None:
+            queryset = queryset.filter(nutritional_value__lte=options["max_score"])
+        if options["older_than_version"] is not None:
+            queryset = queryset.filter(score_version__lt=options["older_than_version"])
+
+        if self.engine == "local":
+            return queryset.only("pk", "portions")
+        return queryset.prefetch_related("ingredients__ingredient_type")
+
+    def iter_chunks(self, queryset, chunk_size):
+        chunk = []
+        for recipe in queryset.iterator(chunk_size=chunk_size):
+            chunk.append(recipe)
+            if len(chunk) >= chunk_size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+    def score_chunk(self, chunk):
+        if self.engine == "local":
+            return self.score_local(chunk)
+        return self.score_remote(chunk)
+
+    def score_local(self, chunk):
+        portions = {recipe.pk: recipe.portions for recipe in chunk}
+        rows = list(Ingredient.objects.filter(recipe_id__in=portions).values_list(
+            "recipe_id",
+            "quantity",
+            "ingredient_type__category",
+            "ingredient_type__vitamins",
+            "ingredient_type__excesses",
+        ))
+        if self.workers <= 1:
+            return estimate_from_rows(portions, rows)
+
+        # Se reparte por receta para que cada proceso reciba recetas completas
+        parts = [({}, []) for _ in range(self.workers)]
+        for recipe_id, value in portions.items():
+            parts[recipe_id % self.workers][0][recipe_id] = value
+        for row in rows:
+            parts[row[0] % self.workers][1].append(row)
+
+        scores = {}
+        for result in self.pool.map(estimate_from_rows, *zip(*parts)):
+            scores.update(result)
+        return scores
+
+    def score_remote(self, chunk):
+        scores, missing = {}, []
+        for recipe in chunk:
+            fingerprint = recipe_fingerprint(recipe)
+            cached = get_cached_score(fingerprint)
+            if cached is None:
+                missing.append((recipe, fingerprint))
+            else:
+                scores[recipe.pk] = cached
+
+        # El cliente compartido aplica el límite de tasa y de concurrencia
+        batch_size = get_batch_size()
+        batches = [missing[i:i + batch_size] for i in range(0, len(missing), batch_size)]
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            results = pool.map(
+                lambda batch: fetch_nutritional_values([recipe for recipe, _ in batch], batch_size),
+                batches,
+            )
+            for batch, (batch_scores, errors) in zip(batches, results):
+                for recipe, fingerprint in batch:
+                    if recipe.pk in batch_scores:
+                        scores[recipe.pk] = batch_scores[recipe.pk]
+                        store_score(fingerprint, batch_scores[recipe.pk])
+                    else:
+                        self.stderr.write(f"Receta {recipe.pk}: {errors.get(recipe.pk, 'sin puntaje')}")
+        return scores
+
+    def write_scores(self, scores):
+        now = timezone.now()
+        recipes = [
+            Recipe(pk=recipe_id, nutritional_value=score, score_status="ready", score_version=self.version,
+                   updated_at=now)
+            for recipe_id, score in scores.items()
+        ]
+        with transaction.atomic():
+            Recipe.objects.bulk_update(recipes, ["nutritional_value", "score_status", "score_version", "updated_at"])
+            # Una receta borrada durante el recálculo ya tiene su marca de borrado: no se registra otro cambio
+            mark_recipes_changed(Recipe.objects.filter(pk__in=scores).values_list("pk", flat=True))
+            # bulk_update no envía señales: la caché de la API se invalida al confirmar
+            bump_catalog_version()
+
+    def report(self, done, total, failed, started):
+        elapsed = time.monotonic() - started
+        rate = done / elapsed if elapsed else 0
+        eta = (total - done) / rate if rate else 0
+        self.stdout.write(
+            f"{done}/{total} ({failed} errores) - {rate:.1f} recetas/s - ETA {eta:.0f}s"
+        )
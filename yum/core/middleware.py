@@ -0,0 +1,16 @@
+# Autor: Ana Sofía Alfonso
+from .services.rescoring import collect_rescoring
+
+
+class RescoringMiddleware:
+    """
+    Recalcula cada receta modificada una sola vez por request,
+    aunque la vista guarde o borre varios ingredientes.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with collect_rescoring():
+            return self.get_response(request)
@@ -0,0 +1,43 @@
+# Generated by Django 5.2.6 on 2026-10-18 10:00
+
+from django.db import migrations, models
+
+
+def fill_cover_image(apps, schema_editor):
+    Recipe = apps.get_model('core', 'Recipe')
+    Multimedia = apps.get_model('core', 'Multimedia')
+    ContentType = apps.get_model('contenttypes', 'ContentType')
+
+    content_type = ContentType.objects.filter(app_label='core', model='recipe').first()
+    if content_type is None:
+        return
+
+    covers = {}
+    for object_id, name in (
+        Multimedia.objects.filter(content_type=content_type)
+        .order_by('-pk')
+        .values_list('object_id', 'file')
+    ):
+        covers[object_id] = name or ''
+
+    recipes = list(Recipe.objects.filter(pk__in=covers.keys()))
+    for recipe in recipes:
+        recipe.cover_image = covers[recipe.pk]
+    Recipe.objects.bulk_update(recipes, ['cover_image'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contenttypes', '0002_remove_content_type_name'),
+        ('core', '0008_remove_recipe_image_file_remove_recipe_image_url'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='cover_image',
+            field=models.CharField(blank=True, default='', editable=False, max_length=255),
+        ),
+        migrations.RunPython(fill_cover_image, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,71 @@
+# Generated by Django 5.2.6 on 2026-10-18 02:20
+
+from django.db import migrations, models
+
+
+def fill_review_stats(apps, schema_editor):
+    Recipe = apps.get_model('core', 'Recipe')
+    Review = apps.get_model('core', 'Review')
+
+    aggregates = {
+        'review_count': models.Count('id'),
+        'score_sum': models.Sum('score'),
+    }
+    for score in range(6):
+        aggregates[f'score_count_{score}'] = models.Count('id', filter=models.Q(score=score))
+
+    for row in Review.objects.values('recipe_id').annotate(**aggregates):
+        recipe_id = row.pop('recipe_id')
+        row = {field: value or 0 for field, value in row.items()}
+        Recipe.objects.filter(pk=recipe_id).update(**row)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_nutritionscorecache'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='review_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='score_count_0',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='score_count_1',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='score_count_2',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='score_count_3',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='score_count_4',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='score_count_5',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='score_sum',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(fill_review_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.6 on 2026-10-18 02:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0012_recipe_review_stats'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='score_version',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+    ]
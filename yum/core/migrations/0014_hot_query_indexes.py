@@ -0,0 +1,43 @@
+# Generated by Django 5.2.6 on 2026-10-18 02:29
+
+import django.db.models.functions.text
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contenttypes', '0002_remove_content_type_name'),
+        ('core', '0013_recipe_score_version'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='ingredienttype',
+            index=models.Index(django.db.models.functions.text.Lower('nombre'), name='ingtype_lower_nombre_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='instruction',
+            index=models.Index(fields=['recipe', 'n_step'], name='instruction_recipe_step_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='multimedia',
+            index=models.Index(fields=['content_type', 'object_id'], name='multimedia_object_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['-creation_date'], name='recipe_creation_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['nutritional_value'], name='recipe_nutritional_value_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='review',
+            index=models.Index(fields=['recipe', 'creation_date'], name='review_recipe_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='review',
+            index=models.Index(fields=['user', 'creation_date'], name='review_user_date_idx'),
+        ),
+    ]
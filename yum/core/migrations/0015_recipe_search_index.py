@@ -0,0 +1,69 @@
+# Generated by Django 5.2.6 on 2026-10-18 02:40
+
+import unicodedata
+from collections import defaultdict
+
+from django.db import migrations
+
+# Copia congelada de core.services.search: la migración no debe cambiar si el servicio cambia
+TABLE = 'core_recipe_search'
+
+
+def fold(text):
+    normalized = unicodedata.normalize('NFKD', text or '')
+    return ''.join(c for c in normalized if not unicodedata.combining(c)).lower()
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        schema_editor.execute(
+            f'CREATE VIRTUAL TABLE IF NOT EXISTS {TABLE} USING fts5('
+            'title, description, ingredients, instructions, '
+            "tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')"
+        )
+    elif vendor == 'postgresql':
+        schema_editor.execute(
+            f'CREATE TABLE IF NOT EXISTS {TABLE} (recipe_id integer PRIMARY KEY, document tsvector NOT NULL)'
+        )
+        schema_editor.execute(f'CREATE INDEX IF NOT EXISTS {TABLE}_gin ON {TABLE} USING GIN (document)')
+    if vendor != 'sqlite':
+        # En PostgreSQL se llena con `manage.py rebuild_search_index`
+        return
+
+    Recipe = apps.get_model('core', 'Recipe')
+    Ingredient = apps.get_model('core', 'Ingredient')
+    Instruction = apps.get_model('core', 'Instruction')
+
+    ingredients = defaultdict(list)
+    for recipe_id, nombre in Ingredient.objects.values_list('recipe_id', 'ingredient_type__nombre'):
+        ingredients[recipe_id].append(nombre)
+    instructions = defaultdict(list)
+    for recipe_id, title, details in Instruction.objects.values_list('recipe_id', 'title', 'details'):
+        instructions[recipe_id].extend([title, details])
+
+    rows = [
+        (pk, fold(title), fold(description), fold(' '.join(ingredients[pk])), fold(' '.join(instructions[pk])))
+        for pk, title, description in Recipe.objects.values_list('pk', 'title', 'description')
+    ]
+    with schema_editor.connection.cursor() as cursor:
+        cursor.executemany(
+            f'INSERT INTO {TABLE} (rowid, title, description, ingredients, instructions) VALUES (%s, %s, %s, %s, %s)',
+            rows,
+        )
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor in ('sqlite', 'postgresql'):
+        schema_editor.execute(f'DROP TABLE IF EXISTS {TABLE}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0014_hot_query_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
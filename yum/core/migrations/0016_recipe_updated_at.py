@@ -0,0 +1,29 @@
+# Generated by Django 5.2.6 on 2026-10-18 02:45
+
+from django.db import migrations, models
+
+
+def fill_updated_at(apps, schema_editor):
+    # Las recetas existentes no tienen historial: se parte de su fecha de creación
+    Recipe = apps.get_model('core', 'Recipe')
+    Recipe.objects.update(updated_at=models.F('creation_date'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0015_recipe_search_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.RunPython(fill_updated_at, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['updated_at'], name='recipe_updated_at_idx'),
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.2.6 on 2026-10-18 02:47
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+def fill_recipe_changes(apps, schema_editor):
+    # Una fila por receta existente: con since=0 se recibe el catálogo completo
+    Recipe = apps.get_model('core', 'Recipe')
+    RecipeChange = apps.get_model('core', 'RecipeChange')
+    rows = Recipe.objects.order_by('updated_at', 'pk').values_list('pk', 'updated_at')
+    RecipeChange.objects.bulk_create(
+        [RecipeChange(recipe_id=pk, action='upsert', changed_at=updated_at) for pk, updated_at in rows.iterator()],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0016_recipe_updated_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecipeChange',
+            fields=[
+                ('seq', models.BigAutoField(primary_key=True, serialize=False)),
+                ('recipe_id', models.BigIntegerField()),
+                ('action', models.CharField(choices=[('upsert', 'Creada o modificada'), ('delete', 'Eliminada')], max_length=10)),
+                ('changed_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['recipe_id', 'seq'], name='recipechange_recipe_seq_idx')],
+            },
+        ),
+        migrations.RunPython(fill_recipe_changes, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,62 @@
+# Generated by Django 5.2.6 on 2026-10-18 02:49
+
+from django.db import migrations, models
+
+
+def fill_dashboard_stats(apps, schema_editor):
+    User = apps.get_model('core', 'User')
+    Recipe = apps.get_model('core', 'Recipe')
+    Review = apps.get_model('core', 'Review')
+    IngredientType = apps.get_model('core', 'IngredientType')
+    DashboardStat = apps.get_model('core', 'DashboardStat')
+    LeaderboardEntry = apps.get_model('core', 'LeaderboardEntry')
+
+    reviews = Review.objects.aggregate(count=models.Count('id'), score_sum=models.Sum('score'))
+    totals = {
+        'users': User.objects.count(),
+        'recipes': Recipe.objects.count(),
+        'reviews': reviews['count'],
+        'review_score_sum': reviews['score_sum'] or 0,
+        'ingredient_types': IngredientType.objects.count(),
+    }
+    DashboardStat.objects.bulk_create([DashboardStat(name=name, value=value) for name, value in totals.items()])
+
+    entries = [
+        LeaderboardEntry(board='recipes', object_id=pk, score=media_score, tiebreak=review_count)
+        for pk, media_score, review_count in Recipe.objects.filter(review_count__gt=0).values_list(
+            'pk', 'media_score', 'review_count'
+        )
+    ]
+    LeaderboardEntry.objects.bulk_create(entries, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0017_recipechange'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DashboardStat',
+            fields=[
+                ('name', models.CharField(max_length=50, primary_key=True, serialize=False)),
+                ('value', models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='LeaderboardEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('board', models.CharField(choices=[('recipes', 'Recetas mejor calificadas')], max_length=20)),
+                ('object_id', models.BigIntegerField()),
+                ('score', models.FloatField(default=0)),
+                ('tiebreak', models.BigIntegerField(default=0)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['board', '-score', '-tiebreak'], name='leaderboard_rank_idx')],
+                'constraints': [models.UniqueConstraint(fields=('board', 'object_id'), name='unique_leaderboard_entry')],
+            },
+        ),
+        migrations.RunPython(fill_dashboard_stats, migrations.RunPython.noop),
+    ]
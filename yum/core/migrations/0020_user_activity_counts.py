@@ -0,0 +1,56 @@
+# Generated by Django 5.2.6 on 2026-10-18 02:53
+
+from django.db import migrations, models
+from django.db.models.functions import Coalesce
+
+
+def fill_user_counts(apps, schema_editor):
+    User = apps.get_model('core', 'User')
+    Recipe = apps.get_model('core', 'Recipe')
+    Review = apps.get_model('core', 'Review')
+    Favorite = User.favorite_recipes.through
+
+    def count(model):
+        rows = model.objects.filter(user=models.OuterRef('pk')).order_by().values('user')
+        return Coalesce(models.Subquery(rows.annotate(total=models.Count('pk')).values('total')), 0)
+
+    User.objects.update(recipe_count=count(Recipe), review_count=count(Review), favorite_count=count(Favorite))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('core', '0019_activityrollup'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='favorite_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='recipe_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='review_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(fields=['-recipe_count'], name='user_recipe_count_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(fields=['-review_count'], name='user_review_count_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(fields=['-favorite_count'], name='user_favorite_count_idx'),
+        ),
+        migrations.RunPython(fill_user_counts, migrations.RunPython.noop),
+    ]
@@ -1,12 +1,13 @@
 # Autor: Ana Sofía Alfonso
 from django.db import models
-from django.db.models.functions import Lower
+from django.db.models import Case, Count, Exists, F, FloatField, OuterRef, Q, Subquery, Sum, Value, When
+from django.db.models.functions import Cast, Coalesce, Lower, Round
 from django.contrib.auth.models import AbstractUser
 from django.core.validators import MinValueValidator, MaxValueValidator
 from django.contrib.contenttypes.models import ContentType
 from django.contrib.contenttypes.fields import GenericForeignKey
 from django.conf import settings
-from .services.nutritional_value import calculate_nutritional_value
+from django.utils import timezone
 
 
 # User model with roles and favorite recipes
@@ -28,9 +29,45 @@ class User(AbstractUser):
         blank=True
     )
 
+    # Contadores mantenidos por señales (ver core/signals.py y manage.py rebuild_user_counts)
+    recipe_count = models.PositiveIntegerField(default=0, editable=False)
+    review_count = models.PositiveIntegerField(default=0, editable=False)
+    favorite_count = models.PositiveIntegerField(default=0, editable=False)
+
+    class Meta(AbstractUser.Meta):
+        indexes = [
+            models.Index(fields=["-recipe_count"], name="user_recipe_count_idx"),
+            models.Index(fields=["-review_count"], name="user_review_count_idx"),
+            models.Index(fields=["-favorite_count"], name="user_favorite_count_idx"),
+        ]
+
     def is_admin(self):
         return self.role == "admin"
 
+    @classmethod
+    def add_to_counts(cls, user_ids, **deltas):
+        """Suma los deltas a los contadores de los usuarios en un único UPDATE."""
+        return cls.objects.filter(pk__in=user_ids).update(
+            **{field: F(field) + delta for field, delta in deltas.items()}
+        )
+
+    @classmethod
+    def count_subqueries(cls):
+        """
+        Subconsultas correlacionadas para recalcular los contadores sin
+        joins que se multipliquen: User.objects.update(**User.count_subqueries())
+        """
+        Favorite = cls.favorite_recipes.through
+        sources = {
+            "recipe_count": Recipe.objects.filter(user=OuterRef("pk")).values("user"),
+            "review_count": Review.objects.filter(user=OuterRef("pk")).values("user"),
+            "favorite_count": Favorite.objects.filter(user=OuterRef("pk")).values("user"),
+        }
+        return {
+            field: Coalesce(Subquery(rows.order_by().annotate(total=Count("pk")).values("total")), 0)
+            for field, rows in sources.items()
+        }
+
     def is_common(self):
         return self.role == "common"
     
@@ -44,6 +81,8 @@ class IngredientType(models.Model):
         ('procesado', 'Procesado'),
         ('ultraprocesado', 'Ultraprocesado'),
     ]
+    # Campos que usa el cálculo del valor nutricional de las recetas
+    SCORING_FIELDS = ("category", "vitamins", "excesses")
 
     nombre = models.CharField(max_length=100, unique=True)
     category = models.CharField(max_length=20, choices=CATEGORY_CHOICES)
@@ -57,6 +96,12 @@ class IngredientType(models.Model):
         null=True, blank=True
     )
 
+    class Meta:
+        indexes = [
+            # Búsquedas sin distinguir mayúsculas (ver IngredientTypeForm.clean_nombre)
+            models.Index(Lower("nombre"), name="ingtype_lower_nombre_idx"),
+        ]
+
 
     def save(self, *args, **kwargs):
         self.nombre = self.nombre.lower()
@@ -89,6 +134,15 @@ class Recipe(models.Model):
     ('bebida', 'Bebida'),
     ]
 
+    SCORE_STATUS_CHOICES = [
+        ('pending', 'Pendiente'),
+        ('ready', 'Calculado'),
+        ('failed', 'Fallido'),
+    ]
+
+    # Campos que alimentan el prompt de valor nutricional
+    SCORING_FIELDS = {"title", "description", "category", "portions"}
+
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="recipes")
     title = models.CharField(max_length=200)
     description = models.TextField()
@@ -98,6 +152,8 @@ class Recipe(models.Model):
         default='plato fuerte'
     )
     creation_date = models.DateTimeField(auto_now_add=True)
+    # Último cambio de la receta o de lo que muestra (ingredientes, pasos, reseñas, imagen)
+    updated_at = models.DateTimeField(auto_now=True)
     preparation_time = models.DurationField()
     portions = models.PositiveIntegerField()
 
@@ -106,29 +162,149 @@ class Recipe(models.Model):
     nutritional_value = models.IntegerField(default=0, editable=False)  # IA
     media_score = models.FloatField(default=0, editable=False)  # promedio reseñas
 
+    # Agregados de reseñas mantenidos de forma incremental (ver core/signals.py)
+    review_count = models.PositiveIntegerField(default=0, editable=False)
+    score_sum = models.PositiveIntegerField(default=0, editable=False)
+    score_count_0 = models.PositiveIntegerField(default=0, editable=False)
+    score_count_1 = models.PositiveIntegerField(default=0, editable=False)
+    score_count_2 = models.PositiveIntegerField(default=0, editable=False)
+    score_count_3 = models.PositiveIntegerField(default=0, editable=False)
+    score_count_4 = models.PositiveIntegerField(default=0, editable=False)
+    score_count_5 = models.PositiveIntegerField(default=0, editable=False)
+    score_status = models.CharField(
+        max_length=10,
+        choices=SCORE_STATUS_CHOICES,
+        default='ready',
+        editable=False
+    )
+    score_version = models.PositiveIntegerField(default=0, editable=False)  # NUTRITION_SCORE_VERSION usada
+    cover_image = models.CharField(max_length=255, blank=True, default="", editable=False)  # copia de Multimedia.file
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["-creation_date"], name="recipe_creation_date_idx"),
+            models.Index(fields=["nutritional_value"], name="recipe_nutritional_value_idx"),
+            models.Index(fields=["updated_at"], name="recipe_updated_at_idx"),
+        ]
+
     @property
     def image(self):
-        content_type = ContentType.objects.get_for_model(self)
-        media = Multimedia.objects.filter(
-            content_type=content_type,
-            object_id=self.id
-        ).first()
-        return media.file.url if media and media.file else None
+        if not self.cover_image:
+            return None
+        return Multimedia._meta.get_field("file").storage.url(self.cover_image)
 
     def __str__(self):
         return self.title
 
-    def save(self, *args, **kwargs):
-        super().save(*args, **kwargs)
-        self.nutritional_value = calculate_nutritional_value(self)
-        super().save(update_fields=["nutritional_value"])
+    @property
+    def score_pending(self):
+        return self.score_status == "pending"
+
+    @property
+    def avg_rating(self):
+        return self.score_sum / self.review_count if self.review_count else None
 
-    def update_media_score(self):
-        scores = self.reviews.all().values_list("score", flat=True)
-        if scores:
-            avg = sum(scores) / len(scores)
-            self.media_score = round(avg, 1)
-            self.save(update_fields=["media_score"])
+    @property
+    def score_histogram(self):
+        return [getattr(self, f"score_count_{score}") for score in range(6)]
+
+    @classmethod
+    def apply_review_score(cls, recipe_id, score, delta=1):
+        """
+        Suma (delta=1) o resta (delta=-1) una reseña de los agregados de la receta.
+        Se hace en un único UPDATE con expresiones F para no perder
+        actualizaciones cuando llegan reseñas concurrentes.
+        """
+        count = F("review_count") + delta
+        total = F("score_sum") + delta * score
+        fields = {
+            "review_count": count,
+            "score_sum": total,
+            "media_score": Case(
+                When(review_count__gt=-delta, then=Round(
+                    Cast(total, FloatField()) / Cast(count, FloatField()), 1
+                )),
+                default=Value(0.0),
+                output_field=FloatField(),
+            ),
+        }
+        if 0 <= score <= 5:
+            fields[f"score_count_{score}"] = F(f"score_count_{score}") + delta
+        cls.objects.filter(pk=recipe_id).update(**fields, updated_at=timezone.now())
+
+    @classmethod
+    def touch(cls, recipe_ids):
+        """Marca las recetas como modificadas (cambió algo que muestran)."""
+        return cls.objects.filter(pk__in=recipe_ids).update(updated_at=timezone.now())
+
+    @classmethod
+    def review_stats_aggregates(cls):
+        """Expresiones para recalcular los agregados desde la tabla de reseñas."""
+        aggregates = {
+            "review_count": Count("id"),
+            "score_sum": Sum("score"),
+        }
+        for score in range(6):
+            aggregates[f"score_count_{score}"] = Count("id", filter=Q(score=score))
+        return aggregates
+
+    def set_review_stats(self, stats):
+        """
+        Asigna los agregados calculados con `review_stats_aggregates` (sin
+        guardar) y el promedio. Retorna True si algún valor cambió.
+        """
+        values = {field: stats.get(field) or 0 for field in self.review_stats_aggregates()}
+        values["media_score"] = round(values["score_sum"] / values["review_count"], 1) if values["review_count"] else 0
+        changed = any(getattr(self, field) != value for field, value in values.items())
+        for field, value in values.items():
+            setattr(self, field, value)
+        return changed
+
+    @classmethod
+    def favorite_flag(cls, user):
+        """
+        Expresión EXISTS para anotar si la receta es favorita del usuario:
+        Recipe.objects.annotate(is_favorite=Recipe.favorite_flag(user))
+        """
+        return Exists(
+            User.favorite_recipes.through.objects.filter(user_id=user.pk, recipe_id=OuterRef("pk"))
+        )
+
+    @classmethod
+    def toggle_favorite(cls, user, recipe_id):
+        """
+        Agrega o quita la receta de las favoritas del usuario.
+
+        Returns:
+            True si quedó como favorita, False si se quitó, None si la receta no existe
+        """
+        # Una sola consulta para saber si la receta existe y si ya es favorita
+        is_favorite = (
+            cls.objects.filter(pk=recipe_id)
+            .annotate(is_favorite=cls.favorite_flag(user))
+            .values_list("is_favorite", flat=True)
+            .first()
+        )
+        if is_favorite is None:
+            return None
+
+        # add()/remove() envían m2m_changed (ver core/signals.py)
+        if is_favorite:
+            user.favorite_recipes.remove(recipe_id)
+        else:
+            user.favorite_recipes.add(recipe_id)
+        return not is_favorite
+
+    @classmethod
+    def sync_cover_image(cls, recipe_id):
+        """Copia en cover_image el archivo de la primera Multimedia de la receta."""
+        media = Multimedia.objects.filter(
+            content_type=ContentType.objects.get_for_model(cls),
+            object_id=recipe_id
+        ).first()
+        name = media.file.name if media and media.file else ""
+        cls.objects.filter(pk=recipe_id).update(cover_image=name, updated_at=timezone.now())
+        return name
 
 
 # Review model for user reviews on recipes
@@ -139,6 +315,12 @@ class Review(models.Model):
     comment = models.TextField(blank=True, null=True)
     creation_date = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["recipe", "creation_date"], name="review_recipe_date_idx"),
+            models.Index(fields=["user", "creation_date"], name="review_user_date_idx"),
+        ]
+
     def __str__(self):
         return f"Reseña de {self.user.username} para {self.recipe.title}"
     
@@ -151,6 +333,11 @@ class Instruction(models.Model):
     complexity = models.PositiveIntegerField(validators=[MinValueValidator(0), MaxValueValidator(5)]) 
     n_step = models.PositiveIntegerField()  # número de paso
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["recipe", "n_step"], name="instruction_recipe_step_idx"),
+        ]
+
     def __str__(self):
         return f"Paso {self.n_step}: {self.title}"
     
@@ -165,5 +352,147 @@ class Multimedia(models.Model):
     object_id = models.PositiveIntegerField()
     content_object = GenericForeignKey("content_type", "object_id")
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["content_type", "object_id"], name="multimedia_object_idx"),
+        ]
+
+    def __str__(self):
+        return f"Media for {self.content_object}"
+
+
+# Cola de trabajos para calcular el valor nutricional fuera del request
+class NutritionJob(models.Model):
+    STATUS_CHOICES = [
+        ('pending', 'Pendiente'),
+        ('running', 'En proceso'),
+        ('done', 'Completado'),
+        ('failed', 'Fallido'),
+    ]
+
+    recipe = models.ForeignKey(Recipe, on_delete=models.CASCADE, related_name="nutrition_jobs")
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True, default="")
+    run_after = models.DateTimeField(default=timezone.now)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            # Un solo trabajo pendiente por receta
+            models.UniqueConstraint(
+                fields=["recipe"],
+                condition=models.Q(status="pending"),
+                name="unique_pending_nutrition_job",
+            ),
+        ]
+        indexes = [
+            models.Index(fields=["status", "run_after"], name="nutritionjob_status_idx"),
+        ]
+
+    def __str__(self):
+        return f"Trabajo {self.status} para {self.recipe_id}"
+
+
+
+# Caché persistente de puntajes indexada por la huella de los datos del prompt
+class NutritionScoreCache(models.Model):
+    fingerprint = models.CharField(max_length=64, unique=True)
+    score = models.IntegerField()
+    hits = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    last_used_at = models.DateTimeField(default=timezone.now, db_index=True)
+
+    def __str__(self):
+        return f"{self.fingerprint[:12]}… = {self.score}"
+
+
+# Registro de cambios de recetas para sincronización incremental (ver core/services/change_feed.py)
+class RecipeChange(models.Model):
+    ACTION_CHOICES = [
+        ('upsert', 'Creada o modificada'),
+        ('delete', 'Eliminada'),
+    ]
+
+    seq = models.BigAutoField(primary_key=True)  # cursor monótono
+    recipe_id = models.BigIntegerField()  # sin llave foránea: la marca de borrado sobrevive a la receta
+    action = models.CharField(max_length=10, choices=ACTION_CHOICES)
+    changed_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["recipe_id", "seq"], name="recipechange_recipe_seq_idx"),
+        ]
+
+    def __str__(self):
+        return f"#{self.seq} {self.action} {self.recipe_id}"
+
+
+# Versiones compartidas por todos los procesos, por ejemplo la del catálogo
+# con la que se arman las llaves de la caché de la API (ver core/services/api_cache.py)
+class CacheVersion(models.Model):
+    name = models.CharField(max_length=50, primary_key=True)
+    value = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.name} = {self.value}"
+
+
+# Estadísticas del panel de administración mantenidas por señales (ver core/services/dashboard_stats.py)
+class DashboardStat(models.Model):
+    name = models.CharField(max_length=50, primary_key=True)
+    value = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.name} = {self.value}"
+
+
+# Puntaje de cada receta en los rankings del panel; el top N se lee con el índice
+class LeaderboardEntry(models.Model):
+    BOARD_CHOICES = [
+        ('recipes', 'Recetas mejor calificadas'),
+    ]
+
+    board = models.CharField(max_length=20, choices=BOARD_CHOICES)
+    object_id = models.BigIntegerField()
+    score = models.FloatField(default=0)
+    tiebreak = models.BigIntegerField(default=0)  # segundo criterio de orden (reseñas de la receta)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["board", "object_id"], name="unique_leaderboard_entry"),
+        ]
+        indexes = [
+            models.Index(fields=["board", "-score", "-tiebreak"], name="leaderboard_rank_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.board} {self.object_id}: {self.score}"
+
+
+# Actividad por hora y por día para las gráficas del panel (ver core/services/activity_rollups.py)
+class ActivityRollup(models.Model):
+    METRIC_CHOICES = [
+        ('recipes', 'Recetas'),
+        ('reviews', 'Reseñas'),
+        ('users', 'Registros'),
+        ('favorites', 'Favoritas'),
+    ]
+    GRANULARITY_CHOICES = [
+        ('hour', 'Hora'),
+        ('day', 'Día'),
+    ]
+
+    metric = models.CharField(max_length=20, choices=METRIC_CHOICES)
+    granularity = models.CharField(max_length=10, choices=GRANULARITY_CHOICES)
+    bucket = models.DateTimeField()  # inicio del intervalo, en UTC
+    count = models.BigIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["metric", "granularity", "bucket"], name="unique_activity_bucket"),
+        ]
+
     def __str__(self):
-        return f"Media for {self.content_object}"
\ No newline at end of file
+        return f"{self.metric} {self.granularity} {self.bucket:%Y-%m-%d %H:%M}: {self.count}"
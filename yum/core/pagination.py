@@ -0,0 +1,310 @@
+# Autor: Ana Sofía Alfonso
+"""
+Paginación por cursor (keyset) y paginación con conteo estimado.
+
+En vez de OFFSET, cada página pide "los siguientes N registros después
+del último que vi" según las columnas de orden, por ejemplo
+(creation_date, id). El costo de una página no depende de qué tan
+profunda sea, y los registros nuevos no desplazan las páginas siguientes.
+
+El cursor es un token opaco (JSON en base64) con los valores de orden del
+último registro de la página anterior. Las columnas de orden no deben
+tener valores nulos; siempre se agrega la llave primaria para desempatar.
+
+EstimatedCountPaginator mantiene la paginación por número de página de
+los listados del panel pero evita el COUNT(*) exacto en cada visita: sin
+filtros toma el total materializado en DashboardStat, con filtros cuenta
+como máximo `exact_count_limit` filas y, si hay más, pasa a navegación de
+solo anterior/siguiente sin total de páginas.
+"""
+import base64
+import json
+from math import ceil
+from dataclasses import dataclass, field
+
+from django.core.paginator import EmptyPage, Page, PageNotAnInteger, Paginator
+from django.db.models import Q
+from django.urls import reverse
+from django.utils.functional import cached_property
+
+from core.models import DashboardStat
+
+
+class InvalidCursor(ValueError):
+    """El cursor no se pudo decodificar o no corresponde al orden pedido."""
+
+
+def encode_cursor(values):
+    # default=str conserva los microsegundos de las fechas (DjangoJSONEncoder los recorta)
+    data = json.dumps(values, default=str, separators=(",", ":"))
+    return base64.urlsafe_b64encode(data.encode()).decode().rstrip("=")
+
+
+def decode_cursor(token):
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (ValueError, TypeError) as e:
+        raise InvalidCursor(f"Cursor inválido: {token!r}") from e
+    if not isinstance(values, list):
+        raise InvalidCursor(f"Cursor inválido: {token!r}")
+    return values
+
+
+def complete_ordering(ordering):
+    """Agrega la llave primaria al final del orden si no está, en la misma dirección."""
+    ordering = list(ordering)
+    if not any(key.lstrip("-") in ("pk", "id") for key in ordering):
+        descending = bool(ordering) and ordering[0].startswith("-")
+        ordering.append("-pk" if descending else "pk")
+    return tuple(ordering)
+
+
+def keyset_filter(ordering, values):
+    """
+    Condición "después de `values`" para el orden dado. Para
+    ("-creation_date", "-pk") produce:
+        creation_date < v1  OR  (creation_date = v1 AND pk < v2)
+    """
+    condition = Q()
+    equal = Q()
+    for key, value in zip(ordering, values):
+        name = key.lstrip("-")
+        lookup = "lt" if key.startswith("-") else "gt"
+        condition |= equal & Q(**{f"{name}__{lookup}": value})
+        equal &= Q(**{name: value})
+    return condition
+
+
+@dataclass
+class KeysetPage:
+    object_list: list
+    next_cursor: str = None
+    ordering: tuple = field(default_factory=tuple)
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+
+class KeysetPaginator:
+    def __init__(self, queryset, ordering, per_page=20):
+        self.ordering = complete_ordering(ordering)
+        self.queryset = queryset.order_by(*self.ordering)
+        self.per_page = per_page
+
+    def page(self, cursor=None):
+        """
+        Retorna la página que sigue al cursor (la primera si no hay cursor).
+
+        Raises:
+            InvalidCursor: Si el cursor no corresponde a este orden
+        """
+        queryset = self.queryset
+        if cursor:
+            values = decode_cursor(cursor)
+            if len(values) != len(self.ordering):
+                raise InvalidCursor("El cursor no corresponde al orden pedido")
+            queryset = queryset.filter(keyset_filter(self.ordering, values))
+
+        # Se pide un registro extra solo para saber si hay otra página
+        rows = list(queryset[:self.per_page + 1])
+        next_cursor = None
+        if len(rows) > self.per_page:
+            rows = rows[:self.per_page]
+            next_cursor = encode_cursor([self._value(rows[-1], key) for key in self.ordering])
+        return KeysetPage(rows, next_cursor, self.ordering)
+
+    @staticmethod
+    def _value(obj, key):
+        name = key.lstrip("-")
+        if isinstance(obj, dict):
+            return obj["id" if name == "pk" else name]
+        return getattr(obj, name)
+
+
+class KeysetPaginationMixin:
+    """
+    Paginación por cursor para ListView. La vista define `paginate_by` y
+    `default_ordering`. Para scroll infinito define además
+    `fragment_template_name`, `fragment_url_name` (la URL registrada con
+    `as_view(fragment=True)`, que solo renderiza la página) y
+    `card_template_name` (la tarjeta que el fragmento repite).
+
+    Si el queryset ya viene ordenado (por ejemplo por relevancia) se usa ese
+    orden; si no, `get_keyset_ordering()`.
+    """
+    paginate_by = 20
+    default_ordering = ("-creation_date",)
+    fragment = False
+    fragment_template_name = None
+    fragment_url_name = None
+    card_template_name = None
+
+    def get_keyset_ordering(self):
+        return self.default_ordering
+
+    def get_template_names(self):
+        if self.fragment and self.fragment_template_name:
+            return [self.fragment_template_name]
+        return super().get_template_names()
+
+    def get_context_data(self, **kwargs):
+        queryset = kwargs.pop("object_list", self.object_list)
+        ordering = [key for key in queryset.query.order_by if isinstance(key, str)] or self.get_keyset_ordering()
+
+        paginator = KeysetPaginator(queryset, ordering, self.paginate_by)
+        try:
+            page = paginator.page(self.request.GET.get("cursor"))
+        except InvalidCursor:
+            page = paginator.page()
+
+        # ListView no debe volver a paginar con OFFSET
+        self.paginate_by = None
+        context = super().get_context_data(object_list=page.object_list, **kwargs)
+        context["keyset_page"] = page
+        context["card_template_name"] = self.card_template_name
+        if page.has_next:
+            params = self.request.GET.copy()
+            params["cursor"] = page.next_cursor
+            context["next_page_query"] = params.urlencode()
+            if self.fragment_url_name:
+                context["next_fragment_url"] = f"{reverse(self.fragment_url_name)}?{context['next_page_query']}"
+        return context
+
+
+# Paginación con conteo estimado
+
+class EstimatedCountPage(Page):
+    def __init__(self, object_list, number, paginator, has_next):
+        super().__init__(object_list, number, paginator)
+        self._has_next = has_next
+
+    def has_next(self):
+        return self._has_next
+
+    def end_index(self):
+        return self.start_index() + len(self.object_list) - 1
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginador que no cuenta la tabla completa.
+
+    - Con `estimate` (por ejemplo el total materializado) ese es el conteo.
+    - Sin estimado cuenta como máximo `exact_count_limit` filas; si hay más,
+      `count` y `num_pages` son None y solo se navega con anterior/siguiente.
+
+    Cada página pide un registro extra para saber si hay siguiente, así
+    `has_next` es correcto aunque el estimado esté desactualizado.
+    """
+    exact_count_limit = 1000
+
+    def __init__(self, object_list, per_page, orphans=0, allow_empty_first_page=True, estimate=None,
+                 exact_count_limit=None, **kwargs):
+        super().__init__(object_list, per_page, orphans, allow_empty_first_page, **kwargs)
+        self.estimate = estimate
+        if exact_count_limit is not None:
+            self.exact_count_limit = exact_count_limit
+
+    @property
+    def count_is_estimated(self):
+        return self.estimate is not None
+
+    @cached_property
+    def count(self):
+        if self.estimate is not None:
+            return self.estimate
+        # COUNT sobre una subconsulta con LIMIT: se detiene en el límite
+        count = self.object_list.order_by()[:self.exact_count_limit + 1].count()
+        return count if count <= self.exact_count_limit else None
+
+    @cached_property
+    def num_pages(self):
+        if self.count is None:
+            return None
+        return super().num_pages
+
+    @property
+    def page_range(self):
+        if self.num_pages is None:
+            return range(0)
+        return super().page_range
+
+    def validate_number(self, number):
+        """Con conteo exacto valida contra el total; si no, solo que sea un entero positivo."""
+        if self.count is not None and not self.count_is_estimated:
+            return super().validate_number(number)
+        try:
+            if isinstance(number, float) and not number.is_integer():
+                raise ValueError
+            number = int(number)
+        except (TypeError, ValueError):
+            raise PageNotAnInteger(self.error_messages["invalid_page"])
+        if number < 1:
+            raise EmptyPage(self.error_messages["min_page"])
+        return number
+
+    def last_page_number(self):
+        """
+        Número de la última página. Si el total es estimado o desconocido
+        hace un conteo exacto: solo se usa cuando se pide `?page=last`.
+        """
+        count = self.count if self.count is not None and not self.count_is_estimated else self.object_list.count()
+        hits = max(1, count - self.orphans)
+        return ceil(hits / self.per_page)
+
+    def page(self, number):
+        number = self.validate_number(number)
+        bottom = (number - 1) * self.per_page
+        rows = list(self.object_list[bottom:bottom + self.per_page + 1])
+        if not rows and number > 1:
+            raise EmptyPage(self.error_messages["no_results"])
+        return EstimatedCountPage(rows[:self.per_page], number, self, has_next=len(rows) > self.per_page)
+
+
+class EstimatedCountPaginationMixin:
+    """
+    Usa EstimatedCountPaginator en un ListView. `count_stat` es el nombre
+    del total de DashboardStat que cuenta la tabla sin filtros; si el
+    queryset tiene filtros (o el total no existe) se cuenta con límite.
+    """
+    paginator_class = EstimatedCountPaginator
+    count_stat = None
+
+    def get_estimated_count(self, queryset):
+        if not self.count_stat or queryset.query.where:
+            return None
+        return DashboardStat.objects.filter(name=self.count_stat).values_list("value", flat=True).first()
+
+    def get_paginator(self, queryset, per_page, orphans=0, allow_empty_first_page=True, **kwargs):
+        return self.paginator_class(
+            queryset,
+            per_page,
+            orphans=orphans,
+            allow_empty_first_page=allow_empty_first_page,
+            estimate=self.get_estimated_count(queryset),
+            **kwargs,
+        )
+
+    def paginate_queryset(self, queryset, page_size):
+        page = self.kwargs.get(self.page_kwarg) or self.request.GET.get(self.page_kwarg)
+        if page != "last":
+            return super().paginate_queryset(queryset, page_size)
+        # ListView usaría num_pages, que aquí puede ser estimado o None
+        paginator = self.get_paginator(
+            queryset,
+            page_size,
+            orphans=self.get_paginate_orphans(),
+            allow_empty_first_page=self.get_allow_empty(),
+        )
+        page = paginator.page(paginator.last_page_number())
+        return (paginator, page, page.object_list, page.has_other_pages())
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        # Filtros actuales para conservarlos en los enlaces de las páginas
+        params = self.request.GET.copy()
+        params.pop("page", None)
+        context["filter_query"] = params.urlencode()
+        return context
@@ -0,0 +1,144 @@
+# Autor: Ana Sofía Alfonso
+"""
+Resúmenes de actividad por hora y por día.
+
+ActivityRollup guarda, por métrica e intervalo, cuántos registros se
+crearon: recetas (`Recipe.creation_date`), reseñas (`Review.creation_date`),
+registros de usuarios (`User.date_joined`) y recetas marcadas como
+favoritas. Las señales suman (o restan al borrar) en el intervalo de la
+hora y en el del día, así una serie de N intervalos se lee con una
+consulta de N filas sin agrupar las tablas completas.
+
+Las favoritas no tienen fecha en la tabla intermedia: se cuentan al
+marcarse y no se pueden reconstruir con `backfill`; borrar una favorita no
+resta. Los intervalos se calculan en UTC.
+
+Para llenar los datos existentes o corregir desvíos:
+    python manage.py backfill_activity_rollups
+"""
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.db import transaction
+from django.db.models import Count
+from django.db.models.functions import TruncDay, TruncHour
+
+from core.models import ActivityRollup, Recipe, Review, User
+from .counters import increment
+
+# Métricas que se pueden reconstruir desde las tablas: modelo y campo de fecha
+SOURCES = {
+    "recipes": (Recipe, "creation_date"),
+    "reviews": (Review, "creation_date"),
+    "users": (User, "date_joined"),
+}
+METRICS = [*SOURCES, "favorites"]
+GRANULARITIES = {"hour": timedelta(hours=1), "day": timedelta(days=1), "week": timedelta(weeks=1)}
+
+# Máximo de intervalos por consulta de la serie
+MAX_BUCKETS = 5000
+
+
+def truncate(moment, granularity):
+    """Inicio (UTC) del intervalo que contiene `moment`."""
+    moment = moment.astimezone(dt_timezone.utc)
+    if granularity == "hour":
+        return moment.replace(minute=0, second=0, microsecond=0)
+    day = moment.replace(hour=0, minute=0, second=0, microsecond=0)
+    if granularity == "week":
+        return day - timedelta(days=day.weekday())
+    return day
+
+
+def record(metric, moment, delta=1):
+    """Suma `delta` a los intervalos de hora y de día que contienen `moment`."""
+    for granularity in ("hour", "day"):
+        increment(
+            ActivityRollup,
+            {"metric": metric, "granularity": granularity, "bucket": truncate(moment, granularity)},
+            count=delta,
+        )
+
+
+def backfill(metrics=None, since=None, until=None):
+    """
+    Recalcula desde las tablas los intervalos de las métricas entre los
+    días `since` (inclusive) y `until` (exclusive); sin límites, todo.
+    Retorna cuántas filas se escribieron por métrica.
+    """
+    since = truncate(since, "day") if since else None
+    until = truncate(until, "day") if until else None
+    written = {}
+    for metric in metrics or SOURCES:
+        model, field = SOURCES[metric]
+        rows = model.objects.all()
+        existing = ActivityRollup.objects.filter(metric=metric)
+        if since:
+            rows = rows.filter(**{f"{field}__gte": since})
+            existing = existing.filter(bucket__gte=since)
+        if until:
+            rows = rows.filter(**{f"{field}__lt": until})
+            existing = existing.filter(bucket__lt=until)
+
+        rollups = []
+        for granularity, trunc in (("hour", TruncHour), ("day", TruncDay)):
+            grouped = (
+                rows.annotate(bucket=trunc(field, tzinfo=dt_timezone.utc))
+                .values("bucket")
+                .annotate(count=Count("pk"))
+                .order_by()
+            )
+            rollups.extend(
+                ActivityRollup(metric=metric, granularity=granularity, bucket=row["bucket"], count=row["count"])
+                for row in grouped.iterator()
+            )
+        with transaction.atomic():
+            existing.delete()
+            ActivityRollup.objects.bulk_create(rollups, batch_size=1000)
+        written[metric] = len(rollups)
+    return written
+
+
+def series(metric, granularity, start, end):
+    """
+    Conteos por intervalo entre `start` y `end` (inclusive), con ceros en
+    los intervalos sin actividad. Las semanas se arman sumando días.
+
+    Raises:
+        ValueError: Si la métrica o la granularidad no existen, o el rango
+            tiene demasiados intervalos
+    """
+    if metric not in METRICS:
+        raise ValueError(f"Métrica desconocida: {metric}")
+    if granularity not in GRANULARITIES:
+        raise ValueError(f"Granularidad desconocida: {granularity}")
+
+    step = GRANULARITIES[granularity]
+    first = truncate(start, granularity)
+    last = truncate(end, granularity)
+    if last < first:
+        raise ValueError("El fin del rango es anterior al inicio")
+    if (last - first) / step >= MAX_BUCKETS:
+        raise ValueError(f"El rango tiene más de {MAX_BUCKETS} intervalos")
+
+    stored = "hour" if granularity == "hour" else "day"
+    counts = {}
+    for bucket, count in ActivityRollup.objects.filter(
+        metric=metric, granularity=stored, bucket__gte=first, bucket__lt=last + step
+    ).values_list("bucket", "count"):
+        key = truncate(bucket, granularity)
+        counts[key] = counts.get(key, 0) + count
+
+    result = []
+    bucket = first
+    while bucket <= last:
+        result.append((bucket, counts.get(bucket, 0)))
+        bucket += step
+    return result
+
+
+def parse_moment(value):
+    """Fecha ("2026-01-31") o fecha y hora ISO 8601; sin zona horaria se toma UTC."""
+    moment = datetime.fromisoformat(value)
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=dt_timezone.utc)
+    return moment
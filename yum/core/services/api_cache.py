@@ -0,0 +1,151 @@
+# Autor: Ana Sofía Alfonso
+"""
+Caché de las respuestas de la API pública de recetas.
+
+Cada respuesta serializada se guarda con una llave que combina la versión
+del catálogo y los parámetros de la consulta (en cualquier orden). Las
+escrituras de recetas, reseñas, ingredientes e instrucciones incrementan
+la versión: las llaves viejas dejan de usarse y expiran solas, sin tener
+que saber qué páginas cambiaron.
+
+Cuando una llave no está, solo un proceso la reconstruye (toma un candado
+con `cache.add`); los demás esperan a que aparezca el resultado y, si
+tarda demasiado, la calculan ellos mismos.
+
+La versión vive en una fila de la base de datos (CacheVersion), así la
+ve cualquier proceso: un cambio hecho por `process_nutrition_jobs` o
+`rescore_recipes` invalida también las respuestas que guardan los
+procesos web, aunque cada uno tenga su propia caché en memoria local.
+Leerla es una consulta por llave primaria en cada request.
+"""
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models import F
+
+from core.models import CacheVersion
+from .transaction_buffer import TransactionBuffer
+
+PREFIX = "recipes_api"
+STATS = ("hits", "misses", "rebuilds", "waits")
+
+
+def get_cache():
+    return caches[getattr(settings, "API_CACHE_ALIAS", "default")]
+
+
+def get_timeout():
+    return getattr(settings, "API_CACHE_TIMEOUT", 300)
+
+
+def get_lock_timeout():
+    return getattr(settings, "API_CACHE_LOCK_TIMEOUT", 10)
+
+
+def _initial_version():
+    # Si la fila no existe (base nueva o borrada) no debe volver a un número
+    # ya usado por llaves que sigan en la caché: se parte de la hora actual
+    return time.time_ns() // 1000
+
+
+def get_catalog_version():
+    versions = CacheVersion.objects.filter(name=PREFIX).values_list("value", flat=True)
+    version = versions.first()
+    if version is None:
+        # ignore_conflicts no pisa la versión si otro proceso la creó primero
+        CacheVersion.objects.bulk_create([CacheVersion(name=PREFIX, value=_initial_version())], ignore_conflicts=True)
+        version = versions.first()
+    return version
+
+
+def _bump(pending=None):
+    if not CacheVersion.objects.filter(name=PREFIX).update(value=F("value") + 1):
+        get_catalog_version()
+
+
+# Dentro de una transacción se incrementa una sola vez, al confirmarla
+_pending_bump = TransactionBuffer(_bump)
+
+
+def bump_catalog_version():
+    """
+    Invalida todas las respuestas guardadas. Dentro de una transacción la
+    versión sube una sola vez al confirmarla (y nada si se revierte): un
+    request que leyó la versión anterior guarda su respuesta con una llave
+    que ya no se usa.
+    """
+    if not transaction.get_connection().in_atomic_block:
+        _bump()
+        return
+    _pending_bump.open()[PREFIX] = True
+
+
+def make_key(params, version):
+    """Llave para los parámetros de la consulta (QueryDict), sin importar su orden."""
+    items = sorted((name, value) for name, values in params.lists() for value in values)
+    digest = hashlib.sha256(repr(items).encode()).hexdigest()
+    return f"{PREFIX}:v{version}:{digest}"
+
+
+def _count(name):
+    cache = get_cache()
+    key = f"{PREFIX}:stats:{name}"
+    try:
+        cache.incr(key)
+    except ValueError:
+        if not cache.add(key, 1, timeout=None):
+            cache.incr(key)
+
+
+def get_stats():
+    """Contadores de uso y tasa de aciertos."""
+    cache = get_cache()
+    stats = {name: cache.get(f"{PREFIX}:stats:{name}", 0) for name in STATS}
+    lookups = stats["hits"] + stats["misses"]
+    stats["hit_rate"] = stats["hits"] / lookups if lookups else 0.0
+    stats["catalog_version"] = get_catalog_version()
+    return stats
+
+
+def reset_stats():
+    get_cache().delete_many([f"{PREFIX}:stats:{name}" for name in STATS])
+
+
+def get_or_build(params, build, poll_interval=0.05):
+    """
+    Retorna `(valor, hit)`. `build()` solo se llama si la llave no está en
+    la caché y este proceso obtuvo el candado (o se agotó la espera).
+    """
+    cache = get_cache()
+    key = make_key(params, get_catalog_version())
+    value = cache.get(key)
+    if value is not None:
+        _count("hits")
+        return value, True
+
+    _count("misses")
+    lock_key = f"{key}:lock"
+    lock_timeout = get_lock_timeout()
+    locked = cache.add(lock_key, 1, timeout=lock_timeout)
+    if not locked:
+        # Otro proceso está calculando la misma página
+        _count("waits")
+        deadline = time.monotonic() + lock_timeout
+        while time.monotonic() < deadline:
+            time.sleep(poll_interval)
+            value = cache.get(key)
+            if value is not None:
+                return value, True
+
+    try:
+        _count("rebuilds")
+        value = build()
+        if value is not None:
+            cache.set(key, value, timeout=get_timeout())
+        return value, False
+    finally:
+        if locked:
+            cache.delete(lock_key)
@@ -0,0 +1,79 @@
+# Autor: Ana Sofía Alfonso
+"""
+Registro de cambios de recetas para sincronización incremental.
+
+Cada vez que cambia algo de una receta se agrega una fila a RecipeChange
+con un número de secuencia creciente (`seq`) y la acción: "upsert" si se
+creó o modificó, "delete" si se eliminó (marca de borrado). Un consumidor
+guarda el último `seq` que procesó y pide solo lo que pasó después, así el
+costo de sincronizar depende de cuántas recetas cambiaron y no del tamaño
+del catálogo. Con `since=0` se recibe el catálogo completo.
+
+Los cambios de una transacción se agrupan (una fila por receta) y se
+escriben al confirmarla. La compactación (`manage.py compact_recipe_changes`)
+borra las filas que tienen otra más nueva para la misma receta: el
+registro queda con a lo sumo una fila por receta, y un cursor viejo sigue
+siendo válido porque la fila que sobrevive tiene un `seq` mayor.
+"""
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+
+from core.models import RecipeChange
+from .transaction_buffer import TransactionBuffer
+
+
+def record_changes(changes):
+    """Escribe las filas del registro. `changes` es un diccionario receta -> acción."""
+    RecipeChange.objects.bulk_create(
+        [RecipeChange(recipe_id=recipe_id, action=action) for recipe_id, action in sorted(changes.items())]
+    )
+
+
+# Cambios de la transacción actual; se descartan si se revierte
+_pending = TransactionBuffer(record_changes)
+
+
+def mark_recipe_changed(recipe_id, action="upsert"):
+    """Registra el cambio de la receta; dentro de una transacción, una vez al confirmarla."""
+    if not transaction.get_connection().in_atomic_block:
+        record_changes({recipe_id: action})
+        return
+    pending = _pending.open()
+    # Un borrado no se puede deshacer con un cambio posterior de la misma transacción
+    if pending.get(recipe_id) != "delete":
+        pending[recipe_id] = action
+
+
+def mark_recipes_changed(recipe_ids):
+    for recipe_id in recipe_ids:
+        mark_recipe_changed(recipe_id)
+
+
+def changes_since(since, limit):
+    """
+    Cambios con `seq` mayor que `since`, como máximo `limit`, en orden.
+    Si una receta aparece varias veces en la página solo queda la última.
+
+    Returns:
+        (lista de (seq, recipe_id, acción), último seq leído, hay más)
+    """
+    rows = list(
+        RecipeChange.objects.filter(seq__gt=since)
+        .order_by("seq")
+        .values_list("seq", "recipe_id", "action")[:limit + 1]
+    )
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    last_seq = rows[-1][0] if rows else since
+
+    latest = {}
+    for seq, recipe_id, action in rows:
+        latest[recipe_id] = (seq, recipe_id, action)
+    return sorted(latest.values()), last_seq, has_more
+
+
+def compact_changes():
+    """Borra las filas reemplazadas por otra más nueva de la misma receta. Retorna cuántas."""
+    newer = RecipeChange.objects.filter(recipe_id=OuterRef("recipe_id"), seq__gt=OuterRef("seq"))
+    deleted, _ = RecipeChange.objects.filter(Exists(newer)).delete()
+    return deleted
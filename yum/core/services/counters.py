@@ -0,0 +1,24 @@
+# Autor: Ana Sofía Alfonso
+"""
+Contadores materializados: incrementos atómicos sobre una fila que se
+crea la primera vez que hace falta.
+"""
+from django.db import IntegrityError, transaction
+from django.db.models import F
+
+
+def increment(model, lookup, create=True, **deltas):
+    """
+    Suma los deltas a la fila que cumple `lookup` con un único UPDATE
+    (campo = campo + delta). Si no existe y `create` es verdadero, la crea
+    con esos valores.
+    """
+    increments = {field: F(field) + delta for field, delta in deltas.items()}
+    if model.objects.filter(**lookup).update(**increments) or not create:
+        return
+    try:
+        with transaction.atomic():
+            model.objects.create(**lookup, **deltas)
+    except IntegrityError:
+        # Otro proceso la creó al mismo tiempo
+        model.objects.filter(**lookup).update(**increments)
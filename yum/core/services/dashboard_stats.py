@@ -0,0 +1,120 @@
+# Autor: Ana Sofía Alfonso
+"""
+Estadísticas materializadas del panel de administración.
+
+Los totales (usuarios, recetas, reseñas, tipos de ingrediente y suma de
+puntajes para el promedio global) viven en DashboardStat y el ranking de
+recetas en LeaderboardEntry (una fila por receta con reseñas). Las señales
+los actualizan con UPDATE ... SET valor = valor + delta dentro de la misma
+transacción del cambio, así el panel se arma con una lectura de los totales
+y, por ranking, una lectura por índice del top N y otra por llave primaria
+de las recetas. Los rankings de usuarios se leen directamente de los
+contadores indexados de User (recipe_count, review_count).
+
+Si algo se escribe sin pasar por las señales (update(), bulk_create,
+SQL directo) los valores se desvían; `manage.py reconcile_dashboard_stats`
+los recalcula desde las tablas y reporta la diferencia.
+"""
+from django.db import transaction
+from django.db.models import Count, Sum
+
+from core.models import DashboardStat, IngredientType, LeaderboardEntry, Recipe, Review, User
+from .counters import increment
+
+TOP_N = 5
+
+
+def add_to_stat(name, delta):
+    increment(DashboardStat, {"name": name}, value=delta)
+
+
+def remove_from_board(board, object_id):
+    LeaderboardEntry.objects.filter(board=board, object_id=object_id).delete()
+
+
+def refresh_recipe_rating(recipe_id):
+    """Copia al ranking el promedio y la cantidad de reseñas de la receta."""
+    stats = Recipe.objects.filter(pk=recipe_id).values_list("media_score", "review_count").first()
+    if not stats or not stats[1]:
+        remove_from_board("recipes", recipe_id)
+        return
+    media_score, review_count = stats
+    updated = LeaderboardEntry.objects.filter(board="recipes", object_id=recipe_id).update(
+        score=media_score, tiebreak=review_count
+    )
+    if not updated:
+        LeaderboardEntry.objects.bulk_create(
+            [LeaderboardEntry(board="recipes", object_id=recipe_id, score=media_score, tiebreak=review_count)],
+            ignore_conflicts=True,
+        )
+
+
+def get_totals():
+    totals = dict(DashboardStat.objects.values_list("name", "value"))
+    reviews = totals.get("reviews", 0)
+    totals["global_avg_score"] = totals.get("review_score_sum", 0) / reviews if reviews else 0
+    return totals
+
+
+def top(board, model, limit=TOP_N):
+    """
+    Los `limit` primeros del ranking como instancias de `model`: una
+    consulta por índice y otra por llave primaria.
+    """
+    object_ids = list(
+        LeaderboardEntry.objects.filter(board=board)
+        .order_by("-score", "-tiebreak", "object_id")
+        .values_list("object_id", flat=True)[:limit]
+    )
+    objects = model.objects.in_bulk(object_ids)
+    return [objects[object_id] for object_id in object_ids if object_id in objects]
+
+
+def top_users(counter, limit=TOP_N):
+    """Los `limit` usuarios con el contador más alto (recipe_count o review_count), por su índice."""
+    return list(User.objects.filter(**{f"{counter}__gt": 0}).order_by(f"-{counter}", "pk")[:limit])
+
+
+# Reconciliación
+
+def compute_totals():
+    reviews = Review.objects.aggregate(count=Count("id"), score_sum=Sum("score"))
+    return {
+        "users": User.objects.count(),
+        "recipes": Recipe.objects.count(),
+        "reviews": reviews["count"],
+        "review_score_sum": reviews["score_sum"] or 0,
+        "ingredient_types": IngredientType.objects.count(),
+    }
+
+
+def compute_boards():
+    return [
+        LeaderboardEntry(board="recipes", object_id=pk, score=media_score, tiebreak=review_count)
+        for pk, media_score, review_count in Recipe.objects.filter(review_count__gt=0).values_list(
+            "pk", "media_score", "review_count"
+        ).iterator()
+    ]
+
+
+def reconcile():
+    """
+    Recalcula totales y rankings desde las tablas.
+
+    Returns:
+        Diccionario nombre -> (valor guardado, valor real) de los totales que no coincidían
+    """
+    with transaction.atomic():
+        stored = dict(DashboardStat.objects.select_for_update().values_list("name", "value"))
+        actual = compute_totals()
+        drift = {
+            name: (stored.get(name, 0), value)
+            for name, value in actual.items()
+            if stored.get(name, 0) != value
+        }
+        DashboardStat.objects.all().delete()
+        DashboardStat.objects.bulk_create([DashboardStat(name=name, value=value) for name, value in actual.items()])
+
+        LeaderboardEntry.objects.all().delete()
+        LeaderboardEntry.objects.bulk_create(compute_boards(), batch_size=1000)
+    return drift
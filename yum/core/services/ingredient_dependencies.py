@@ -0,0 +1,76 @@
+# Autor: Ana Sofía Alfonso
+"""
+Dependencias entre tipos de ingrediente y recetas.
+
+Cuando cambian la categoría, las vitaminas o los excesos de un
+IngredientType, el valor nutricional de todas las recetas que lo usan
+queda desactualizado. La tabla Ingredient (indexada por ingredient_type)
+sirve como índice tipo → recetas para encolar exactamente esas recetas.
+"""
+import math
+
+from django.conf import settings
+
+from core.models import Ingredient, NutritionJob
+from .nutrition_jobs import enqueue_recipe_scores
+from .nutritional_value import get_batch_size, get_scoring_engine
+
+
+def get_rescore_rate():
+    """Recetas por minuto que se encolan tras editar un tipo de ingrediente."""
+    return getattr(settings, "NUTRITION_TYPE_RESCORE_PER_MINUTE", 60)
+
+
+def scoring_fields_changed(previous, ingredient_type):
+    """Compara los campos de cálculo con los valores anteriores (dict o None)."""
+    if previous is None:
+        return False
+    return any(previous[field] != getattr(ingredient_type, field) for field in ingredient_type.SCORING_FIELDS)
+
+
+def recipes_using_types(type_ids):
+    """Ids de las recetas que usan alguno de los tipos, sin repetir."""
+    return set(
+        Ingredient.objects.filter(ingredient_type_id__in=type_ids)
+        .values_list("recipe_id", flat=True)
+        .distinct()
+    )
+
+
+def estimate_rescore(recipe_ids):
+    """
+    Estima el costo de recalcular las recetas.
+
+    Returns:
+        Dict con recetas afectadas, las que ya estaban en cola, llamadas
+        al modelo y minutos aproximados hasta terminar.
+    """
+    recipes = len(recipe_ids)
+    already_pending = NutritionJob.objects.filter(recipe_id__in=recipe_ids, status="pending").count()
+
+    # La huella de la caché incluye vitaminas y excesos: ninguna receta afectada estará en caché
+    engine = get_scoring_engine()
+    model_calls = 0 if engine == "local" else math.ceil(recipes / get_batch_size())
+    rate = getattr(settings, "NUTRITION_CLIENT_OPTIONS", {}).get("rate", 1.0)
+
+    minutes = max(recipes / get_rescore_rate(), model_calls / rate / 60)
+    return {
+        "engine": engine,
+        "recipes": recipes,
+        "already_pending": already_pending,
+        "model_calls": model_calls,
+        "estimated_minutes": round(minutes, 1),
+    }
+
+
+def rescore_ingredient_types(type_ids, dry_run=False):
+    """
+    Encola el recálculo de las recetas que usan los tipos indicados,
+    escalonado según NUTRITION_TYPE_RESCORE_PER_MINUTE. Con `dry_run`
+    solo retorna la estimación.
+    """
+    recipe_ids = recipes_using_types(type_ids)
+    estimate = estimate_rescore(recipe_ids)
+    if not dry_run:
+        enqueue_recipe_scores(recipe_ids, per_minute=get_rescore_rate())
+    return estimate
@@ -0,0 +1,277 @@
+# Autor: Ana Sofía Alfonso
+"""
+Índice invertido en memoria tipo de ingrediente → recetas.
+
+Para cada IngredientType guarda la lista ordenada de ids de las recetas
+que lo usan (postings) y, para cada receta, la tupla ordenada de sus
+tipos. Las búsquedas por varios ingredientes se resuelven intersecando,
+uniendo o restando listas ordenadas, sin joins ni `.distinct()`:
+
+- all_of: recetas que tienen todos los ingredientes.
+- any_of: recetas que tienen al menos uno.
+- pantry + max_missing: recetas a las que les faltan como máximo K
+  ingredientes de la despensa (ordenadas por cuántos faltan).
+- exclude: recetas sin ninguno de esos ingredientes (alergias).
+
+El índice se construye la primera vez que se usa y se actualiza por
+receta al confirmar cada guardado o borrado de Ingredient. Como vive en
+cada proceso, se reconstruye cada INGREDIENT_INDEX_TTL segundos para
+recoger cambios hechos por otros procesos.
+"""
+import heapq
+import json
+import threading
+import time
+from bisect import bisect_left, insort
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import BooleanField, Case, IntegerField, Q, Value, When
+from django.db.models.expressions import RawSQL
+
+from core.models import Ingredient, Recipe
+from .transaction_buffer import TransactionBuffer
+
+
+def get_index_ttl():
+    return getattr(settings, "INGREDIENT_INDEX_TTL", 300)
+
+
+def intersect(a, b):
+    """Intersección de dos listas ordenadas; busca con bisect en la más larga."""
+    if len(a) > len(b):
+        a, b = b, a
+    result = []
+    position = 0
+    for value in a:
+        position = bisect_left(b, value, position)
+        if position == len(b):
+            break
+        if b[position] == value:
+            result.append(value)
+    return result
+
+
+def union(lists):
+    """Unión de listas ordenadas, sin repetidos."""
+    result = []
+    for value in heapq.merge(*lists):
+        if not result or result[-1] != value:
+            result.append(value)
+    return result
+
+
+def difference(a, b):
+    """Elementos de `a` que no están en `b` (ambas ordenadas)."""
+    result = []
+    position = 0
+    for value in a:
+        position = bisect_left(b, value, position)
+        if position == len(b) or b[position] != value:
+            result.append(value)
+    return result
+
+
+class IngredientIndex:
+    def __init__(self):
+        self.postings = {}
+        self.recipe_types = {}
+        # Cantidad de tipos -> ids ordenados: recetas que pueden coincidir con la despensa sin usar nada de ella
+        self.by_size = {}
+        self.built_at = None
+        self.lock = threading.Lock()
+
+    def _ensure_built(self):
+        if self.built_at is None or time.monotonic() - self.built_at > get_index_ttl():
+            self.rebuild()
+
+    def rebuild(self):
+        recipe_types = defaultdict(set)
+        rows = Ingredient.objects.values_list("recipe_id", "ingredient_type_id").iterator(chunk_size=5000)
+        for recipe_id, type_id in rows:
+            recipe_types[recipe_id].add(type_id)
+
+        postings = defaultdict(list)
+        by_size = defaultdict(list)
+        for recipe_id in sorted(recipe_types):
+            for type_id in recipe_types[recipe_id]:
+                postings[type_id].append(recipe_id)
+            by_size[len(recipe_types[recipe_id])].append(recipe_id)
+
+        with self.lock:
+            self.postings = dict(postings)
+            self.by_size = dict(by_size)
+            self.recipe_types = {recipe_id: tuple(sorted(types)) for recipe_id, types in recipe_types.items()}
+            self.built_at = time.monotonic()
+
+    def refresh_recipes(self, recipe_ids):
+        """Actualiza las postings de las recetas indicadas (una consulta para todas)."""
+        if self.built_at is None:
+            return
+
+        current = defaultdict(set)
+        for recipe_id, type_id in Ingredient.objects.filter(recipe_id__in=recipe_ids).values_list(
+            "recipe_id", "ingredient_type_id"
+        ):
+            current[recipe_id].add(type_id)
+
+        with self.lock:
+            for recipe_id in recipe_ids:
+                old = set(self.recipe_types.get(recipe_id, ()))
+                new = current.get(recipe_id, set())
+                for type_id in old - new:
+                    postings = self.postings.get(type_id, [])
+                    position = bisect_left(postings, recipe_id)
+                    if position < len(postings) and postings[position] == recipe_id:
+                        postings.pop(position)
+                for type_id in new - old:
+                    insort(self.postings.setdefault(type_id, []), recipe_id)
+                if len(old) != len(new):
+                    if old:
+                        self.by_size[len(old)].remove(recipe_id)
+                    if new:
+                        insort(self.by_size.setdefault(len(new), []), recipe_id)
+
+                if new:
+                    self.recipe_types[recipe_id] = tuple(sorted(new))
+                else:
+                    self.recipe_types.pop(recipe_id, None)
+
+    def find(self, all_of=(), any_of=(), pantry=(), max_missing=None, exclude=()):
+        """
+        Ids de las recetas que cumplen todas las condiciones dadas.
+
+        Sin `pantry` el resultado va ordenado por id; con `pantry`, de la
+        receta a la que le faltan menos ingredientes a la que le faltan más.
+        Retorna None si no hay condiciones positivas (all_of, any_of o
+        pantry): las exclusiones solas se aplican con `excluded_ids`.
+        """
+        found = self.match(all_of=all_of, any_of=any_of, pantry=pantry, max_missing=max_missing, exclude=exclude)
+        if found is None:
+            return None
+        recipe_ids, missing = found
+        if missing is not None:
+            return sorted(recipe_ids, key=lambda recipe_id: (missing[recipe_id], recipe_id))
+        return recipe_ids
+
+    def match(self, all_of=(), any_of=(), pantry=(), max_missing=None, exclude=()):
+        """
+        Como `find`, pero retorna `(ids ordenados por id, faltantes)`, donde
+        faltantes es un diccionario id → ingredientes de la despensa que le
+        faltan a la receta (None sin `pantry`).
+        """
+        if not (all_of or any_of or pantry):
+            return None
+
+        self._ensure_built()
+        with self.lock:
+            candidates = None
+            if all_of:
+                lists = sorted((self.postings.get(type_id, []) for type_id in set(all_of)), key=len)
+                candidates = lists[0]
+                for postings in lists[1:]:
+                    if not candidates:
+                        break
+                    candidates = intersect(candidates, postings)
+
+            if any_of:
+                matches = union([self.postings.get(type_id, []) for type_id in set(any_of)])
+                candidates = matches if candidates is None else intersect(candidates, matches)
+
+            missing = None
+            if pantry:
+                pantry = set(pantry)
+                hits = defaultdict(int)
+                for type_id in pantry:
+                    for recipe_id in self.postings.get(type_id, []):
+                        hits[recipe_id] += 1
+                limit = max_missing if max_missing is not None else 0
+                missing = {
+                    recipe_id: len(self.recipe_types[recipe_id]) - count
+                    for recipe_id, count in hits.items()
+                    if len(self.recipe_types[recipe_id]) - count <= limit
+                }
+                # Recetas sin nada de la despensa: les faltan todos sus ingredientes
+                for size in range(1, limit + 1):
+                    for recipe_id in self.by_size.get(size, ()):
+                        missing.setdefault(recipe_id, size)
+                matches = sorted(missing)
+                candidates = matches if candidates is None else intersect(candidates, matches)
+
+            if exclude:
+                candidates = difference(candidates, union([self.postings.get(type_id, []) for type_id in set(exclude)]))
+
+            # Copia: `candidates` puede ser una lista interna del índice
+            return list(candidates), missing
+
+    def excluded_ids(self, exclude):
+        """Ids de las recetas que usan alguno de los ingredientes."""
+        self._ensure_built()
+        with self.lock:
+            return union([self.postings.get(type_id, []) for type_id in set(exclude)])
+
+
+index = IngredientIndex()
+
+
+def _flush_pending(pending):
+    index.refresh_recipes(set(pending))
+
+
+# Recetas cuyos ingredientes cambiaron en la transacción actual
+_pending = TransactionBuffer(_flush_pending)
+
+
+def mark_ingredients_changed(recipe_id):
+    """Programa la actualización del índice para la receta al confirmar la transacción."""
+    if not transaction.get_connection().in_atomic_block:
+        index.refresh_recipes([recipe_id])
+        return
+    _pending.open()[recipe_id] = True
+
+
+def recipe_id_in(recipe_ids):
+    """
+    Condición "id de la receta en `recipe_ids`" con un único parámetro,
+    sin importar cuántos ids sean: SQLite limita la cantidad de parámetros
+    de una consulta y `pk__in` usa uno por id.
+    """
+    column = f'"{Recipe._meta.db_table}"."{Recipe._meta.pk.column}"'
+    if connection.vendor == "sqlite":
+        return RawSQL(
+            f"{column} IN (SELECT value FROM json_each(%s))", [json.dumps(recipe_ids)], output_field=BooleanField()
+        )
+    if connection.vendor == "postgresql":
+        return RawSQL(f"{column} = ANY(%s)", [list(recipe_ids)], output_field=BooleanField())
+    return Q(pk__in=recipe_ids)
+
+
+def filter_by_ingredients(queryset, all_of=(), any_of=(), pantry=(), max_missing=None, exclude=()):
+    """
+    Aplica las condiciones de ingredientes a un queryset de recetas.
+    Con despensa, el resultado queda ordenado por ingredientes faltantes
+    (anotación `missing_rank`).
+
+    El tamaño de la consulta no depende de cuántas recetas coincidan: los
+    ids viajan en un solo parámetro y el ranking tiene una rama por cada
+    cantidad de faltantes (como mucho `max_missing + 1`), no una por receta.
+    """
+    found = index.match(all_of=all_of, any_of=any_of, pantry=pantry, max_missing=max_missing, exclude=exclude)
+    if found is None:
+        if exclude:
+            queryset = queryset.exclude(recipe_id_in(index.excluded_ids(exclude)))
+        return queryset
+
+    recipe_ids, missing = found
+    queryset = queryset.filter(recipe_id_in(recipe_ids))
+    if missing is not None:
+        by_missing = defaultdict(list)
+        for recipe_id in recipe_ids:
+            by_missing[missing[recipe_id]].append(recipe_id)
+        ranking = Case(
+            *[When(recipe_id_in(ids), then=Value(count)) for count, ids in sorted(by_missing.items())],
+            output_field=IntegerField(),
+        )
+        queryset = queryset.annotate(missing_rank=ranking).order_by("missing_rank", "pk")
+    return queryset
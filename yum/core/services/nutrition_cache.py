@@ -0,0 +1,163 @@
+# Autor: Ana Sofía Alfonso
+"""
+Caché de puntajes nutricionales indexada por contenido.
+
+La llave es un hash estable de todo lo que entra al prompt de Gemini
+(título, descripción, categoría, porciones e ingredientes con sus vitaminas
+y excesos). Si nada de eso cambió, o si otra receta idéntica ya fue
+evaluada, se reutiliza el puntaje sin llamar a la API.
+"""
+import hashlib
+import json
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Sum
+from django.utils import timezone
+
+from core.models import NutritionScoreCache
+from .nutritional_value import get_score_version
+
+# Contadores del proceso actual; el worker y rescore_recipes los escriben en su salida
+_stats = {"hits": 0, "misses": 0, "evictions": 0}
+
+# Momento (monotónico) de la última limpieza hecha por store_score en este proceso
+_last_eviction = None
+
+
+def get_max_entries():
+    return getattr(settings, "NUTRITION_SCORE_CACHE_MAX_ENTRIES", 10000)
+
+
+def get_ttl():
+    """Vida máxima de una entrada en segundos (None = sin vencimiento)."""
+    return getattr(settings, "NUTRITION_SCORE_CACHE_TTL", 60 * 60 * 24 * 30)
+
+
+def get_eviction_interval():
+    """Segundos mínimos entre limpiezas de la caché al guardar puntajes."""
+    return getattr(settings, "NUTRITION_SCORE_CACHE_EVICT_INTERVAL", 300)
+
+
+def _normalize_text(value):
+    return " ".join(str(value or "").split()).casefold()
+
+
+def _normalize_list(values):
+    return sorted(_normalize_text(v) for v in (values or []) if _normalize_text(v))
+
+
+def recipe_fingerprint(recipe):
+    """Hash SHA-256 de las entradas del prompt, independiente del orden de los ingredientes."""
+    ingredients = sorted(
+        [
+            _normalize_text(ing.ingredient_type.nombre),
+            float(ing.quantity),
+            _normalize_text(ing.unit),
+            ing.ingredient_type.category,
+            _normalize_list(ing.ingredient_type.vitamins),
+            _normalize_list(ing.ingredient_type.excesses),
+        ]
+        for ing in recipe.ingredients.all()
+    )
+    payload = {
+        "version": get_score_version(),
+        "title": _normalize_text(recipe.title),
+        "description": _normalize_text(recipe.description),
+        "category": recipe.category,
+        "portions": recipe.portions,
+        "ingredients": ingredients,
+    }
+    raw = json.dumps(payload, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def _fresh_entries():
+    queryset = NutritionScoreCache.objects.all()
+    ttl = get_ttl()
+    if ttl is not None:
+        queryset = queryset.filter(created_at__gte=timezone.now() - timedelta(seconds=ttl))
+    return queryset
+
+
+def get_cached_score(fingerprint):
+    """Retorna el puntaje guardado para la huella o None si no existe o venció."""
+    entry = _fresh_entries().filter(fingerprint=fingerprint).only("pk", "score").first()
+    if entry is None:
+        _stats["misses"] += 1
+        return None
+
+    NutritionScoreCache.objects.filter(pk=entry.pk).update(
+        hits=F("hits") + 1,
+        last_used_at=timezone.now(),
+    )
+    _stats["hits"] += 1
+    return entry.score
+
+
+def store_score(fingerprint, score):
+    try:
+        with transaction.atomic():
+            NutritionScoreCache.objects.update_or_create(
+                fingerprint=fingerprint,
+                defaults={"score": score, "created_at": timezone.now(), "last_used_at": timezone.now()},
+            )
+    except IntegrityError:
+        # Otro worker guardó la misma huella al mismo tiempo
+        pass
+
+    # La limpieza hace un COUNT y hasta dos DELETE: no se repite en cada guardado
+    global _last_eviction
+    now = time.monotonic()
+    if _last_eviction is None or now - _last_eviction >= get_eviction_interval():
+        _last_eviction = now
+        evict_expired()
+
+
+def evict_expired():
+    """Elimina entradas vencidas por TTL y, si sobran, las menos usadas recientemente (LRU)."""
+    evicted = 0
+    ttl = get_ttl()
+    if ttl is not None:
+        limit = timezone.now() - timedelta(seconds=ttl)
+        evicted += NutritionScoreCache.objects.filter(created_at__lt=limit).delete()[0]
+
+    overflow = NutritionScoreCache.objects.count() - get_max_entries()
+    if overflow > 0:
+        oldest = NutritionScoreCache.objects.order_by("last_used_at").values_list("pk", flat=True)[:overflow]
+        evicted += NutritionScoreCache.objects.filter(pk__in=list(oldest)).delete()[0]
+
+    _stats["evictions"] += evicted
+    return evicted
+
+
+def get_cache_stats():
+    """
+    Contadores del proceso más lo guardado en la tabla: cantidad de
+    entradas y aciertos acumulados por todos los procesos (columna `hits`).
+    """
+    lookups = _stats["hits"] + _stats["misses"]
+    stored = NutritionScoreCache.objects.aggregate(entries=Count("pk"), stored_hits=Sum("hits"))
+    return {
+        **_stats,
+        "hit_rate": _stats["hits"] / lookups if lookups else 0.0,
+        "entries": stored["entries"],
+        "stored_hits": stored["stored_hits"] or 0,
+    }
+
+
+def describe_cache_stats():
+    """Resumen en una línea de `get_cache_stats` para la salida de los comandos."""
+    stats = get_cache_stats()
+    return (
+        f"Caché de puntajes: {stats['hits']} aciertos, {stats['misses']} fallos "
+        f"({stats['hit_rate']:.1%}), {stats['evictions']} eliminadas; "
+        f"{stats['entries']} entradas con {stats['stored_hits']} aciertos acumulados"
+    )
+
+
+def reset_cache_stats():
+    for key in _stats:
+        _stats[key] = 0
@@ -0,0 +1,106 @@
+# Autor: Ana Sofía Alfonso
+"""
+Estimador local y determinístico del valor nutricional.
+
+Calcula el puntaje (1-100) solo con los datos que ya guardamos:
+categoría, vitaminas y excesos de cada IngredientType, la cantidad de
+cada Ingredient y las porciones de la receta. No usa la red, por lo que
+sirve como motor principal, como respaldo de Gemini o para recalcular
+miles de recetas en lote.
+"""
+import math
+from collections import defaultdict
+
+from core.models import Ingredient, Recipe
+
+# Puntaje base por categoría de ingrediente
+CATEGORY_BASE_SCORES = {
+    "vegetal": 90,
+    "animal": 70,
+    "mineral": 60,
+    "procesado": 40,
+    "ultraprocesado": 15,
+}
+UNKNOWN_CATEGORY_SCORE = 50
+
+VITAMIN_BONUS = 3
+MAX_VITAMINS = 5
+EXCESS_PENALTY = 8
+
+# Puntaje para recetas sin ingredientes (mismo valor neutro que usa Gemini)
+EMPTY_RECIPE_SCORE = 50
+
+
+def ingredient_score(category, vitamins, excesses):
+    """Puntaje individual de un tipo de ingrediente."""
+    score = CATEGORY_BASE_SCORES.get(category, UNKNOWN_CATEGORY_SCORE)
+    score += VITAMIN_BONUS * min(len(vitamins or []), MAX_VITAMINS)
+    score -= EXCESS_PENALTY * len(excesses or [])
+    return max(1, min(score, 100))
+
+
+def ingredient_weight(quantity, portions):
+    """Peso del ingrediente en el promedio: cantidad por porción con crecimiento logarítmico."""
+    return math.log1p(max(quantity, 0) / max(portions or 1, 1))
+
+
+def estimate_from_rows(portions_by_recipe, ingredient_rows):
+    """
+    Calcula los puntajes de varias recetas en una sola pasada.
+
+    Args:
+        portions_by_recipe: Dict {recipe_id: porciones}
+        ingredient_rows: Iterable de tuplas
+            (recipe_id, cantidad, categoría, vitaminas, excesos)
+
+    Returns:
+        Dict {recipe_id: puntaje}
+    """
+    weighted = defaultdict(float)
+    totals = defaultdict(float)
+    # Muchos ingredientes comparten tipo: se memoriza el puntaje por combinación
+    memo = {}
+
+    for recipe_id, quantity, category, vitamins, excesses in ingredient_rows:
+        key = (category, len(vitamins or []), len(excesses or []))
+        score = memo.get(key)
+        if score is None:
+            score = memo[key] = ingredient_score(category, vitamins, excesses)
+
+        weight = ingredient_weight(quantity, portions_by_recipe.get(recipe_id))
+        weighted[recipe_id] += score * weight
+        totals[recipe_id] += weight
+
+    scores = {}
+    for recipe_id in portions_by_recipe:
+        total = totals.get(recipe_id)
+        if not total:
+            scores[recipe_id] = EMPTY_RECIPE_SCORE
+        else:
+            scores[recipe_id] = max(1, min(round(weighted[recipe_id] / total), 100))
+    return scores
+
+
+def estimate_scores(recipe_ids):
+    """Puntajes de un lote de recetas usando solo dos consultas."""
+    recipe_ids = list(recipe_ids)
+    portions_by_recipe = dict(
+        Recipe.objects.filter(pk__in=recipe_ids).values_list("pk", "portions")
+    )
+    rows = Ingredient.objects.filter(recipe_id__in=recipe_ids).values_list(
+        "recipe_id",
+        "quantity",
+        "ingredient_type__category",
+        "ingredient_type__vitamins",
+        "ingredient_type__excesses",
+    )
+    return estimate_from_rows(portions_by_recipe, rows.iterator())
+
+
+def estimate_nutritional_value(recipe):
+    rows = (
+        (recipe.pk, ing.quantity, ing.ingredient_type.category,
+         ing.ingredient_type.vitamins, ing.ingredient_type.excesses)
+        for ing in recipe.ingredients.select_related("ingredient_type")
+    )
+    return estimate_from_rows({recipe.pk: recipe.portions}, rows)[recipe.pk]
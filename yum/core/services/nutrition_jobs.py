@@ -0,0 +1,210 @@
+# Autor: Ana Sofía Alfonso
+"""
+Cola de trabajos en base de datos para calcular el valor nutricional
+de las recetas fuera del ciclo request/response.
+
+Los guardados solo marcan la receta como "pendiente" y encolan un trabajo;
+el comando `manage.py process_nutrition_jobs` los procesa después.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from core.models import NutritionJob, Recipe
+from .nutritional_value import (
+    fallback_nutritional_value, fetch_nutritional_values, get_score_version, get_scoring_engine,
+)
+from .nutrition_cache import get_cached_score, recipe_fingerprint, store_score
+from .nutrition_estimator import estimate_scores
+from .api_cache import bump_catalog_version
+from .change_feed import mark_recipe_changed
+
+
+def get_max_attempts():
+    return getattr(settings, "NUTRITION_JOB_MAX_ATTEMPTS", 5)
+
+
+def get_retry_delay():
+    """Segundos de espera antes del primer reintento (crece exponencialmente)."""
+    return getattr(settings, "NUTRITION_JOB_RETRY_DELAY", 30)
+
+
+def enqueue_recipe_scores(recipe_ids, per_minute=None):
+    """
+    Encola el cálculo de las recetas usando pocas consultas, sin importar
+    cuántas recetas sean. Si una receta ya tiene un trabajo pendiente no se
+    crea otro.
+
+    Sin `per_minute` (la receta misma cambió) se marcan como pendientes de
+    inmediato. Con `per_minute` los trabajos se escalonan en ventanas de un
+    minuto a continuación de los que ya están en la cola, así el límite es
+    global y no por llamada; las recetas conservan su puntaje anterior a la
+    vista hasta que un worker toma su trabajo (ver `claim_jobs`).
+    """
+    recipe_ids = set(recipe_ids)
+    if not recipe_ids:
+        return 0
+
+    existing = sorted(Recipe.objects.filter(pk__in=recipe_ids).values_list("pk", flat=True))
+    now = timezone.now()
+    if not per_minute:
+        Recipe.objects.filter(pk__in=existing).update(score_status="pending")
+        start = now
+    else:
+        # Los reintentos (attempts > 0) tienen su propio backoff y no cuentan
+        latest = NutritionJob.objects.filter(status="pending", attempts=0).aggregate(
+            latest=Max("run_after")
+        )["latest"]
+        start = max(now, latest + timedelta(minutes=1)) if latest else now
+
+    jobs = [
+        NutritionJob(
+            recipe_id=recipe_id,
+            run_after=start + timedelta(minutes=i // per_minute) if per_minute else now,
+        )
+        for i, recipe_id in enumerate(existing)
+    ]
+    # ignore_conflicts respeta la restricción de un solo trabajo pendiente por receta
+    NutritionJob.objects.bulk_create(jobs, ignore_conflicts=True)
+    if not per_minute:
+        NutritionJob.objects.filter(
+            recipe_id__in=existing,
+            status="pending",
+            run_after__gt=now,
+        ).update(run_after=now)
+    return len(existing)
+
+
+def claim_jobs(limit=10):
+    """
+    Reserva hasta `limit` trabajos listos para ejecutarse y marca sus
+    recetas como pendientes. El UPDATE condicional evita que dos workers
+    tomen el mismo trabajo. Se actualiza `updated_at` de las recetas para
+    que el ETag y el Last-Modified del detalle cambien con el estado.
+    """
+    candidates = NutritionJob.objects.filter(
+        status="pending",
+        run_after__lte=timezone.now(),
+    ).order_by("run_after", "pk").values_list("pk", "recipe_id")[:limit]
+
+    claimed = []
+    recipe_ids = []
+    for job_id, recipe_id in list(candidates):
+        updated = NutritionJob.objects.filter(pk=job_id, status="pending").update(
+            status="running",
+            updated_at=timezone.now(),
+        )
+        if updated:
+            claimed.append(job_id)
+            recipe_ids.append(recipe_id)
+    if recipe_ids:
+        Recipe.objects.filter(pk__in=recipe_ids).update(
+            score_status="pending",
+            updated_at=timezone.now(),
+        )
+
+    return list(
+        NutritionJob.objects.filter(pk__in=claimed)
+        .select_related("recipe")
+        .prefetch_related("recipe__ingredients__ingredient_type")
+    )
+
+
+def run_jobs(jobs):
+    """
+    Ejecuta un grupo de trabajos reservados. Las recetas que no están en la
+    caché se consultan a Gemini en lotes. Retorna cuántos puntajes quedaron guardados.
+    """
+    for job in jobs:
+        job.attempts += 1
+
+    if get_scoring_engine() == "local":
+        scores = estimate_scores([job.recipe_id for job in jobs])
+        for job in jobs:
+            _finish(job, "done", score=scores.get(job.recipe_id), score_status="ready")
+        return len(jobs)
+
+    succeeded = 0
+    missing = {}
+    for job in jobs:
+        fingerprint = recipe_fingerprint(job.recipe)
+        score = get_cached_score(fingerprint)
+        if score is None:
+            missing[job] = fingerprint
+        else:
+            _finish(job, "done", score=score, score_status="ready")
+            succeeded += 1
+
+    scores, errors = fetch_nutritional_values([job.recipe for job in missing])
+    for job, fingerprint in missing.items():
+        score = scores.get(job.recipe_id)
+        if score is not None:
+            store_score(fingerprint, score)
+            _finish(job, "done", score=score, score_status="ready")
+            succeeded += 1
+            continue
+
+        job.last_error = errors.get(job.recipe_id, "")
+        if job.attempts >= get_max_attempts():
+            _finish(job, "failed", score=fallback_nutritional_value(job.recipe), score_status="failed")
+        else:
+            _retry(job)
+
+    return succeeded
+
+
+def _finish(job, status, score, score_status):
+    job.status = status
+    # update() en vez de save(): la receta (y su trabajo) pudo borrarse mientras se calculaba
+    NutritionJob.objects.filter(pk=job.pk).update(
+        status=status,
+        attempts=job.attempts,
+        last_error=job.last_error,
+        updated_at=timezone.now(),
+    )
+
+    # Si llegó un cambio mientras se calculaba, el trabajo pendiente nuevo
+    # se encarga del puntaje definitivo
+    still_pending = NutritionJob.objects.filter(recipe_id=job.recipe_id, status="pending").exists()
+    updated = Recipe.objects.filter(pk=job.recipe_id).update(
+        nutritional_value=score,
+        score_status="pending" if still_pending else score_status,
+        score_version=get_score_version(),
+        updated_at=timezone.now(),
+    )
+    if updated:
+        mark_recipe_changed(job.recipe_id)
+        # update() no envía señales: la caché de la API se invalida aquí
+        bump_catalog_version()
+
+
+def _retry(job):
+    delay = get_retry_delay() * 2 ** max(job.attempts - 1, 0)
+    job.status = "pending"
+    job.run_after = timezone.now() + timedelta(seconds=delay)
+    try:
+        with transaction.atomic():
+            job.save(update_fields=["status", "attempts", "last_error", "run_after", "updated_at"])
+    except IntegrityError:
+        # Ya se encoló otro trabajo pendiente para la receta; ese lo reemplaza
+        NutritionJob.objects.filter(pk=job.pk).delete()
+
+
+def requeue_stale_jobs(timeout=600):
+    """Devuelve a la cola los trabajos que quedaron 'running' por un worker caído."""
+    limit = timezone.now() - timedelta(seconds=timeout)
+    requeued = 0
+    for job in NutritionJob.objects.filter(status="running", updated_at__lt=limit):
+        _retry(job)
+        requeued += 1
+    return requeued
+
+
+def process_pending_jobs(limit=10):
+    """Procesa un lote de trabajos. Retorna (procesados, exitosos)."""
+    jobs = claim_jobs(limit)
+    succeeded = run_jobs(jobs) if jobs else 0
+    return len(jobs), succeeded
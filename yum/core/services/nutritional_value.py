@@ -1,11 +1,99 @@
-# Autor: Ana Sofía Alfonso 
+# Autor: Ana Sofía Alfonso
+import json
+import logging
+
 import google.generativeai as genai
+import requests
 from django.conf import settings
 
+from .nutrition_estimator import estimate_nutritional_value
+from .resilient_client import CircuitOpenError, ResilientModelClient
+
 # Configurar el cliente de Gemini
 genai.configure(api_key=settings.GEMINI_API_KEY)
 
-def calculate_nutritional_value(recipe):
+logger = logging.getLogger(__name__)
+
+# Puntaje usado cuando Gemini no responde un número válido
+DEFAULT_SCORE = 50
+
+# Cliente compartido por todo el proceso (ver get_model)
+_model = None
+
+
+class NutritionScoringError(Exception):
+    """Error al obtener el puntaje nutricional desde Gemini."""
+
+
+class HttpScoringModel:
+    """
+    Cliente mínimo con la misma interfaz que genai.GenerativeModel para un
+    servidor local que simula al modelo (ver `manage.py fake_nutrition_server`).
+    Recibe {"prompt": str} y responde {"text": str}.
+    """
+
+    class Response:
+        def __init__(self, text):
+            self.text = text
+
+    def __init__(self, url, timeout=30):
+        self.url = url
+        self.timeout = timeout
+        self.session = requests.Session()
+
+    def generate_content(self, prompt, request_options=None):
+        timeout = (request_options or {}).get("timeout", self.timeout)
+        response = self.session.post(self.url, json={"prompt": prompt}, timeout=timeout)
+        response.raise_for_status()
+        return self.Response(response.json().get("text", ""))
+
+
+def get_model():
+    """
+    Retorna el cliente del modelo, creándolo una sola vez por proceso.
+    El límite de tasa, la concurrencia y el circuit breaker quedan
+    compartidos por todos los hilos.
+    """
+    global _model
+    if _model is None:
+        if getattr(settings, "NUTRITION_MODEL_BACKEND", "gemini") == "http":
+            model = HttpScoringModel(settings.NUTRITION_MODEL_URL)
+        else:
+            model = genai.GenerativeModel(getattr(settings, "NUTRITION_GEMINI_MODEL", "gemini-1.5-flash"))
+        _model = ResilientModelClient(model, **getattr(settings, "NUTRITION_CLIENT_OPTIONS", {}))
+    return _model
+
+
+def get_client_stats():
+    """Contadores del cliente (llamadas, fallos, reintentos, estado del circuito)."""
+    return get_model().get_stats()
+
+
+def describe_client_stats():
+    """
+    Resumen en una línea de `get_client_stats`. Los contadores son del
+    proceso: los comandos que llaman al modelo (el worker, rescore_recipes)
+    lo escriben en su salida.
+    """
+    stats = get_client_stats()
+    return (
+        f"Cliente del modelo: {stats['calls']} llamadas, {stats['successes']} exitosas, "
+        f"{stats['failures']} fallidas, {stats['retries']} reintentos, "
+        f"{stats['rejected_open']} rechazadas con el circuito abierto, "
+        f"{stats['deadline_exceeded']} fuera de plazo; circuito {stats['circuit_state']}"
+    )
+
+
+def get_score_version():
+    """Versión del prompt/modelo; se incrementa para invalidar puntajes y caché."""
+    return getattr(settings, "NUTRITION_SCORE_VERSION", 1)
+
+
+def get_batch_size():
+    return getattr(settings, "NUTRITION_BATCH_SIZE", 10)
+
+
+def _recipe_inputs(recipe):
     ingredientes = []
     for ing in recipe.ingredients.all():
         ingredientes.append({
@@ -16,33 +104,132 @@ def calculate_nutritional_value(recipe):
             "excesos": ing.ingredient_type.excesses,
         })
 
-    prompt = f"""
-    Eres un experto en nutrición. Evalúa la siguiente receta y dame un puntaje nutricional 
-    de 1 a 100, donde 100 es extremadamente saludable y 1 es nada saludable.
-    
+    return f"""
     Receta: {recipe.title}
     Descripción: {recipe.description}
     Categoría: {recipe.category}
     Porciones: {recipe.portions}
     Ingredientes: {ingredientes}
-    
+    """
+
+
+def build_prompt(recipe):
+    return f"""
+    Eres un experto en nutrición. Evalúa la siguiente receta y dame un puntaje nutricional
+    de 1 a 100, donde 100 es extremadamente saludable y 1 es nada saludable.
+    {_recipe_inputs(recipe)}
     Responde SOLO con un número entre 1 y 100.
     """
 
+
+def build_batch_prompt(recipes):
+    bloques = "".join(f"\n    [id={recipe.pk}]{_recipe_inputs(recipe)}" for recipe in recipes)
+    return f"""
+    Eres un experto en nutrición. Evalúa cada una de las siguientes recetas y dale un puntaje
+    nutricional de 1 a 100, donde 100 es extremadamente saludable y 1 es nada saludable.
+    {bloques}
+    Responde SOLO con un arreglo JSON con un elemento por receta, de la forma:
+    [{{"id": <id de la receta>, "puntaje": <número entre 1 y 100>}}]
+    """
+
+
+def _clamp(score):
+    return max(1, min(int(score), 100))
+
+
+def parse_batch_response(text, recipe_ids):
+    """
+    Convierte la respuesta del lote en {id: puntaje}.
+
+    Raises:
+        NutritionScoringError: Si la respuesta no es un arreglo JSON válido
+    """
+    start, end = text.find("["), text.rfind("]")
+    if start == -1 or end < start:
+        raise NutritionScoringError(f"Respuesta de lote sin arreglo JSON: {text[:200]!r}")
+
     try:
-        model = genai.GenerativeModel("gemini-1.5-flash")
-        response = model.generate_content(prompt)
+        items = json.loads(text[start:end + 1])
+        scores = {int(item["id"]): _clamp(item["puntaje"]) for item in items}
+    except (ValueError, TypeError, KeyError) as e:
+        raise NutritionScoringError(f"Respuesta de lote inválida: {e}") from e
 
-        text = response.text.strip()
-        number = "".join([c for c in text if c.isdigit()])
+    # Se ignoran ids que no se pidieron
+    return {recipe_id: score for recipe_id, score in scores.items() if recipe_id in recipe_ids}
 
-        if number:
-            score = int(number)
-            return max(1, min(score, 100)) 
-        return 50  
-    
+
+def _generate(prompt):
+    try:
+        response = get_model().generate_content(prompt)
+        return response.text.strip()
     except Exception as e:
-        print(f"Error al calcular valor nutricional: {e}")
-        return 50
-    
+        raise NutritionScoringError(str(e)) from e
+
+
+def fetch_nutritional_value(recipe):
+    """
+    Consulta a Gemini el puntaje nutricional de la receta.
+
+    Raises:
+        NutritionScoringError: Si la llamada falla o la respuesta no trae un número
+    """
+    text = _generate(build_prompt(recipe))
+
+    number = "".join([c for c in text if c.isdigit()])
+    if not number:
+        raise NutritionScoringError(f"Respuesta sin puntaje: {text!r}")
+
+    return _clamp(number)
+
+
+def fetch_nutritional_values(recipes, batch_size=None):
+    """
+    Consulta los puntajes de varias recetas empaquetando hasta `batch_size`
+    recetas por llamada. Si un lote no se puede interpretar, las recetas
+    que faltan se consultan una por una.
+
+    Returns:
+        Tupla (puntajes, errores): {recipe_id: puntaje} y {recipe_id: mensaje}
+    """
+    recipes = list(recipes)
+    batch_size = batch_size or get_batch_size()
+    scores, errors = {}, {}
+
+    for start in range(0, len(recipes), batch_size):
+        chunk = recipes[start:start + batch_size]
+        if len(chunk) > 1:
+            try:
+                text = _generate(build_batch_prompt(chunk))
+                scores.update(parse_batch_response(text, {recipe.pk for recipe in chunk}))
+            except NutritionScoringError as e:
+                if isinstance(e.__cause__, CircuitOpenError):
+                    # La API está caída: no tiene sentido intentar receta por receta
+                    errors.update({recipe.pk: str(e) for recipe in chunk})
+                    continue
+                logger.warning("Error en lote de valor nutricional, se consultará una por una: %s", e)
+
+        for recipe in chunk:
+            if recipe.pk in scores:
+                continue
+            try:
+                scores[recipe.pk] = fetch_nutritional_value(recipe)
+            except NutritionScoringError as e:
+                errors[recipe.pk] = str(e)
+
+    return scores, errors
+
+
+def get_scoring_engine():
+    """Motor principal: 'gemini' (por defecto) o 'local'."""
+    return getattr(settings, "NUTRITION_SCORING_ENGINE", "gemini")
+
+
+def get_fallback_engine():
+    """Motor de respaldo cuando Gemini falla: 'local' o None (puntaje fijo)."""
+    return getattr(settings, "NUTRITION_SCORING_FALLBACK", "local")
+
 
+def fallback_nutritional_value(recipe):
+    if get_fallback_engine() == "local":
+        return estimate_nutritional_value(recipe)
+    return DEFAULT_SCORE
@@ -0,0 +1,91 @@
+# Autor: Ana Sofía Alfonso
+"""
+Agrupa los recálculos de valor nutricional.
+
+Cada cambio en una receta o en sus ingredientes solo marca la receta como
+"sucia". Al confirmar la transacción (o al salir de `collect_rescoring`)
+cada receta sucia se encola una única vez, sin importar cuántos
+ingredientes se hayan guardado o borrado.
+
+Uso en scripts:
+    with collect_rescoring():
+        for recipe in recipes:
+            Ingredient.objects.create(recipe=recipe, ...)
+"""
+import threading
+from contextlib import contextmanager
+
+from django.db import transaction
+
+from .nutrition_jobs import enqueue_recipe_scores
+from .transaction_buffer import TransactionBuffer
+
+_state = threading.local()
+
+
+def _enqueue_pending(pending):
+    enqueue_recipe_scores(set(pending))
+
+
+# Recetas sucias y recetas en proceso de borrado de la transacción actual;
+# si la transacción se revierte (por ejemplo, un borrado que falla) se descartan
+_transaction_pending = TransactionBuffer(_enqueue_pending)
+_deleting = TransactionBuffer()
+
+
+def begin_recipe_delete(recipe_id):
+    """
+    Marca la receta como en proceso de borrado. Los borrados en cascada de
+    sus ingredientes y reseñas no deben recalcular una receta que va a desaparecer.
+    """
+    # Django borra siempre dentro de una transacción
+    if transaction.get_connection().in_atomic_block:
+        _deleting.open()[recipe_id] = True
+
+
+def end_recipe_delete(recipe_id):
+    _deleting.items().pop(recipe_id, None)
+
+
+def is_recipe_deleting(recipe_id):
+    return recipe_id in _deleting.items()
+
+
+def mark_recipe_dirty(recipe_id):
+    """Registra que la receta necesita recalcular su valor nutricional."""
+    if is_recipe_deleting(recipe_id):
+        return
+
+    collector = getattr(_state, "collector", None)
+    if collector is not None:
+        collector.add(recipe_id)
+        return
+
+    if not transaction.get_connection().in_atomic_block:
+        enqueue_recipe_scores([recipe_id])
+        return
+
+    # Dentro de una transacción: se encola todo el conjunto una vez al confirmarla
+    _transaction_pending.open()[recipe_id] = True
+
+
+@contextmanager
+def collect_rescoring():
+    """
+    Difiere los recálculos hasta el final del bloque. Si el bloque termina
+    dentro de una transacción, se encolan cuando ésta se confirme.
+    Los bloques anidados comparten el colector del bloque externo. Si el
+    bloque lanza una excepción, lo recolectado se descarta.
+    """
+    if getattr(_state, "collector", None) is not None:
+        yield _state.collector
+        return
+
+    collector = _state.collector = set()
+    try:
+        yield collector
+    finally:
+        _state.collector = None
+    # Si el bloque lanzó una excepción no se llega aquí: nada se encola
+    if collector:
+        transaction.on_commit(lambda: enqueue_recipe_scores(collector))
@@ -0,0 +1,187 @@
+# Autor: Ana Sofía Alfonso
+"""
+Envoltorio del cliente del modelo de IA con protección ante ráfagas y caídas:
+
+- Límite de tasa (token bucket) compartido por todo el proceso.
+- Máximo de llamadas simultáneas (semáforo).
+- Plazo máximo por llamada.
+- Reintentos con backoff exponencial y jitter.
+- Circuit breaker: si la API falla repetidamente se deja de llamar por un
+  tiempo y se responde de inmediato con error para usar el puntaje de respaldo.
+- Contadores para monitoreo (ver `get_stats`).
+"""
+import random
+import threading
+import time
+
+
+class CircuitOpenError(Exception):
+    """La API se considera caída y no se intentó la llamada."""
+
+
+class DeadlineExceededError(Exception):
+    """No se consiguió turno (tasa o concurrencia) antes del plazo."""
+
+
+class TokenBucket:
+    """Permite `rate` llamadas por segundo con ráfagas de hasta `capacity`."""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated_at = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def acquire(self, deadline):
+        """Espera un token hasta `deadline` (time.monotonic). Retorna False si no alcanzó."""
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self._refill(now)
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return True
+                wait = (1 - self.tokens) / self.rate
+            if now + wait > deadline:
+                return False
+            time.sleep(wait)
+
+
+class CircuitBreaker:
+    """
+    closed: las llamadas pasan normalmente.
+    open: tras `failure_threshold` fallos seguidos se rechaza todo durante `reset_timeout` segundos.
+    half_open: pasado ese tiempo se deja pasar una llamada de prueba.
+    """
+
+    def __init__(self, failure_threshold, reset_timeout):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.state = "closed"
+        self.opened_at = 0.0
+        self.probe_thread = None
+        self.lock = threading.Lock()
+
+    def allow(self):
+        with self.lock:
+            if self.state == "open":
+                if time.monotonic() - self.opened_at < self.reset_timeout:
+                    return False
+                self.state = "half_open"
+                self.probe_thread = threading.get_ident()
+                return True
+            # En half_open solo se permite la llamada de prueba que ya está en curso
+            return self.state == "closed"
+
+    def record_success(self):
+        with self.lock:
+            self.failures = 0
+            self.state = "closed"
+
+    def release_probe(self):
+        """
+        La llamada de prueba de este hilo terminó sin llegar a la API (se
+        agotó el plazo esperando turno): el circuito vuelve a "open" ya
+        vencido para que la próxima llamada pueda probar.
+        """
+        with self.lock:
+            if self.state == "half_open" and self.probe_thread == threading.get_ident():
+                self.state = "open"
+                self.opened_at = time.monotonic() - self.reset_timeout
+
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+            if self.state == "half_open" or self.failures >= self.failure_threshold:
+                self.state = "open"
+                self.opened_at = time.monotonic()
+
+
+class ResilientModelClient:
+    """Misma interfaz que el modelo envuelto: `generate_content(prompt)`."""
+
+    def __init__(self, model, rate=1.0, burst=5, max_in_flight=4, timeout=30.0,
+                 max_retries=2, backoff_base=1.0, backoff_max=20.0,
+                 failure_threshold=5, reset_timeout=60.0):
+        self.model = model
+        self.bucket = TokenBucket(rate, burst)
+        self.semaphore = threading.BoundedSemaphore(max_in_flight)
+        self.breaker = CircuitBreaker(failure_threshold, reset_timeout)
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.stats_lock = threading.Lock()
+        self.stats = {
+            "calls": 0,
+            "successes": 0,
+            "failures": 0,
+            "retries": 0,
+            "rejected_open": 0,
+            "deadline_exceeded": 0,
+        }
+
+    def _count(self, key):
+        with self.stats_lock:
+            self.stats[key] += 1
+
+    def get_stats(self):
+        with self.stats_lock:
+            stats = dict(self.stats)
+        stats["circuit_state"] = self.breaker.state
+        return stats
+
+    def _backoff(self, attempt):
+        # "Full jitter": espera aleatoria entre 0 y el tope exponencial
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    def _call_once(self, prompt, deadline):
+        if not self.bucket.acquire(deadline):
+            self._count("deadline_exceeded")
+            raise DeadlineExceededError("Límite de tasa: no hubo turno antes del plazo")
+
+        if not self.semaphore.acquire(timeout=max(deadline - time.monotonic(), 0)):
+            self._count("deadline_exceeded")
+            raise DeadlineExceededError("Demasiadas llamadas simultáneas al modelo")
+
+        try:
+            remaining = max(deadline - time.monotonic(), 0.1)
+            return self.model.generate_content(prompt, request_options={"timeout": remaining})
+        finally:
+            self.semaphore.release()
+
+    def generate_content(self, prompt):
+        self._count("calls")
+        deadline = time.monotonic() + self.timeout
+
+        for attempt in range(self.max_retries + 1):
+            if not self.breaker.allow():
+                self._count("rejected_open")
+                raise CircuitOpenError("La API del modelo no está disponible (circuito abierto)")
+
+            try:
+                response = self._call_once(prompt, deadline)
+            except DeadlineExceededError:
+                # No cuenta como fallo de la API, pero si era la llamada de prueba
+                # hay que liberarla o el circuito quedaría en half_open para siempre
+                self.breaker.release_probe()
+                raise
+            except Exception:
+                self.breaker.record_failure()
+                self._count("failures")
+                delay = self._backoff(attempt)
+                if attempt == self.max_retries or time.monotonic() + delay >= deadline:
+                    raise
+                self._count("retries")
+                time.sleep(delay)
+                continue
+
+            self.breaker.record_success()
+            self._count("successes")
+            return response
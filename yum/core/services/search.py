@@ -0,0 +1,190 @@
+# Autor: Ana Sofía Alfonso
+"""
+Índice de búsqueda de texto completo de recetas.
+
+Indexa título, descripción, nombres de los ingredientes y texto de las
+instrucciones en una tabla aparte:
+
+- SQLite: tabla virtual FTS5 (rowid = id de la receta), ranking bm25.
+- PostgreSQL: tabla con un tsvector ponderado e índice GIN, ranking ts_rank.
+
+La tabla la crea la migración 0015_recipe_search_index.
+
+El texto se guarda y se consulta sin tildes ("acompañamiento" encuentra
+"acompanamiento") y cada palabra de la búsqueda se trata como prefijo.
+Los cambios solo marcan la receta; el índice se actualiza al confirmar
+la transacción (ver `mark_search_dirty`).
+"""
+import re
+import unicodedata
+from collections import defaultdict
+
+from django.db import connection, transaction
+from django.db.models import FloatField
+from django.db.models.expressions import RawSQL
+
+from core.models import Ingredient, Instruction, Recipe
+from .api_cache import bump_catalog_version
+from .transaction_buffer import TransactionBuffer
+
+TABLE = "core_recipe_search"
+
+
+def fold(text):
+    """Minúsculas y sin tildes ni diéresis (la ñ queda como n)."""
+    normalized = unicodedata.normalize("NFKD", text or "")
+    return "".join(c for c in normalized if not unicodedata.combining(c)).lower()
+
+
+def search_supported():
+    return connection.vendor in ("sqlite", "postgresql")
+
+
+# Indexación
+
+def _documents(recipe_ids):
+    """Textos a indexar por receta, con tres consultas para todo el lote."""
+    ingredients = defaultdict(list)
+    for recipe_id, nombre in Ingredient.objects.filter(recipe_id__in=recipe_ids).values_list(
+        "recipe_id", "ingredient_type__nombre"
+    ):
+        ingredients[recipe_id].append(nombre)
+
+    instructions = defaultdict(list)
+    for recipe_id, title, details in Instruction.objects.filter(recipe_id__in=recipe_ids).values_list(
+        "recipe_id", "title", "details"
+    ):
+        instructions[recipe_id].extend([title, details])
+
+    for recipe_id, title, description in Recipe.objects.filter(pk__in=recipe_ids).values_list(
+        "pk", "title", "description"
+    ):
+        yield (
+            recipe_id,
+            fold(title),
+            fold(description),
+            fold(" ".join(ingredients[recipe_id])),
+            fold(" ".join(instructions[recipe_id])),
+        )
+
+
+def index_recipes(recipe_ids):
+    """Reemplaza las entradas de las recetas; las que ya no existen se quitan del índice."""
+    recipe_ids = list(recipe_ids)
+    if not recipe_ids or not search_supported():
+        return 0
+
+    id_column = "rowid" if connection.vendor == "sqlite" else "recipe_id"
+    placeholders = ", ".join(["%s"] * len(recipe_ids))
+    documents = list(_documents(recipe_ids))
+
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {TABLE} WHERE {id_column} IN ({placeholders})", recipe_ids)
+        if connection.vendor == "sqlite":
+            cursor.executemany(
+                f"INSERT INTO {TABLE} (rowid, title, description, ingredients, instructions) "
+                "VALUES (%s, %s, %s, %s, %s)",
+                documents,
+            )
+        else:
+            cursor.executemany(
+                f"INSERT INTO {TABLE} (recipe_id, document) VALUES (%s, "
+                "setweight(to_tsvector('simple', %s), 'A') || setweight(to_tsvector('simple', %s), 'C') || "
+                "setweight(to_tsvector('simple', %s), 'B') || setweight(to_tsvector('simple', %s), 'D'))",
+                documents,
+            )
+    return len(documents)
+
+
+def rebuild_index(batch_size=1000):
+    """Reconstruye todo el índice. Retorna cuántas recetas quedaron indexadas."""
+    if not search_supported():
+        return 0
+
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {TABLE}")
+
+    indexed = 0
+    batch = []
+    for recipe_id in Recipe.objects.values_list("pk", flat=True).iterator(chunk_size=batch_size):
+        batch.append(recipe_id)
+        if len(batch) >= batch_size:
+            indexed += index_recipes(batch)
+            batch = []
+    return indexed + index_recipes(batch)
+
+
+def _flush_pending(pending):
+    index_recipes(set(pending))
+    # Las búsquedas de la API guardadas antes de reindexar quedan viejas
+    bump_catalog_version()
+
+
+# Recetas por reindexar de la transacción actual
+_pending = TransactionBuffer(_flush_pending)
+
+
+def mark_search_dirty(recipe_id):
+    """Registra que la receta debe reindexarse; se hace una vez por transacción."""
+    if not transaction.get_connection().in_atomic_block:
+        index_recipes([recipe_id])
+        return
+    _pending.open()[recipe_id] = True
+
+
+# Consultas
+
+def _match_expression(query):
+    words = re.findall(r"\w+", fold(query))
+    if connection.vendor == "sqlite":
+        return " ".join(f'"{word}"*' for word in words)
+    return " & ".join(f"{word}:*" for word in words)
+
+
+def search_recipes(queryset, query):
+    """
+    Filtra el queryset de recetas por la búsqueda y lo ordena por
+    relevancia (anotación `search_rank`, menor es más relevante).
+
+    El filtro y el ranking son subconsultas sobre el índice: no se traen
+    ids a Python ni se limita la cantidad de resultados, así que el queryset
+    se puede paginar como cualquier otro.
+    """
+    if not search_supported():
+        return queryset.filter(title__icontains=query)
+
+    expression = _match_expression(query)
+    if not expression:
+        return queryset.none()
+
+    recipe_id = f'"{Recipe._meta.db_table}"."{Recipe._meta.pk.column}"'
+    if connection.vendor == "sqlite":
+        matches = f"SELECT rowid FROM {TABLE} WHERE {TABLE} MATCH %s"
+        # Pesos bm25 por columna: título, descripción, ingredientes, instrucciones
+        rank = (
+            f"SELECT bm25({TABLE}, 10.0, 2.0, 5.0, 1.0) FROM {TABLE} "
+            f"WHERE {TABLE} MATCH %s AND rowid = {recipe_id}"
+        )
+    else:
+        matches = f"SELECT recipe_id FROM {TABLE} WHERE document @@ to_tsquery('simple', %s)"
+        rank = (
+            f"SELECT -ts_rank(document, to_tsquery('simple', %s)) FROM {TABLE} "
+            f"WHERE recipe_id = {recipe_id}"
+        )
+
+    return (
+        queryset.filter(pk__in=RawSQL(matches, [expression]))
+        .annotate(search_rank=RawSQL(rank, [expression], output_field=FloatField()))
+        .order_by("search_rank", "pk")
+    )
+
+
+def search_recipe_ids(query):
+    """
+    Ids de las recetas que contienen todas las palabras (como prefijo),
+    de la más a la menos relevante. Retorna None si la base de datos no
+    tiene índice de búsqueda.
+    """
+    if not search_supported():
+        return None
+    return list(search_recipes(Recipe.objects.all(), query).values_list("pk", flat=True))
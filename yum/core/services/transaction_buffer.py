@@ -0,0 +1,55 @@
+# Autor: Ana Sofía Alfonso
+"""
+Datos que las señales acumulan durante una transacción.
+
+Varias señales juntan ids de recetas (para recalcular, para el registro de
+cambios, etc.) y los procesan una sola vez al confirmar la transacción.
+Guardarlos en un thread-local sin más tiene un problema: si la transacción
+se revierte, on_commit nunca corre y los ids quedan para la siguiente
+transacción del mismo hilo.
+
+TransactionBuffer asocia lo acumulado al callback que registró en
+on_commit. Django descarta los callbacks de una transacción (o savepoint)
+revertida; si el callback ya no está registrado, lo acumulado era de una
+transacción que no se confirmó y se descarta.
+"""
+import threading
+
+from django.db import transaction
+
+
+class TransactionBuffer:
+    def __init__(self, flush=None):
+        """`flush(items)` recibe el diccionario acumulado al confirmar la transacción."""
+        self.flush = flush
+        self._local = threading.local()
+
+    def _is_registered(self):
+        entry = getattr(self._local, "entry", None)
+        if entry is None:
+            return False
+        connection = transaction.get_connection()
+        return connection.in_atomic_block and any(item is entry for item in connection.run_on_commit)
+
+    def items(self):
+        """Lo acumulado en la transacción actual (vacío fuera de ella o si se revirtió)."""
+        return self._local.items if self._is_registered() else {}
+
+    def open(self):
+        """
+        Diccionario de la transacción actual para agregar datos. La primera
+        vez registra el volcado al confirmarla. Solo dentro de una transacción.
+        """
+        if not self._is_registered():
+            connection = transaction.get_connection()
+            self._local.items = {}
+            transaction.on_commit(self._flush)
+            self._local.entry = connection.run_on_commit[-1]
+        return self._local.items
+
+    def _flush(self):
+        items = self._local.items
+        self._local.items = {}
+        self._local.entry = None
+        if items and self.flush:
+            self.flush(items)
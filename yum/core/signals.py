@@ -1,24 +1,287 @@
 # Autor:Ana Sofía Alfonso
 from django.dispatch import receiver
-from django.db.models.signals import post_save, post_delete
+from django.db.models.signals import pre_save, post_save, pre_delete, post_delete, m2m_changed
+from django.contrib.contenttypes.models import ContentType
 from django.db import transaction
-from .models import Review, Ingredient
-from .services.nutritional_value import calculate_nutritional_value
+from django.utils import timezone
+from .models import Review, Ingredient, IngredientType, Instruction, Recipe, Multimedia, User
+from .services.ingredient_dependencies import recipes_using_types, rescore_ingredient_types, scoring_fields_changed
+from .services.rescoring import begin_recipe_delete, end_recipe_delete, is_recipe_deleting, mark_recipe_dirty
+from .services.search import mark_search_dirty
+from .services.ingredient_index import mark_ingredients_changed
+from .services.api_cache import bump_catalog_version
+from .services.change_feed import mark_recipe_changed, mark_recipes_changed
+from .services.transaction_buffer import TransactionBuffer
+from .services import activity_rollups, dashboard_stats
+
+@receiver(pre_save, sender=Review)
+def remember_previous_review_score(sender, instance, **kwargs):
+    # Solo al editar una reseña existente hace falta conocer el puntaje anterior
+    instance._previous_score = None
+    if instance.pk:
+        instance._previous_score = (
+            Review.objects.filter(pk=instance.pk).values_list("recipe_id", "score").first()
+        )
 
 @receiver(post_save, sender=Review)
 def review_saved(sender, instance, created, **kwargs):
-    def _update():
-        instance.recipe.update_media_score()
-    transaction.on_commit(_update)
+    previous = getattr(instance, "_previous_score", None)
+    if previous == (instance.recipe_id, instance.score):
+        return
+    if previous is not None:
+        Recipe.apply_review_score(previous[0], previous[1], delta=-1)
+    Recipe.apply_review_score(instance.recipe_id, instance.score)
+
+@receiver(post_delete, sender=Review)
+def review_deleted(sender, instance, **kwargs):
+    if is_recipe_deleting(instance.recipe_id):
+        return
+    Recipe.apply_review_score(instance.recipe_id, instance.score, delta=-1)
+
+# Django envía pre_delete de todos los objetos de la cascada antes de borrar
+# nada, y el post_delete de la receta después del de sus hijos
+@receiver(pre_delete, sender=Recipe)
+def recipe_deleting(sender, instance, **kwargs):
+    begin_recipe_delete(instance.pk)
+
+@receiver(post_delete, sender=Recipe)
+def recipe_deleted(sender, instance, **kwargs):
+    end_recipe_delete(instance.pk)
+
+@receiver(post_save, sender=Recipe)
+def queue_recipe_nutritional_value(sender, instance, update_fields=None, **kwargs):
+    if update_fields is None or Recipe.SCORING_FIELDS.intersection(update_fields):
+        instance.score_status = "pending"
+        mark_recipe_dirty(instance.pk)
 
 @receiver(post_save, sender=Ingredient)
 def update_recipe_nutritional_value_on_save(sender, instance, **kwargs):
-    recipe = instance.recipe
-    recipe.nutritional_value = calculate_nutritional_value(recipe)
-    recipe.save(update_fields=["nutritional_value"])
+    mark_recipe_dirty(instance.recipe_id)
 
 @receiver(post_delete, sender=Ingredient)
 def update_recipe_nutritional_value_on_delete(sender, instance, **kwargs):
-    recipe = instance.recipe
-    recipe.nutritional_value = calculate_nutritional_value(recipe)
-    recipe.save(update_fields=["nutritional_value"])
+    mark_recipe_dirty(instance.recipe_id)
+
+@receiver(pre_save, sender=IngredientType)
+def remember_previous_ingredient_type(sender, instance, **kwargs):
+    instance._previous_values = None
+    if instance.pk:
+        instance._previous_values = (
+            IngredientType.objects.filter(pk=instance.pk).values("nombre", *IngredientType.SCORING_FIELDS).first()
+        )
+
+@receiver(post_save, sender=IngredientType)
+def rescore_recipes_using_type(sender, instance, created, **kwargs):
+    if created or not scoring_fields_changed(getattr(instance, "_previous_values", None), instance):
+        return
+    type_id = instance.pk
+    transaction.on_commit(lambda: rescore_ingredient_types([type_id]))
+
+@receiver(post_save, sender=IngredientType)
+def reindex_recipes_using_type(sender, instance, created, **kwargs):
+    previous = getattr(instance, "_previous_values", None)
+    if created or previous is None or previous["nombre"] == instance.nombre:
+        return
+    recipe_ids = recipes_using_types([instance.pk])
+    for recipe_id in recipe_ids:
+        mark_search_dirty(recipe_id)
+    # El nombre del tipo aparece en el detalle de las recetas
+    Recipe.touch(recipe_ids)
+    mark_recipes_changed(recipe_ids)
+
+# Índice de búsqueda: título, descripción, ingredientes e instrucciones
+@receiver(post_save, sender=Recipe)
+def reindex_recipe(sender, instance, update_fields=None, **kwargs):
+    if update_fields is None or {"title", "description"}.intersection(update_fields):
+        mark_search_dirty(instance.pk)
+
+@receiver(post_delete, sender=Recipe)
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+@receiver(post_save, sender=Instruction)
+@receiver(post_delete, sender=Instruction)
+def reindex_related_recipe(sender, instance, **kwargs):
+    mark_search_dirty(instance.pk if sender is Recipe else instance.recipe_id)
+
+# updated_at de la receta (ETag/Last-Modified); las reseñas y la imagen
+# lo actualizan en Recipe.apply_review_score y Recipe.sync_cover_image
+_touched_recipes = TransactionBuffer(Recipe.touch)
+
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+@receiver(post_save, sender=Instruction)
+@receiver(post_delete, sender=Instruction)
+def touch_recipe(sender, instance, **kwargs):
+    if is_recipe_deleting(instance.recipe_id):
+        return
+    if not transaction.get_connection().in_atomic_block:
+        Recipe.touch([instance.recipe_id])
+        return
+    # Un solo UPDATE al confirmar, sin importar cuántas filas cambiaron
+    _touched_recipes.open()[instance.recipe_id] = True
+
+@receiver(post_save, sender=Multimedia)
+@receiver(post_delete, sender=Multimedia)
+def sync_recipe_cover_image(sender, instance, **kwargs):
+    if instance.content_type_id == ContentType.objects.get_for_model(Recipe).id:
+        Recipe.sync_cover_image(instance.object_id)
+        mark_recipe_changed(instance.object_id)
+
+@receiver(pre_save, sender=Ingredient)
+def remember_previous_ingredient_recipe(sender, instance, **kwargs):
+    # Si el ingrediente pasa a otra receta, la anterior también cambia en el índice
+    instance._previous_recipe_id = None
+    if instance.pk:
+        instance._previous_recipe_id = (
+            Ingredient.objects.filter(pk=instance.pk).values_list("recipe_id", flat=True).first()
+        )
+
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+def refresh_ingredient_index(sender, instance, **kwargs):
+    mark_ingredients_changed(instance.recipe_id)
+    previous = getattr(instance, "_previous_recipe_id", None)
+    if previous is not None and previous != instance.recipe_id:
+        mark_ingredients_changed(previous)
+
+# Caché de la API pública: cualquier cambio del catálogo la invalida
+@receiver(post_save, sender=Recipe)
+@receiver(post_delete, sender=Recipe)
+@receiver(post_save, sender=Review)
+@receiver(post_delete, sender=Review)
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+@receiver(post_save, sender=Instruction)
+@receiver(post_delete, sender=Instruction)
+def invalidate_api_cache(sender, instance, **kwargs):
+    bump_catalog_version()
+
+# Registro de cambios para sincronización incremental (ver core/services/change_feed.py)
+@receiver(post_save, sender=Recipe)
+@receiver(post_save, sender=Review)
+@receiver(post_delete, sender=Review)
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+@receiver(post_save, sender=Instruction)
+@receiver(post_delete, sender=Instruction)
+def record_recipe_change(sender, instance, **kwargs):
+    recipe_id = instance.pk if sender is Recipe else instance.recipe_id
+    if not is_recipe_deleting(recipe_id):
+        mark_recipe_changed(recipe_id)
+
+@receiver(post_delete, sender=Recipe)
+def record_recipe_deletion(sender, instance, **kwargs):
+    mark_recipe_changed(instance.pk, "delete")
+
+# Totales y rankings del panel de administración (ver core/services/dashboard_stats.py)
+@receiver(post_save, sender=User)
+def count_user(sender, instance, created, **kwargs):
+    if created:
+        dashboard_stats.add_to_stat("users", 1)
+
+@receiver(post_delete, sender=User)
+def uncount_user(sender, instance, **kwargs):
+    dashboard_stats.add_to_stat("users", -1)
+
+@receiver(post_save, sender=IngredientType)
+def count_ingredient_type(sender, instance, created, **kwargs):
+    if created:
+        dashboard_stats.add_to_stat("ingredient_types", 1)
+
+@receiver(post_delete, sender=IngredientType)
+def uncount_ingredient_type(sender, instance, **kwargs):
+    dashboard_stats.add_to_stat("ingredient_types", -1)
+
+@receiver(post_save, sender=Recipe)
+def count_recipe(sender, instance, created, **kwargs):
+    if created:
+        dashboard_stats.add_to_stat("recipes", 1)
+
+@receiver(post_delete, sender=Recipe)
+def uncount_recipe(sender, instance, **kwargs):
+    dashboard_stats.add_to_stat("recipes", -1)
+    dashboard_stats.remove_from_board("recipes", instance.pk)
+
+@receiver(post_save, sender=Review)
+def count_review(sender, instance, created, **kwargs):
+    previous = getattr(instance, "_previous_score", None)
+    if created:
+        dashboard_stats.add_to_stat("reviews", 1)
+    if previous == (instance.recipe_id, instance.score):
+        return
+    dashboard_stats.add_to_stat("review_score_sum", instance.score - (previous[1] if previous else 0))
+    if previous is not None and previous[0] != instance.recipe_id:
+        dashboard_stats.refresh_recipe_rating(previous[0])
+    dashboard_stats.refresh_recipe_rating(instance.recipe_id)
+
+@receiver(post_delete, sender=Review)
+def uncount_review(sender, instance, **kwargs):
+    dashboard_stats.add_to_stat("reviews", -1)
+    dashboard_stats.add_to_stat("review_score_sum", -instance.score)
+    if not is_recipe_deleting(instance.recipe_id):
+        dashboard_stats.refresh_recipe_rating(instance.recipe_id)
+
+# Actividad por hora y por día (ver core/services/activity_rollups.py)
+ROLLUP_DATE_FIELDS = {Recipe: ("recipes", "creation_date"), Review: ("reviews", "creation_date"), User: ("users", "date_joined")}
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_save, sender=Review)
+@receiver(post_save, sender=User)
+def record_activity(sender, instance, created, **kwargs):
+    if created:
+        metric, field = ROLLUP_DATE_FIELDS[sender]
+        activity_rollups.record(metric, getattr(instance, field))
+
+@receiver(post_delete, sender=Recipe)
+@receiver(post_delete, sender=Review)
+@receiver(post_delete, sender=User)
+def remove_activity(sender, instance, **kwargs):
+    metric, field = ROLLUP_DATE_FIELDS[sender]
+    activity_rollups.record(metric, getattr(instance, field), delta=-1)
+
+@receiver(m2m_changed, sender=User.favorite_recipes.through)
+def record_favorites(sender, action, pk_set, **kwargs):
+    if action == "post_add" and pk_set:
+        activity_rollups.record("favorites", timezone.now(), delta=len(pk_set))
+
+# Contadores por usuario: recetas, reseñas y favoritas
+@receiver(post_save, sender=Recipe)
+@receiver(post_save, sender=Review)
+def count_user_activity(sender, instance, created, **kwargs):
+    if created:
+        field = "recipe_count" if sender is Recipe else "review_count"
+        User.add_to_counts([instance.user_id], **{field: 1})
+
+@receiver(post_delete, sender=Recipe)
+@receiver(post_delete, sender=Review)
+def uncount_user_activity(sender, instance, **kwargs):
+    field = "recipe_count" if sender is Recipe else "review_count"
+    User.add_to_counts([instance.user_id], **{field: -1})
+
+@receiver(pre_delete, sender=Recipe)
+def uncount_favorites_of_recipe(sender, instance, **kwargs):
+    # El borrado en cascada de la tabla intermedia no envía m2m_changed
+    favorites = User.favorite_recipes.through.objects.filter(recipe_id=instance.pk).values("user_id")
+    User.add_to_counts(favorites, favorite_count=-1)
+
+@receiver(m2m_changed, sender=User.favorite_recipes.through)
+def count_favorites(sender, instance, action, reverse, pk_set, **kwargs):
+    if action in ("pre_remove", "pre_clear"):
+        # remove() recibe también ids que no estaban; se guardan los que sí se van a borrar
+        rows = sender.objects.filter(recipe_id=instance.pk) if reverse else sender.objects.filter(user_id=instance.pk)
+        if pk_set is not None:
+            rows = rows.filter(**{"user_id__in" if reverse else "recipe_id__in": pk_set})
+        instance._removed_favorites = set(rows.values_list("user_id" if reverse else "recipe_id", flat=True))
+        return
+    if action == "post_add":
+        changed, delta = pk_set, 1
+    elif action in ("post_remove", "post_clear"):
+        changed, delta = getattr(instance, "_removed_favorites", set()), -1
+    else:
+        return
+    if not changed:
+        return
+    if reverse:
+        User.add_to_counts(changed, favorite_count=delta)
+    else:
+        User.add_to_counts([instance.pk], favorite_count=delta * len(changed))
@@ -0,0 +1,37 @@
+// Autor: Ana Sofia Alfonso
+
+// Marca o desmarca favoritas sin recargar la página.
+// Si fetch falla, el formulario se envía normalmente.
+// Se escucha en el documento para cubrir también las tarjetas que agrega
+// el scroll infinito.
+document.addEventListener('submit', function(event) {
+    const form = event.target.closest('form.favorite-form');
+    if (!form) {
+        return;
+    }
+    event.preventDefault();
+    const button = form.querySelector('button');
+    button.disabled = true;
+
+    fetch(form.action, {
+        method: 'POST',
+        body: new FormData(form),
+        headers: { 'Accept': 'application/json' },
+        credentials: 'same-origin'
+    })
+        .then(function(response) {
+            if (!response.ok) {
+                throw new Error(response.status);
+            }
+            return response.json();
+        })
+        .then(function(data) {
+            button.classList.toggle(form.dataset.onClass, data.is_favorite);
+            button.classList.toggle(form.dataset.offClass, !data.is_favorite);
+            button.textContent = data.is_favorite ? '❤️' : '🤍';
+            button.disabled = false;
+        })
+        .catch(function() {
+            form.submit();
+        });
+});
@@ -0,0 +1,45 @@
+// Autor: Ana Sofia Alfonso
+
+// Scroll infinito: cuando el enlace "Cargar más" entra en pantalla se pide
+// el fragmento HTML de la página siguiente y se reemplaza el enlace por él.
+// Sin JavaScript el enlace sigue funcionando como paginación normal.
+document.addEventListener('DOMContentLoaded', function() {
+    if (!('IntersectionObserver' in window)) {
+        return;
+    }
+
+    const observer = new IntersectionObserver(function(entries) {
+        entries.forEach(function(entry) {
+            if (!entry.isIntersecting) {
+                return;
+            }
+            const sentinel = entry.target;
+            observer.unobserve(sentinel);
+
+            fetch(sentinel.dataset.nextUrl, { credentials: 'same-origin' })
+                .then(function(response) {
+                    if (!response.ok) {
+                        throw new Error(response.status);
+                    }
+                    return response.text();
+                })
+                .then(function(html) {
+                    const template = document.createElement('template');
+                    template.innerHTML = html;
+                    sentinel.replaceWith(template.content);
+                    watch();
+                })
+                .catch(function() {
+                    // Se deja el enlace para cargar la página completa
+                });
+        });
+    }, { rootMargin: '400px' });
+
+    function watch() {
+        document.querySelectorAll('.infinite-scroll-next').forEach(function(sentinel) {
+            observer.observe(sentinel);
+        });
+    }
+
+    watch();
+});
@@ -1,15 +1,69 @@
-from django.test import TestCase
+import json
+import os
+import re
+import shutil
+import tempfile
+from io import BytesIO, StringIO
+from django.core.management import call_command
+from django.db import DatabaseError, connection, transaction
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
-from .models import User, Recipe, IngredientType
+from django.utils import timezone
+from django.core.files.uploadedfile import SimpleUploadedFile
+from .models import User, Recipe, RecipeChange, DashboardStat, LeaderboardEntry, ActivityRollup, IngredientType, Ingredient, Instruction, Multimedia, NutritionJob, Review
+from .services.nutrition_jobs import claim_jobs, enqueue_recipe_scores, process_pending_jobs, run_jobs
+from .services.nutrition_cache import recipe_fingerprint, reset_cache_stats
+from .services.nutrition_estimator import estimate_nutritional_value, estimate_scores
+from .services.rescoring import collect_rescoring, is_recipe_deleting
+from .services.search import search_recipe_ids
+from .services.api_cache import get_stats as get_api_cache_stats, reset_stats as reset_api_cache_stats
+from .services.ingredient_index import filter_by_ingredients, index as ingredient_index
+from .services.dashboard_stats import reconcile as reconcile_dashboard_stats
+from .pagination import EstimatedCountPaginator
+from .services.resilient_client import CircuitOpenError, DeadlineExceededError, ResilientModelClient
+from .services.nutritional_value import fetch_nutritional_values
 from datetime import timedelta
 from unittest.mock import patch
 
 
-class FavoriteViewTest(TestCase):
+class FakeScoringModel:
+    """Reemplazo de genai.GenerativeModel que responde sin usar la red."""
+
+    class Response:
+        def __init__(self, text):
+            self.text = text
+
+    def __init__(self, score=50, error=None, batch_text=None):
+        self.score = score
+        self.error = error
+        self.batch_text = batch_text
+        self.prompts = []
+
+    def generate_content(self, prompt, request_options=None):
+        self.prompts.append(prompt)
+        if self.error:
+            raise self.error
+        ids = re.findall(r"\[id=(\d+)\]", prompt)
+        if not ids:
+            return self.Response(str(self.score))
+        if self.batch_text is not None:
+            return self.Response(self.batch_text)
+        return self.Response(json.dumps([{"id": int(i), "puntaje": self.score} for i in ids]))
+
+
+class PatchedModelTestCase(TestCase):
+    """Evita que las pruebas que crean recetas lleguen a Gemini; sin pruebas propias."""
+
     def setUp(self):
-        self.patcher = patch("core.models.calculate_nutritional_value", return_value=0)
-        self.mock_calc = self.patcher.start()
+        patcher = patch("core.services.nutritional_value.get_model")
+        self.mock_model = patcher.start()
+        self.addCleanup(patcher.stop)
+
 
+class FavoriteViewTest(PatchedModelTestCase):
+    def setUp(self):
+        super().setUp()
         self.user = User.objects.create_user(username="testuser", password="12345")
         self.client.login(username="testuser", password="12345")
         self.recipe = Recipe.objects.create(
@@ -22,14 +76,221 @@ class FavoriteViewTest(TestCase):
         )
         self.user.favorite_recipes.add(self.recipe)
 
-    def tearDown(self):
-        self.patcher.stop()
-
     def test_favorite_list_view(self):
         response = self.client.get(reverse("favorites"))
         self.assertEqual(response.status_code, 200)
         self.assertContains(response, "Receta favorita")
 
+    def test_toggle_favorite_returns_json(self):
+        url = reverse("toggle_favorite", args=[self.recipe.pk])
+        response = self.client.post(url, HTTP_ACCEPT="application/json")
+        self.assertEqual(response.json(), {"recipe_id": self.recipe.pk, "is_favorite": False})
+        self.assertFalse(self.user.favorite_recipes.exists())
+
+        self.client.post(url, HTTP_ACCEPT="application/json")
+        self.assertTrue(self.user.favorite_recipes.filter(pk=self.recipe.pk).exists())
+        self.assertEqual(self.client.post(reverse("toggle_favorite", args=[9999])).status_code, 404)
+
+    def test_home_annotates_favorite_flag(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse("user_home"))
+        self.assertTrue(response.context["recipes"][0].is_favorite)
+        # El estado de favorita viaja en la misma consulta de las recetas
+        favorite_queries = [q["sql"] for q in queries if "favorite_recipes" in q["sql"]]
+        self.assertEqual(len(favorite_queries), 1)
+        self.assertIn('"core_recipe"', favorite_queries[0])
+
+
+class RecipesApiTest(PatchedModelTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username="testuser", password="12345")
+
+    def test_api_cursor_fields_and_stream(self):
+        for i in range(4):
+            Recipe.objects.create(
+                user=self.user,
+                title=f"Receta {i}",
+                description="Descripción",
+                category="postre",
+                preparation_time=timedelta(minutes=5),
+                portions=1
+            )
+        url = reverse("recipes_api")
+
+        first = self.client.get(url, {"limit": 3, "fields": "id,nombre"}).json()
+        self.assertEqual(set(first["recipes"][0]), {"id", "nombre"})
+        self.assertTrue(first["has_more"])
+        second = self.client.get(url, {"limit": 3, "after": first["next"], "fields": "id"}).json()
+        self.assertFalse(second["has_more"])
+        ids = [row["id"] for row in first["recipes"] + second["recipes"]]
+        self.assertEqual(ids, list(Recipe.objects.order_by("-creation_date", "-pk").values_list("pk", flat=True)))
+
+        response = self.client.get(url, {"stream": "1", "fields": "id,porciones"})
+        lines = b"".join(response.streaming_content).decode().splitlines()
+        self.assertEqual([json.loads(line)["id"] for line in lines], ids)
+        self.assertEqual(self.client.get(url, {"fields": "clave"}).status_code, 400)
+
+
+class ApiResponseCacheTest(PatchedModelTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username="testuser", password="12345")
+        with self.captureOnCommitCallbacks(execute=True):
+            self.recipe = Recipe.objects.create(
+                user=self.user,
+                title="Torta de chocolate",
+                description="Descripción",
+                category="postre",
+                preparation_time=timedelta(minutes=30),
+                portions=4
+            )
+
+    def test_api_response_cache(self):
+        reset_api_cache_stats()
+        url = reverse("recipes_api")
+        first = self.client.get(url, {"fields": "id,nombre", "q": "chocolate"})
+        self.assertEqual(first["X-Cache"], "MISS")
+
+        # Mismos parámetros en otro orden: solo se lee la versión del catálogo
+        with CaptureQueriesContext(connection) as queries:
+            second = self.client.get(url, {"q": "chocolate", "fields": "id,nombre"})
+        self.assertEqual(second["X-Cache"], "HIT")
+        self.assertEqual(len(queries), 1)
+        self.assertEqual(second.content, first.content)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Review.objects.create(user=self.user, recipe=self.recipe, score=4)
+        third = self.client.get(url, {"fields": "id,nombre", "q": "chocolate"})
+        self.assertEqual(third["X-Cache"], "MISS")
+        self.assertEqual(get_api_cache_stats()["hits"], 1)
+
+    @patch("core.services.nutritional_value.get_model", return_value=FakeScoringModel(88))
+    def test_worker_score_invalidates_cache(self, mock_model):
+        url = reverse("recipes_api")
+        first = self.client.get(url, {"fields": "id,valor_nutricional"})
+        self.assertEqual(first.json()["recipes"][0]["valor_nutricional"], 0)
+
+        # El worker escribe con update(), sin señales
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(process_pending_jobs(), (1, 1))
+        second = self.client.get(url, {"fields": "id,valor_nutricional"})
+        self.assertEqual(second["X-Cache"], "MISS")
+        self.assertEqual(second.json()["recipes"][0]["valor_nutricional"], 88)
+        self.assertNotEqual(second["ETag"], first["ETag"])
+
+
+class ConditionalGetTest(PatchedModelTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username="testuser", password="12345")
+        self.client.login(username="testuser", password="12345")
+        with self.captureOnCommitCallbacks(execute=True):
+            self.recipe = Recipe.objects.create(
+                user=self.user,
+                title="Torta de chocolate",
+                description="Descripción",
+                category="postre",
+                preparation_time=timedelta(minutes=30),
+                portions=4
+            )
+
+    def test_conditional_get(self):
+        url = reverse("recipe_detail", args=[self.recipe.pk])
+        first = self.client.get(url)
+        self.assertEqual(first.status_code, 200)
+        not_modified = self.client.get(url, HTTP_IF_NONE_MATCH=first["ETag"])
+        self.assertEqual(not_modified.status_code, 304)
+        self.assertEqual(self.client.get(url, HTTP_IF_MODIFIED_SINCE=first["Last-Modified"]).status_code, 304)
+
+        # Pasos nuevos cambian la página y su ETag, con un solo UPDATE por transacción
+        with CaptureQueriesContext(connection) as queries, self.captureOnCommitCallbacks(execute=True):
+            for step in (1, 2, 3):
+                Instruction.objects.create(recipe=self.recipe, title="Mezclar", details="...", complexity=1, n_step=step)
+        touches = [q for q in queries if q["sql"].startswith('UPDATE "core_recipe" SET "updated_at"')]
+        self.assertEqual(len(touches), 1)
+        changed = self.client.get(url, HTTP_IF_NONE_MATCH=first["ETag"])
+        self.assertEqual(changed.status_code, 200)
+        self.assertNotEqual(changed["ETag"], first["ETag"])
+
+        api = self.client.get(reverse("recipes_api"))
+        self.assertEqual(self.client.get(reverse("recipes_api"), HTTP_IF_NONE_MATCH=api["ETag"]).status_code, 304)
+
+
+class RecipeChangeFeedTest(PatchedModelTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username="testuser", password="12345")
+        with self.captureOnCommitCallbacks(execute=True):
+            self.recipe = Recipe.objects.create(
+                user=self.user,
+                title="Torta de chocolate",
+                description="Descripción",
+                category="postre",
+                preparation_time=timedelta(minutes=30),
+                portions=4
+            )
+
+    def test_api_change_feed(self):
+        url = reverse("recipe_changes_api")
+        with self.captureOnCommitCallbacks(execute=True):
+            other = Recipe.objects.create(
+                user=self.user,
+                title="Receta borrada",
+                description="Descripción",
+                category="postre",
+                preparation_time=timedelta(minutes=5),
+                portions=1
+            )
+        other_id = other.pk
+        cursor = self.client.get(url, {"since": 0}).json()["next"]
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Review.objects.create(user=self.user, recipe=self.recipe, score=5)
+        with self.captureOnCommitCallbacks(execute=True):
+            other.delete()
+
+        feed = self.client.get(url, {"since": cursor, "fields": "id,calificacion"}).json()
+        self.assertEqual(
+            [(change["id"], change["action"]) for change in feed["changes"]],
+            [(self.recipe.pk, "upsert"), (other_id, "delete")],
+        )
+        self.assertEqual(feed["changes"][0]["recipe"]["calificacion"], 5.0)
+        self.assertFalse(feed["has_more"])
+
+        # La compactación deja una fila por receta sin invalidar el cursor
+        call_command("compact_recipe_changes", stdout=StringIO())
+        self.assertEqual(RecipeChange.objects.count(), 2)
+        self.assertEqual(len(self.client.get(url, {"since": cursor}).json()["changes"]), 2)
+
+
+class HomeKeysetPaginationTest(PatchedModelTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username="testuser", password="12345")
+        self.client.login(username="testuser", password="12345")
+
+    def test_home_keyset_pagination(self):
+        for i in range(30):
+            Recipe.objects.create(
+                user=self.user,
+                title=f"Receta {i}",
+                description="Descripción",
+                category="postre",
+                preparation_time=timedelta(minutes=5),
+                portions=1
+            )
+        # Fechas repetidas: el id desempata sin saltar ni repetir recetas
+        Recipe.objects.update(creation_date=timezone.now())
+
+        first = self.client.get(reverse("user_home"))
+        self.assertEqual(len(first.context["recipes"]), 24)
+        page = self.client.get(reverse("user_home_page") + "?" + first.context["next_page_query"])
+        self.assertTemplateNotUsed(page, "core/base.html")
+        self.assertNotIn("next_page_query", page.context)
+
+        seen = [recipe.pk for recipe in first.context["recipes"]] + [recipe.pk for recipe in page.context["recipes"]]
+        self.assertEqual(sorted(seen), sorted(Recipe.objects.values_list("pk", flat=True)))
 
 
 class IngredientTypeModelTest(TestCase):
@@ -45,3 +306,700 @@ class IngredientTypeModelTest(TestCase):
         self.assertEqual(tipo.nombre, "zanahoria")  # se guarda en minúsculas
         self.assertEqual(tipo.category, "vegetal")
         self.assertEqual(tipo.user, self.user)
+
+
+class RecipeCoverImageTest(PatchedModelTestCase):
+    def setUp(self):
+        super().setUp()
+        self.media_root = tempfile.mkdtemp()
+        self.settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        self.settings_override.enable()
+
+        self.user = User.objects.create_user(username="chef", password="12345")
+        self.recipe = Recipe.objects.create(
+            user=self.user,
+            title="Ensalada",
+            description="Descripción",
+            category="ensalada",
+            preparation_time=timedelta(minutes=10),
+            portions=2
+        )
+
+    def tearDown(self):
+        self.settings_override.disable()
+        shutil.rmtree(self.media_root, ignore_errors=True)
+
+    def test_cover_image_follows_multimedia(self):
+        media = Multimedia(file=SimpleUploadedFile("salad.jpeg", b"img"))
+        media.content_object = self.recipe
+        media.save()
+
+        recipe = Recipe.objects.get(pk=self.recipe.pk)
+        with self.assertNumQueries(0):
+            self.assertEqual(recipe.image, media.file.url)
+
+        media.file = SimpleUploadedFile("pasta.jpeg", b"img")
+        media.save()
+        self.assertEqual(Recipe.objects.get(pk=self.recipe.pk).image, media.file.url)
+
+        media.delete()
+        self.assertIsNone(Recipe.objects.get(pk=self.recipe.pk).image)
+
+
+class NutritionJobTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="chef", password="12345")
+        self.tipo = IngredientType.objects.create(nombre="tomate", category="vegetal")
+        with self.captureOnCommitCallbacks(execute=True):
+            self.recipe = Recipe.objects.create(
+                user=self.user,
+                title="Sopa",
+                description="Descripción",
+                category="entrada",
+                preparation_time=timedelta(minutes=20),
+                portions=2
+            )
+
+    def test_saves_enqueue_a_single_pending_job(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            for quantity in (1, 2, 3):
+                Ingredient.objects.create(recipe=self.recipe, ingredient_type=self.tipo, quantity=quantity, unit="u")
+
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.score_status, "pending")
+        self.assertEqual(NutritionJob.objects.filter(recipe=self.recipe, status="pending").count(), 1)
+
+    def test_ingredient_type_edit_rescores_dependent_recipes(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            Ingredient.objects.create(recipe=self.recipe, ingredient_type=self.tipo, quantity=1, unit="u")
+        NutritionJob.objects.all().delete()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.tipo.nombre = "tomate chonto"
+            self.tipo.save()
+        self.assertFalse(NutritionJob.objects.exists())
+
+        out = StringIO()
+        call_command("rescore_ingredient_types", self.tipo.pk, dry_run=True, stdout=out)
+        self.assertIn("Recetas afectadas: 1", out.getvalue())
+        self.assertFalse(NutritionJob.objects.exists())
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.tipo.excesses = ["Sodio"]
+            self.tipo.save()
+        self.assertEqual(NutritionJob.objects.filter(recipe=self.recipe, status="pending").count(), 1)
+
+    def test_throttled_rescore_keeps_score_and_shares_the_rate(self):
+        other = Recipe.objects.create(
+            user=self.user,
+            title="Arepa",
+            description="Descripción",
+            category="entrada",
+            preparation_time=timedelta(minutes=10),
+            portions=1
+        )
+        Recipe.objects.filter(pk__in=[self.recipe.pk, other.pk]).update(score_status="ready", nutritional_value=7)
+        NutritionJob.objects.all().delete()
+
+        enqueue_recipe_scores([self.recipe.pk], per_minute=1)
+        enqueue_recipe_scores([other.pk], per_minute=1)
+
+        # Cada llamada sigue a la anterior: una receta por minuto en total
+        first = NutritionJob.objects.get(recipe=self.recipe).run_after
+        second = NutritionJob.objects.get(recipe=other).run_after
+        self.assertGreaterEqual(second - first, timedelta(minutes=1))
+
+        # El puntaje anterior sigue visible hasta que un worker toma el trabajo
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.score_status, "ready")
+        stale = timezone.now() - timedelta(hours=1)
+        Recipe.objects.filter(pk=self.recipe.pk).update(updated_at=stale)
+        NutritionJob.objects.filter(recipe=self.recipe).update(run_after=timezone.now())
+        self.assertEqual([job.recipe_id for job in claim_jobs()], [self.recipe.pk])
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.score_status, "pending")
+        # El cambio de estado invalida las validaciones condicionales del detalle
+        self.assertGreater(self.recipe.updated_at, stale)
+
+    @patch("core.services.rescoring.enqueue_recipe_scores")
+    def test_collect_rescoring_enqueues_each_recipe_once(self, mock_enqueue):
+        with self.captureOnCommitCallbacks(execute=True):
+            with collect_rescoring():
+                for quantity in range(12):
+                    Ingredient.objects.create(recipe=self.recipe, ingredient_type=self.tipo, quantity=quantity, unit="g")
+                Ingredient.objects.filter(recipe=self.recipe).first().delete()
+
+        mock_enqueue.assert_called_once_with({self.recipe.pk})
+
+    @patch("core.services.rescoring.enqueue_recipe_scores")
+    def test_collect_rescoring_discards_recipes_when_the_block_fails(self, mock_enqueue):
+        with self.captureOnCommitCallbacks(execute=True):
+            with self.assertRaises(ValueError):
+                # El error se atrapa fuera y la transacción externa sí se confirma
+                with collect_rescoring():
+                    Ingredient.objects.create(recipe=self.recipe, ingredient_type=self.tipo, quantity=1, unit="g")
+                    raise ValueError("importación fallida")
+
+        mock_enqueue.assert_not_called()
+
+    @patch("core.services.rescoring.enqueue_recipe_scores")
+    def test_cascade_deletes_only_rescore_surviving_recipes(self, mock_enqueue):
+        with self.captureOnCommitCallbacks(execute=True):
+            otra = Recipe.objects.create(
+                user=User.objects.create_user(username="otro", password="12345"),
+                title="Guiso",
+                description="Descripción",
+                category="plato fuerte",
+                preparation_time=timedelta(minutes=40),
+                portions=4
+            )
+            for recipe in (self.recipe, otra):
+                Ingredient.objects.create(recipe=recipe, ingredient_type=self.tipo, quantity=1, unit="u")
+        mock_enqueue.reset_mock()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.recipe.delete()
+        mock_enqueue.assert_not_called()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.tipo.delete()
+        mock_enqueue.assert_called_once_with({otra.pk})
+
+    def test_failed_delete_does_not_leave_recipe_marked(self):
+        # El borrado falla después de pre_delete: la receta sigue existiendo
+        with patch("django.db.models.sql.subqueries.DeleteQuery.delete_batch", side_effect=DatabaseError("database is locked")):
+            with self.assertRaises(DatabaseError), transaction.atomic():
+                self.recipe.delete()
+        self.assertFalse(is_recipe_deleting(self.recipe.pk))
+
+        NutritionJob.objects.all().delete()
+        with self.captureOnCommitCallbacks(execute=True):
+            Ingredient.objects.create(recipe=self.recipe, ingredient_type=self.tipo, quantity=1, unit="u")
+        self.assertTrue(NutritionJob.objects.filter(recipe=self.recipe, status="pending").exists())
+
+    @patch("core.services.nutritional_value.get_model", return_value=FakeScoringModel(87))
+    def test_worker_fills_nutritional_value(self, mock_model):
+        RecipeChange.objects.all().delete()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(process_pending_jobs(), (1, 1))
+
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.nutritional_value, 87)
+        self.assertEqual(self.recipe.score_status, "ready")
+        self.assertEqual(list(RecipeChange.objects.values_list("recipe_id", "action")), [(self.recipe.pk, "upsert")])
+
+        # Una receta borrada mientras se calculaba no vuelve a aparecer después de su borrado
+        with self.captureOnCommitCallbacks(execute=True):
+            enqueue_recipe_scores([self.recipe.pk])
+        jobs = claim_jobs()
+        recipe_id = self.recipe.pk
+        with self.captureOnCommitCallbacks(execute=True):
+            self.recipe.delete()
+        with self.captureOnCommitCallbacks(execute=True):
+            run_jobs(jobs)
+        self.assertEqual(RecipeChange.objects.filter(recipe_id=recipe_id).order_by("seq").last().action, "delete")
+
+    @patch("core.services.nutritional_value.get_model", return_value=FakeScoringModel(error=TimeoutError("timeout")))
+    def test_failed_job_is_retried_later(self, mock_model):
+        process_pending_jobs()
+
+        job = NutritionJob.objects.get(recipe=self.recipe)
+        self.assertEqual(job.status, "pending")
+        self.assertEqual(job.attempts, 1)
+        self.assertEqual(process_pending_jobs(), (0, 0))  # en backoff
+
+    def test_worker_requeues_jobs_abandoned_while_it_runs(self):
+        NutritionJob.objects.all().delete()
+
+        def sleep(seconds):
+            # Primera espera: otro worker toma un trabajo y se cae; segunda: se detiene el worker
+            if NutritionJob.objects.exists():
+                raise KeyboardInterrupt
+            job = NutritionJob.objects.create(recipe=self.recipe, status="running")
+            NutritionJob.objects.filter(pk=job.pk).update(updated_at=timezone.now() - timedelta(hours=1))
+
+        with patch("core.management.commands.process_nutrition_jobs.time.sleep", side_effect=sleep), \
+                self.assertRaises(KeyboardInterrupt):
+            call_command("process_nutrition_jobs", requeue_interval=0, stdout=StringIO())
+        self.assertEqual(NutritionJob.objects.get(recipe=self.recipe).status, "pending")
+
+    def test_worker_reports_client_stats(self):
+        reset_cache_stats()
+        client = ResilientModelClient(FakeScoringModel(70), rate=1000)
+        out = StringIO()
+        with patch("core.services.nutritional_value.get_model", return_value=client), \
+                self.captureOnCommitCallbacks(execute=True):
+            call_command("process_nutrition_jobs", once=True, stdout=out)
+        self.assertIn("Cliente del modelo: 1 llamadas, 1 exitosas", out.getvalue())
+        self.assertIn("Caché de puntajes: 0 aciertos, 1 fallos (0.0%), 0 eliminadas; 1 entradas", out.getvalue())
+
+    def test_batch_scoring_packs_recipes_in_one_call(self):
+        otra = Recipe.objects.create(
+            user=self.user,
+            title="Crema",
+            description="Descripción",
+            category="entrada",
+            preparation_time=timedelta(minutes=20),
+            portions=2
+        )
+        model = FakeScoringModel(64)
+        with patch("core.services.nutritional_value.get_model", return_value=model):
+            scores, errors = fetch_nutritional_values([self.recipe, otra])
+        self.assertEqual(scores, {self.recipe.pk: 64, otra.pk: 64})
+        self.assertEqual((len(model.prompts), errors), (1, {}))
+
+        model = FakeScoringModel(64, batch_text="no sé")
+        with patch("core.services.nutritional_value.get_model", return_value=model), \
+                self.assertLogs("core.services.nutritional_value", "WARNING"):
+            scores, errors = fetch_nutritional_values([self.recipe, otra])
+        self.assertEqual(scores, {self.recipe.pk: 64, otra.pk: 64})
+        self.assertEqual(len(model.prompts), 3)  # lote fallido + una por receta
+
+    @patch("core.services.nutritional_value.get_model", return_value=FakeScoringModel(72))
+    def test_identical_recipes_reuse_cached_score(self, mock_model):
+        with self.captureOnCommitCallbacks(execute=True):
+            copy = Recipe.objects.create(
+                user=User.objects.create_user(username="otro", password="12345"),
+                title="  sopa ",
+                description="Descripción",
+                category="entrada",
+                preparation_time=timedelta(minutes=5),
+                portions=2
+            )
+        self.assertEqual(recipe_fingerprint(copy), recipe_fingerprint(self.recipe))
+
+        process_pending_jobs()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.recipe.save()
+        process_pending_jobs()
+
+        self.assertEqual(len(mock_model.return_value.prompts), 1)
+        copy.refresh_from_db()
+        self.assertEqual(copy.nutritional_value, 72)
+
+
+@override_settings(NUTRITION_SCORING_ENGINE="local")
+class NutritionEstimatorTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="chef", password="12345")
+        self.espinaca = IngredientType.objects.create(
+            nombre="espinaca", category="vegetal", vitamins=["Vitamina A", "Vitamina K"]
+        )
+        self.gaseosa = IngredientType.objects.create(
+            nombre="gaseosa", category="ultraprocesado", excesses=["Azúcar"]
+        )
+        self.sana = self._recipe("Ensalada", [(self.espinaca, 200)])
+        self.mixta = self._recipe("Combo", [(self.espinaca, 50), (self.gaseosa, 500)])
+
+    def _recipe(self, title, ingredients):
+        with self.captureOnCommitCallbacks(execute=True):
+            recipe = Recipe.objects.create(
+                user=self.user,
+                title=title,
+                description="Descripción",
+                category="plato fuerte",
+                preparation_time=timedelta(minutes=10),
+                portions=2
+            )
+            for tipo, quantity in ingredients:
+                Ingredient.objects.create(recipe=recipe, ingredient_type=tipo, quantity=quantity, unit="g")
+        return recipe
+
+    @patch("core.services.nutritional_value.get_model")
+    def test_local_engine_scores_without_network(self, mock_model):
+        process_pending_jobs()
+
+        self.sana.refresh_from_db()
+        self.mixta.refresh_from_db()
+        mock_model.assert_not_called()
+        self.assertEqual(self.sana.nutritional_value, 96)
+        self.assertLess(self.mixta.nutritional_value, self.sana.nutritional_value)
+
+    def test_batch_matches_single_recipe(self):
+        scores = estimate_scores([self.sana.pk, self.mixta.pk])
+        self.assertEqual(scores[self.sana.pk], estimate_nutritional_value(self.sana))
+        self.assertEqual(scores[self.mixta.pk], estimate_nutritional_value(self.mixta))
+
+    def test_rescore_command_filters_by_version(self):
+        Recipe.objects.filter(pk=self.sana.pk).update(nutritional_value=1, score_version=0)
+        Recipe.objects.filter(pk=self.mixta.pk).update(nutritional_value=1, score_version=1)
+        checkpoint = os.path.join(tempfile.mkdtemp(), "checkpoint.json")
+
+        call_command("rescore_recipes", older_than_version=1, workers=1,
+                     checkpoint=checkpoint, stdout=StringIO())
+
+        self.sana.refresh_from_db()
+        self.mixta.refresh_from_db()
+        self.assertEqual(self.sana.nutritional_value, 96)
+        self.assertEqual(self.sana.score_version, 1)
+        self.assertEqual(self.mixta.nutritional_value, 1)
+        self.assertFalse(os.path.exists(checkpoint))
+
+    def test_rescore_command_skips_recipes_deleted_mid_run(self):
+        from core.management.commands.rescore_recipes import Command
+        score_chunk = Command.score_chunk
+        deleted_id = self.mixta.pk
+
+        def score_then_delete(command, chunk):
+            scores = score_chunk(command, chunk)
+            with self.captureOnCommitCallbacks(execute=True):
+                self.mixta.delete()
+            return scores
+
+        checkpoint = os.path.join(tempfile.mkdtemp(), "checkpoint.json")
+        with patch.object(Command, "score_chunk", score_then_delete), self.captureOnCommitCallbacks(execute=True):
+            call_command("rescore_recipes", engine="local", workers=1, checkpoint=checkpoint, stdout=StringIO())
+
+        # La marca de borrado sigue siendo el último cambio de la receta
+        self.assertEqual(RecipeChange.objects.filter(recipe_id=deleted_id).latest("seq").action, "delete")
+        self.assertEqual(RecipeChange.objects.filter(recipe_id=self.sana.pk).latest("seq").action, "upsert")
+
+
+class ReviewAggregatesTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="chef", password="12345")
+        self.recipe = Recipe.objects.create(
+            user=self.user,
+            title="Arepa",
+            description="Descripción",
+            category="acompañamiento",
+            preparation_time=timedelta(minutes=15),
+            portions=1
+        )
+
+    def test_review_create_and_delete_update_aggregates(self):
+        Review.objects.create(user=self.user, recipe=self.recipe, score=5)
+        review = Review.objects.create(user=self.user, recipe=self.recipe, score=2)
+
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.review_count, 2)
+        self.assertEqual(self.recipe.media_score, 3.5)
+        self.assertEqual(self.recipe.score_histogram, [0, 0, 1, 0, 0, 1])
+
+        review.delete()
+        self.recipe.refresh_from_db()
+        self.assertEqual((self.recipe.review_count, self.recipe.score_sum), (1, 5))
+        self.assertEqual(self.recipe.media_score, 5.0)
+
+    def test_rebuild_review_stats_repairs_drift(self):
+        Review.objects.create(user=self.user, recipe=self.recipe, score=4)
+        Recipe.objects.filter(pk=self.recipe.pk).update(review_count=9, score_sum=0, media_score=0)
+
+        call_command("rebuild_review_stats", stdout=StringIO())
+
+        self.recipe.refresh_from_db()
+        self.assertEqual((self.recipe.review_count, self.recipe.score_sum), (1, 4))
+        self.assertEqual(self.recipe.media_score, 4.0)
+
+
+class ResilientModelClientTest(TestCase):
+    def test_retries_then_opens_circuit(self):
+        model = FakeScoringModel(error=ConnectionError("503"))
+        client = ResilientModelClient(
+            model, rate=1000, burst=10, max_retries=1, backoff_base=0,
+            failure_threshold=2, reset_timeout=60,
+        )
+
+        with self.assertRaises(ConnectionError):
+            client.generate_content("hola")
+        self.assertEqual(len(model.prompts), 2)  # llamada + 1 reintento
+
+        with self.assertRaises(CircuitOpenError):
+            client.generate_content("hola")
+        self.assertEqual(len(model.prompts), 2)
+
+        stats = client.get_stats()
+        self.assertEqual((stats["retries"], stats["rejected_open"]), (1, 1))
+        self.assertEqual(stats["circuit_state"], "open")
+
+    def test_half_open_probe_closes_circuit(self):
+        model = FakeScoringModel(90)
+        client = ResilientModelClient(model, rate=1000, failure_threshold=1, reset_timeout=0)
+        client.breaker.record_failure()
+
+        self.assertEqual(client.generate_content("hola").text, "90")
+        self.assertEqual(client.get_stats()["circuit_state"], "closed")
+
+    def test_probe_deadline_releases_half_open_circuit(self):
+        model = FakeScoringModel(90)
+        client = ResilientModelClient(model, rate=1000, burst=1, timeout=0, failure_threshold=1, reset_timeout=0)
+        client.bucket.tokens = 0
+        client.breaker.record_failure()
+
+        # La llamada de prueba no consigue turno antes del plazo
+        with self.assertRaises(DeadlineExceededError):
+            client.generate_content("hola")
+        self.assertEqual(client.get_stats()["circuit_state"], "open")
+
+        client.timeout = 5
+        self.assertEqual(client.generate_content("hola").text, "90")
+        self.assertEqual(client.get_stats()["circuit_state"], "closed")
+
+
+class AdminCatalogTestCase(PatchedModelTestCase):
+    """Administrador, un autor con dos recetas y una reseña por receta; sin pruebas propias."""
+
+    def setUp(self):
+        super().setUp()
+        self.admin = User.objects.create_user(username="admin", password="12345", role="admin")
+        self.autor = User.objects.create_user(username="autor", password="12345")
+        self.recipes = [
+            Recipe.objects.create(
+                user=self.autor,
+                title=f"Receta {i}",
+                description="Descripción",
+                category="postre",
+                preparation_time=timedelta(minutes=5),
+                portions=1
+            )
+            for i in range(2)
+        ]
+        Review.objects.create(user=self.admin, recipe=self.recipes[0], score=2)
+        Review.objects.create(user=self.admin, recipe=self.recipes[1], score=5)
+        self.client.login(username="admin", password="12345")
+
+
+class DashboardStatsTest(AdminCatalogTestCase):
+    def test_dashboard_reads_materialized_stats(self):
+        review = Review.objects.get(recipe=self.recipes[0])
+        review.score = 4
+        review.save()
+        self.recipes[1].delete()
+
+        response = self.client.get(reverse("admin_dashboard"))
+        self.assertEqual(response.context["total_users"], 2)
+        self.assertEqual(response.context["total_recipes"], 1)
+        self.assertEqual(response.context["total_reviews"], 1)
+        self.assertEqual(response.context["global_avg_score"], 4)
+        self.assertEqual([recipe.pk for recipe in response.context["top_recipes"]], [self.recipes[0].pk])
+        self.assertEqual([(user.username, user.recipe_count) for user in response.context["top_users"]], [("autor", 1)])
+        self.assertEqual([(user.username, user.review_count) for user in response.context["top_reviewers"]], [("admin", 1)])
+        # Solo las recetas tienen filas en LeaderboardEntry; los usuarios se leen de sus contadores
+        self.assertEqual(set(LeaderboardEntry.objects.values_list("board", flat=True)), {"recipes"})
+
+        # Las señales dejaron todo igual a lo que calcula la reconciliación
+        self.assertEqual(reconcile_dashboard_stats(), {})
+        DashboardStat.objects.filter(name="recipes").update(value=7)
+        self.assertEqual(reconcile_dashboard_stats(), {"recipes": (7, 1)})
+
+
+class ActivityRollupTest(AdminCatalogTestCase):
+    def test_activity_rollups(self):
+        Recipe.toggle_favorite(self.autor, self.recipes[0].pk)
+        Review.objects.filter(recipe=self.recipes[1]).delete()
+        url = reverse("admin_activity")
+
+        week = self.client.get(url, {"metric": "reviews", "granularity": "week"}).json()
+        self.assertEqual(week["total"], 1)
+        self.assertEqual(week["buckets"][-1]["count"], 1)
+        day = self.client.get(url, {"metric": "favorites"}).json()
+        self.assertEqual(day["buckets"][-1]["count"], 1)
+        self.assertEqual(self.client.get(url, {"metric": "likes"}).status_code, 400)
+
+        # La reconstrucción desde las tablas da los mismos intervalos
+        before = set(ActivityRollup.objects.exclude(metric="favorites").filter(count__gt=0).values_list(
+            "metric", "granularity", "bucket", "count"
+        ))
+        call_command("backfill_activity_rollups", stdout=StringIO())
+        after = set(ActivityRollup.objects.exclude(metric="favorites").values_list(
+            "metric", "granularity", "bucket", "count"
+        ))
+        self.assertEqual(before, after)
+
+
+class UserActivityCountsTest(AdminCatalogTestCase):
+    def test_user_counts(self):
+        Recipe.toggle_favorite(self.admin, self.recipes[0].pk)
+        self.recipes[1].favorited_by.add(self.admin, self.autor)
+        self.admin.favorite_recipes.remove(self.recipes[0].pk, 9999)
+        self.recipes[1].delete()
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse("admin_user_list"), {"order": "reviews"})
+        users = list(response.context["users"])
+        self.assertEqual([user.username for user in users], ["admin", "autor"])
+        self.assertEqual([(u.recipe_count, u.review_count, u.favorite_count) for u in users], [(0, 1, 0), (1, 0, 0)])
+        self.assertFalse([q for q in queries if "core_recipe" in q["sql"]])
+
+        # Las señales coinciden con el recálculo por subconsultas
+        counts = list(User.objects.order_by("pk").values_list("recipe_count", "review_count", "favorite_count"))
+        call_command("rebuild_user_counts", stdout=StringIO())
+        self.assertEqual(
+            list(User.objects.order_by("pk").values_list("recipe_count", "review_count", "favorite_count")), counts
+        )
+
+
+class AdminEstimatedCountPaginationTest(AdminCatalogTestCase):
+    def test_admin_lists_estimated_count(self):
+        # Sin filtros el total sale de DashboardStat, sin COUNT sobre la tabla
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse("admin_recipe_list"), {"order": "recent"})
+        paginator = response.context["paginator"]
+        self.assertTrue(paginator.count_is_estimated)
+        self.assertEqual(paginator.count, 2)
+        self.assertFalse([q for q in queries if "COUNT(" in q["sql"] and "core_recipe" in q["sql"]])
+
+        # Con filtros el conteo es exacto hasta el límite
+        response = self.client.get(reverse("admin_user_list"), {"search": "aut"})
+        self.assertFalse(response.context["paginator"].count_is_estimated)
+        self.assertEqual(response.context["paginator"].count, 1)
+
+        # Por encima del límite solo se navega con anterior/siguiente
+        paginator = EstimatedCountPaginator(User.objects.order_by("pk"), 1, exact_count_limit=1)
+        self.assertIsNone(paginator.count)
+        self.assertIsNone(paginator.num_pages)
+        first, second = paginator.page(1), paginator.page(2)
+        self.assertTrue(first.has_next())
+        self.assertFalse(second.has_next())
+        self.assertEqual(second.end_index(), 2)
+        self.assertEqual([user.username for user in second], ["autor"])
+
+        # ?page=last funciona aunque el total sea estimado o desconocido
+        with patch.object(EstimatedCountPaginator, "exact_count_limit", 0):
+            response = self.client.get(reverse("admin_user_list"), {"page": "last", "search": "a"})
+        self.assertEqual(response.status_code, 200)
+        self.assertIsNone(response.context["paginator"].num_pages)
+        self.assertFalse(response.context["page_obj"].has_next())
+
+
+class ExcelReportTest(AdminCatalogTestCase):
+    def test_excel_report_streams_aggregated_summary(self):
+        from openpyxl import load_workbook
+        response = self.client.get(reverse("admin_recipe_report"), {"format": "excel"})
+        self.assertTrue(response.streaming)
+        workbook = load_workbook(BytesIO(b"".join(response.streaming_content)))
+
+        sheet = workbook["Recetas"]
+        self.assertEqual([sheet["B5"].value, sheet["B6"].value, sheet["B7"].value], [2, 2, "3.5 ⭐"])
+        self.assertEqual(sheet["A9"].style, "yum_header")
+        self.assertEqual([sheet.row_dimensions[1].height, sheet.row_dimensions[9].height], [25, 20])
+        self.assertEqual([row[1] for row in sheet.iter_rows(min_row=10, values_only=True)], ["Receta 1", "Receta 0"])
+        self.assertEqual(sheet["A11"].style, "yum_cell_center_alt")
+        stats = list(workbook.worksheets[1].iter_rows(values_only=True))
+        self.assertIn(("Postre", 2), stats)
+        self.assertIn(("autor", 2), stats)
+
+
+class RecipeSearchTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="chef", password="12345")
+        self.papa = IngredientType.objects.create(nombre="papa criolla", category="vegetal")
+        with self.captureOnCommitCallbacks(execute=True):
+            self.acompanamiento = Recipe.objects.create(
+                user=self.user,
+                title="Acompañamiento rápido",
+                description="Ideal para el almuerzo",
+                category="acompañamiento",
+                preparation_time=timedelta(minutes=15),
+                portions=2
+            )
+            Ingredient.objects.create(recipe=self.acompanamiento, ingredient_type=self.papa, quantity=3, unit="u")
+            self.sopa = Recipe.objects.create(
+                user=self.user,
+                title="Sopa de la abuela",
+                description="Con papa y un acompañamiento de arroz",
+                category="entrada",
+                preparation_time=timedelta(minutes=40),
+                portions=4
+            )
+            Instruction.objects.create(
+                recipe=self.sopa, title="Hervir", details="Hervir el caldo a fuego lento", complexity=1, n_step=1
+            )
+
+    def test_search_folds_accents_matches_prefixes_and_ranks(self):
+        self.assertEqual(search_recipe_ids("acompanamiento"), [self.acompanamiento.pk, self.sopa.pk])
+        self.assertEqual(search_recipe_ids("criol"), [self.acompanamiento.pk])
+        self.assertEqual(search_recipe_ids("caldo lento"), [self.sopa.pk])
+        self.assertEqual(search_recipe_ids("caldo almuerzo"), [])
+
+        # Filtro y ranking se resuelven en la misma consulta, sin lista de ids
+        with self.assertNumQueries(1):
+            search_recipe_ids("acompanamiento")
+
+    def test_index_follows_changes(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.papa.nombre = "yuca"
+            self.papa.save()
+            self.sopa.delete()
+
+        self.assertEqual(search_recipe_ids("yuca"), [self.acompanamiento.pk])
+        self.assertEqual(search_recipe_ids("caldo"), [])
+
+    def test_api_search(self):
+        response = self.client.get(reverse("recipes_api"), {"q": "sopa abuela"})
+        self.assertEqual([recipe["id"] for recipe in response.json()["recipes"]], [self.sopa.pk])
+
+
+class IngredientIndexTest(TestCase):
+    def setUp(self):
+        ingredient_index.built_at = None
+        self.user = User.objects.create_user(username="chef", password="12345")
+        self.huevo, self.harina, self.leche, self.mani = [
+            IngredientType.objects.create(nombre=nombre, category="animal")
+            for nombre in ("huevo", "harina", "leche", "maní")
+        ]
+        self.tortilla = self._recipe("Tortilla", [self.huevo])
+        self.pancakes = self._recipe("Pancakes", [self.huevo, self.harina, self.leche])
+        self.galletas = self._recipe("Galletas", [self.harina, self.mani])
+
+    def _recipe(self, title, tipos):
+        with self.captureOnCommitCallbacks(execute=True):
+            recipe = Recipe.objects.create(
+                user=self.user,
+                title=title,
+                description="Descripción",
+                category="postre",
+                preparation_time=timedelta(minutes=10),
+                portions=2
+            )
+            for tipo in tipos:
+                Ingredient.objects.create(recipe=recipe, ingredient_type=tipo, quantity=1, unit="u")
+        return recipe
+
+    def test_queries(self):
+        find = ingredient_index.find
+        self.assertEqual(find(all_of=[self.huevo.pk, self.harina.pk]), [self.pancakes.pk])
+        self.assertEqual(find(any_of=[self.leche.pk, self.mani.pk]), [self.pancakes.pk, self.galletas.pk])
+        self.assertEqual(find(any_of=[self.harina.pk], exclude=[self.mani.pk]), [self.pancakes.pk])
+        self.assertEqual(
+            find(pantry=[self.huevo.pk, self.harina.pk], max_missing=1),
+            [self.tortilla.pk, self.pancakes.pk, self.galletas.pk],
+        )
+        self.assertEqual(find(pantry=[self.huevo.pk, self.harina.pk]), [self.tortilla.pk])
+        # Sin nada de la despensa, a la tortilla solo le falta su único ingrediente
+        self.assertEqual(find(pantry=[self.mani.pk], max_missing=1), [self.tortilla.pk, self.galletas.pk])
+
+    def test_index_is_refreshed_incrementally(self):
+        ingredient_index.find(all_of=[self.mani.pk])
+        with self.captureOnCommitCallbacks(execute=True):
+            Ingredient.objects.create(recipe=self.tortilla, ingredient_type=self.mani, quantity=1, unit="u")
+            self.galletas.ingredients.filter(ingredient_type=self.mani).delete()
+
+        self.assertEqual(ingredient_index.find(all_of=[self.mani.pk]), [self.tortilla.pk])
+
+        # Un ingrediente que cambia de receta actualiza la receta anterior y la nueva
+        ingredient = self.tortilla.ingredients.get(ingredient_type=self.mani)
+        with self.captureOnCommitCallbacks(execute=True):
+            ingredient.recipe = self.pancakes
+            ingredient.save()
+        self.assertEqual(ingredient_index.find(all_of=[self.mani.pk]), [self.pancakes.pk])
+
+    def test_filter_sends_ids_in_a_single_parameter(self):
+        queryset = filter_by_ingredients(
+            Recipe.objects.all(), pantry=[self.huevo.pk, self.harina.pk], max_missing=1
+        )
+        self.assertEqual(
+            list(queryset.values_list("pk", flat=True)),
+            [self.tortilla.pk, self.pancakes.pk, self.galletas.pk],
+        )
+        # Un parámetro para el filtro y uno por cada cantidad de faltantes
+        self.assertLessEqual(len(queryset.query.sql_with_params()[1]), 5)
+        self.assertEqual(
+            set(filter_by_ingredients(Recipe.objects.all(), exclude=[self.mani.pk]).values_list("pk", flat=True)),
+            {self.tortilla.pk, self.pancakes.pk},
+        )
+
+    def test_api_exclusions(self):
+        response = self.client.get(reverse("recipes_api"), {"exclude": f"{self.huevo.pk}"})
+        self.assertEqual({recipe["id"] for recipe in response.json()["recipes"]}, {self.galletas.pk})
+        self.assertEqual(self.client.get(reverse("recipes_api"), {"all": "x"}).status_code, 400)
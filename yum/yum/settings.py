@@ -19,12 +19,66 @@ load_dotenv()
 # Cargar la clave de la API de Gemini desde las variables de entorno
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 
+# Motor de valor nutricional: "gemini" o "local" (estimador sin red).
+# El respaldo se usa cuando Gemini falla: "local" o None (puntaje fijo de 50)
+NUTRITION_SCORING_ENGINE = os.getenv("NUTRITION_SCORING_ENGINE", "gemini")
+NUTRITION_SCORING_FALLBACK = "local"
+
+# Cliente del modelo: "gemini" o "http" (servidor simulado, ver manage.py fake_nutrition_server)
+NUTRITION_MODEL_BACKEND = os.getenv("NUTRITION_MODEL_BACKEND", "gemini")
+NUTRITION_MODEL_URL = os.getenv("NUTRITION_MODEL_URL", "http://127.0.0.1:8765/")
+NUTRITION_GEMINI_MODEL = "gemini-1.5-flash"
+NUTRITION_BATCH_SIZE = 10  # recetas por llamada al modelo
+NUTRITION_SCORE_VERSION = 1  # incrementar al cambiar prompt o modelo (ver manage.py rescore_recipes)
+
+# Protección del cliente del modelo (ver core/services/resilient_client.py)
+NUTRITION_CLIENT_OPTIONS = {
+    "rate": 1.0,               # llamadas por segundo
+    "burst": 5,                # ráfaga máxima
+    "max_in_flight": 4,        # llamadas simultáneas
+    "timeout": 30.0,           # segundos por llamada, incluyendo reintentos
+    "max_retries": 2,
+    "backoff_base": 1.0,
+    "backoff_max": 20.0,
+    "failure_threshold": 5,    # fallos seguidos para abrir el circuito
+    "reset_timeout": 60.0,     # segundos con el circuito abierto
+}
+
+# Cola de cálculo del valor nutricional (manage.py process_nutrition_jobs)
+NUTRITION_JOB_MAX_ATTEMPTS = 5
+NUTRITION_JOB_RETRY_DELAY = 30  # segundos antes del primer reintento
+NUTRITION_TYPE_RESCORE_PER_MINUTE = 60  # recetas encoladas por minuto al editar un tipo de ingrediente
+
+# Caché de puntajes por huella de contenido
+NUTRITION_SCORE_CACHE_MAX_ENTRIES = 10000
+NUTRITION_SCORE_CACHE_TTL = 60 * 60 * 24 * 30  # 30 días
+NUTRITION_SCORE_CACHE_EVICT_INTERVAL = 300  # segundos entre limpiezas al guardar puntajes
+
 # API Key de NewsAPI.org
 NEWS_API_KEY = os.getenv("NEWS_API_KEY")
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
+# Caché de respuestas de la API pública (ver core/services/api_cache.py).
+# La versión del catálogo está en la base de datos y la comparten todos los procesos;
+# para compartir también las respuestas guardadas usar el backend de archivos:
+#   API_CACHE_BACKEND=django.core.cache.backends.filebased.FileBasedCache
+#   API_CACHE_LOCATION=/ruta/a/cache
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    },
+    "api": {
+        "BACKEND": os.getenv("API_CACHE_BACKEND", "django.core.cache.backends.locmem.LocMemCache"),
+        "LOCATION": os.getenv("API_CACHE_LOCATION", "yum-api"),
+        "OPTIONS": {"MAX_ENTRIES": 5000},
+    },
+}
+API_CACHE_ALIAS = "api"
+API_CACHE_TIMEOUT = 300  # segundos
+API_CACHE_LOCK_TIMEOUT = 10  # segundos que se espera a que otro proceso arme la respuesta
+
 
 # Quick-start development settings - unsuitable for production
 # See https://docs.djangoproject.com/en/5.2/howto/deployment/checklist/
@@ -61,6 +115,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'core.middleware.RescoringMiddleware',
 ]
 
 ROOT_URLCONF = 'yum.urls'
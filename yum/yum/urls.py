@@ -19,7 +19,7 @@ from django.contrib import admin
 from django.urls import path, include
 from django.conf import settings
 from django.conf.urls.static import static
-from core.api_views import recipes_api
+from core.api_views import recipe_changes_api, recipes_api
 
 urlpatterns = [
     path('admin/', admin.site.urls),
@@ -27,6 +27,7 @@ urlpatterns = [
     path('admin_dash/', include('yum_admins.urls')),  # Rutas para yum_admins
     path('user_dash/', include('yum_users.urls')),    # Rutas para yum_users
     path('api/recipes/', recipes_api, name='recipes_api'),  # API pública de recetas
+    path('api/recipes/changes/', recipe_changes_api, name='recipe_changes_api'),  # sincronización incremental
 ]
 
 if settings.DEBUG:
@@ -1,94 +1,166 @@
 # Autor: Ana Sofía Alfonso
 
 
-from typing import List
-from django.http import HttpResponse
-from openpyxl import Workbook
-from openpyxl.styles import Font, Alignment, PatternFill, Border, Side
-from openpyxl.utils import get_column_letter
+import tempfile
 from datetime import datetime
-from io import BytesIO
+
+from django.db.models import Avg, Case, Count, F, FloatField, Q, Value, When
+from django.db.models.functions import Cast
+from django.http import FileResponse
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Font, Alignment, PatternFill, Border, Side, NamedStyle
 from django.utils.translation import gettext as _
 
+from core.models import Recipe
 from .report_interface import IReportGenerator
 
+# Filas de recetas que se leen por consulta al recorrer el queryset
+CHUNK_SIZE = 2000
+
+# Fila de los encabezados de la tabla de recetas (después del título y el resumen)
+HEADER_ROW = 9
+
+
+def _named_styles():
+    """
+    Estilos con nombre del reporte. Cada celda guarda solo el nombre, así
+    el libro tiene un estilo por tipo de celda y no uno por celda.
+    """
+    border = Border(
+        left=Side(style='thin'),
+        right=Side(style='thin'),
+        top=Side(style='thin'),
+        bottom=Side(style='thin')
+    )
+    zebra = PatternFill(start_color='f5f5f5', end_color='f5f5f5', fill_type='solid')
+    styles = [
+        NamedStyle(
+            name='yum_title',
+            font=Font(name='Arial', size=16, bold=True, color='23b387'),
+            alignment=Alignment(horizontal='center', vertical='center'),
+        ),
+        NamedStyle(
+            name='yum_subtitle',
+            font=Font(name='Arial', size=10, color='666666'),
+            alignment=Alignment(horizontal='center'),
+        ),
+        NamedStyle(name='yum_section', font=Font(name='Arial', size=12, bold=True, color='23b387')),
+        NamedStyle(name='yum_label', font=Font(name='Arial', size=10, bold=True)),
+        NamedStyle(name='yum_value', font=Font(name='Arial', size=10)),
+        NamedStyle(name='yum_bold', font=Font(name='Arial', size=12, bold=True)),
+        NamedStyle(
+            name='yum_header',
+            font=Font(name='Arial', size=12, bold=True, color='FFFFFF'),
+            fill=PatternFill(start_color='23b387', end_color='23b387', fill_type='solid'),
+            alignment=Alignment(horizontal='center', vertical='center'),
+            border=border,
+        ),
+    ]
+    # Celdas de datos: alineación (centro/izquierda) x fondo (normal/alternado)
+    for align in ('center', 'left'):
+        styles.append(NamedStyle(name=f'yum_cell_{align}', alignment=Alignment(horizontal=align), border=border))
+        styles.append(NamedStyle(
+            name=f'yum_cell_{align}_alt', alignment=Alignment(horizontal=align), border=border, fill=zebra
+        ))
+    return styles
+
 
 class ExcelReportGenerator(IReportGenerator):
     """
     Implementación concreta del generador de reportes en formato Excel.
     Utiliza openpyxl para crear hojas de cálculo profesionales.
+
+    El libro se arma en modo de solo escritura (las filas se vuelcan a
+    disco a medida que se agregan) recorriendo las recetas una sola vez con
+    `.iterator()`; el resumen y las estadísticas salen de agregaciones en la
+    base de datos. El archivo se escribe en un temporal y se envía por
+    partes, así la memoria no crece con la cantidad de recetas.
     """
-    
-    def generate(self, recipes: List, filename: str) -> HttpResponse:
-        """Genera un reporte Excel con las recetas proporcionadas."""
-        response = HttpResponse(content_type=self.get_content_type())
-        response['Content-Disposition'] = f'attachment; filename="{filename}.{self.get_file_extension()}"'
-        
-        # Crear workbook
-        wb = Workbook()
-        ws = wb.active
-        ws.title = "Recetas"
-        
-        # Estilos
-        header_font = Font(name='Arial', size=12, bold=True, color='FFFFFF')
-        header_fill = PatternFill(start_color='23b387', end_color='23b387', fill_type='solid')
-        header_alignment = Alignment(horizontal='center', vertical='center')
-        
-        title_font = Font(name='Arial', size=16, bold=True, color='23b387')
-        title_alignment = Alignment(horizontal='center', vertical='center')
-        
-        border_style = Border(
-            left=Side(style='thin'),
-            right=Side(style='thin'),
-            top=Side(style='thin'),
-            bottom=Side(style='thin')
+
+    # Columnas centradas de la tabla de recetas (1 = #)
+    CENTERED_COLUMNS = {1, 5, 6, 7, 8}
+
+    def generate(self, recipes, filename: str) -> FileResponse:
+        """Genera un reporte Excel con las recetas del queryset proporcionado."""
+        wb = Workbook(write_only=True)
+        for style in _named_styles():
+            wb.add_named_style(style)
+
+        self._write_recipes_sheet(wb, recipes)
+        self._write_stats_sheet(wb, recipes)
+
+        output = tempfile.TemporaryFile()
+        wb.save(output)
+        output.seek(0)
+        # FileResponse lee el temporal por bloques y lo cierra (y borra) al terminar
+        return FileResponse(
+            output,
+            as_attachment=True,
+            filename=f"{filename}.{self.get_file_extension()}",
+            content_type=self.get_content_type(),
         )
-        
-        # Título del reporte
-        ws.merge_cells('A1:F1')
-        ws['A1'] = '🍽️ Reporte de Recetas - YUM'
-        ws['A1'].font = title_font
-        ws['A1'].alignment = title_alignment
-        
-        # Fecha de generación
-        ws.merge_cells('A2:F2')
-        ws['A2'] = f'Generado el: {datetime.now().strftime("%d/%m/%Y %H:%M")}'
-        ws['A2'].alignment = Alignment(horizontal='center')
-        ws['A2'].font = Font(name='Arial', size=10, color='666666')
-        
+
+    @staticmethod
+    def _cell(ws, value, style):
+        cell = WriteOnlyCell(ws, value=value)
+        cell.style = style
+        return cell
+
+    @staticmethod
+    def _distinct(recipes):
+        # Los filtros por ingrediente hacen joins: se agrega sobre las recetas únicas
+        return Recipe.objects.filter(pk__in=recipes.order_by().values("pk"))
+
+    def get_summary(self, recipes):
+        """Total, recetas con reseñas y promedio de rating (0 para las recetas sin reseñas)."""
+        rating = Case(
+            When(review_count__gt=0, then=Cast(F("score_sum"), FloatField()) / Cast(F("review_count"), FloatField())),
+            default=Value(0.0),
+            output_field=FloatField(),
+        )
+        return self._distinct(recipes).aggregate(
+            total=Count("pk"),
+            reviewed=Count("pk", filter=Q(review_count__gt=0)),
+            avg_rating=Avg(rating),
+        )
+
+    def _write_recipes_sheet(self, wb, recipes):
+        ws = wb.create_sheet("Recetas")
+
+        # Anchos de columna: #, Título, Usuario, Categoría, Valor Nutricional, Porciones, Reseñas, Rating
+        for col, width in zip("ABCDEFGH", (8, 35, 20, 20, 18, 12, 12, 12)):
+            ws.column_dimensions[col].width = width
+        ws.merged_cells.add('A1:F1')
+        ws.merged_cells.add('A2:F2')
+        # En modo de solo escritura las alturas se fijan antes de agregar las filas
+        ws.row_dimensions[1].height = 25
+        ws.row_dimensions[HEADER_ROW].height = 20
+
+        # Título del reporte y fecha de generación
+        ws.append([self._cell(ws, '🍽️ Reporte de Recetas - YUM', 'yum_title')])
+        ws.append([self._cell(ws, f'Generado el: {datetime.now().strftime("%d/%m/%Y %H:%M")}', 'yum_subtitle')])
+        ws.append([])
+
         # Resumen
-        ws['A4'] = _('📊 RESUMEN')
-        ws['A4'].font = Font(name='Arial', size=12, bold=True, color='23b387')
-        
-        ws['A5'] = _('Total de Recetas:')
-        ws['B5'] = len(recipes)
-        ws['A6'] = _('Recetas con Reseñas:')
-        ws['B6'] = sum(1 for r in recipes if r.review_count > 0)
-        ws['A7'] = _('Promedio de Rating:')
-        avg_rating = sum(r.avg_rating or 0 for r in recipes) / len(recipes) if recipes else 0
-        ws['B7'] = f"{avg_rating:.1f} ⭐"
-        
-        # Estilo al resumen
-        for row in range(5, 8):
-            ws[f'A{row}'].font = Font(name='Arial', size=10, bold=True)
-            ws[f'B{row}'].font = Font(name='Arial', size=10)
-        
-        # Encabezados de la tabla (fila 9)
+        summary = self.get_summary(recipes)
+        ws.append([self._cell(ws, _('📊 RESUMEN'), 'yum_section')])
+        for label, value in (
+            (_('Total de Recetas:'), summary["total"]),
+            (_('Recetas con Reseñas:'), summary["reviewed"]),
+            (_('Promedio de Rating:'), f"{summary['avg_rating'] or 0:.1f} ⭐"),
+        ):
+            ws.append([self._cell(ws, label, 'yum_label'), self._cell(ws, value, 'yum_value')])
+        ws.append([])
+
+        # Encabezados de la tabla (fila HEADER_ROW)
         headers = [_('#'), _('Título'), _('Usuario'), _('Categoría'), _('Valor Nutricional'), _('Porciones'), _('Reseñas'), 'Rating']
-        ws.append([])  # Espacio
-        header_row = 9
-        
-        for col_num, header in enumerate(headers, 1):
-            cell = ws.cell(row=header_row, column=col_num)
-            cell.value = header
-            cell.font = header_font
-            cell.fill = header_fill
-            cell.alignment = header_alignment
-            cell.border = border_style
-        
-        # Datos de las recetas
-        for idx, recipe in enumerate(recipes, 1):
-            row = [
+        ws.append([self._cell(ws, header, 'yum_header') for header in headers])
+
+        # Datos de las recetas: una sola pasada, sin los prefetch que el reporte no usa
+        rows = recipes.select_related("user").prefetch_related(None).iterator(chunk_size=CHUNK_SIZE)
+        for idx, recipe in enumerate(rows, 1):
+            values = [
                 idx,
                 recipe.title,
                 recipe.user.username,
@@ -98,84 +170,38 @@ class ExcelReportGenerator(IReportGenerator):
                 recipe.review_count,
                 f"{recipe.avg_rating:.1f}" if recipe.avg_rating else "N/A"
             ]
-            ws.append(row)
-            
-            # Estilo a la fila
-            current_row = header_row + idx
-            for col_num in range(1, len(headers) + 1):
-                cell = ws.cell(row=current_row, column=col_num)
-                cell.alignment = Alignment(horizontal='center' if col_num in [1, 5, 6, 7, 8] else 'left')
-                cell.border = border_style
-                
-                # Fondo alternado
-                if idx % 2 == 0:
-                    cell.fill = PatternFill(start_color='f5f5f5', end_color='f5f5f5', fill_type='solid')
-        
-        # Ajustar anchos de columna
-        column_widths = {
-            'A': 8,   # #
-            'B': 35,  # Título
-            'C': 20,  # Usuario
-            'D': 20,  # Categoría
-            'E': 18,  # Valor Nutricional
-            'F': 12,  # Porciones
-            'G': 12,  # Reseñas
-            'H': 12,  # Rating
-        }
-        
-        for col, width in column_widths.items():
-            ws.column_dimensions[col].width = width
-        
-        # Ajustar altura de filas
-        ws.row_dimensions[1].height = 25
-        ws.row_dimensions[header_row].height = 20
-        
-        # Crear hoja de estadísticas adicionales
+            # Fondo alternado
+            suffix = '_alt' if idx % 2 == 0 else ''
+            ws.append([
+                self._cell(ws, value, f"yum_cell_{'center' if col in self.CENTERED_COLUMNS else 'left'}{suffix}")
+                for col, value in enumerate(values, 1)
+            ])
+
+    def _write_stats_sheet(self, wb, recipes):
         stats_ws = wb.create_sheet(_("Estadísticas"))
-        stats_ws['A1'] = _('📈 Estadísticas Detalladas')
-        stats_ws['A1'].font = title_font
-        stats_ws.merge_cells('A1:B1')
-        
-        # Categorías más populares
-        from collections import Counter
-        categories = Counter([r.get_category_display() for r in recipes])
-        
-        stats_ws['A3'] = _('Categorías Más Populares:')
-        stats_ws['A3'].font = Font(name='Arial', size=12, bold=True)
-        
-        row = 4
-        for category, count in categories.most_common():
-            stats_ws[f'A{row}'] = category
-            stats_ws[f'B{row}'] = count
-            row += 1
-        
-        # Top usuarios con más recetas
-        from collections import Counter
-        users = Counter([r.user.username for r in recipes])
-        
-        stats_ws[f'A{row+1}'] = _('Top Usuarios con Más Recetas:')
-        stats_ws[f'A{row+1}'].font = Font(name='Arial', size=12, bold=True)
-        
-        row += 2
-        for username, count in users.most_common(5):
-            stats_ws[f'A{row}'] = username
-            stats_ws[f'B{row}'] = count
-            row += 1
-        
-        # Ajustar anchos en hoja de estadísticas
         stats_ws.column_dimensions['A'].width = 30
         stats_ws.column_dimensions['B'].width = 15
-        
-        # Guardar el archivo
-        output = BytesIO()
-        wb.save(output)
-        output.seek(0)
-        response.write(output.getvalue())
-        output.close()
-        return response
-    
+        stats_ws.merged_cells.add('A1:B1')
+
+        stats_ws.append([self._cell(stats_ws, _('📈 Estadísticas Detalladas'), 'yum_title')])
+        stats_ws.append([])
+
+        # Categorías más populares
+        distinct = self._distinct(recipes)
+        labels = dict(Recipe.CATEGORY_CHOICES)
+        stats_ws.append([self._cell(stats_ws, _('Categorías Más Populares:'), 'yum_bold')])
+        for row in distinct.values("category").annotate(count=Count("pk")).order_by("-count", "category"):
+            stats_ws.append([labels.get(row["category"], row["category"]), row["count"]])
+        stats_ws.append([])
+
+        # Top usuarios con más recetas
+        stats_ws.append([self._cell(stats_ws, _('Top Usuarios con Más Recetas:'), 'yum_bold')])
+        top_users = distinct.values("user__username").annotate(count=Count("pk")).order_by("-count", "user__username")[:5]
+        for row in top_users:
+            stats_ws.append([row["user__username"], row["count"]])
+
     def get_content_type(self) -> str:
         return 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-    
+
     def get_file_extension(self) -> str:
-        return 'xlsx'
\ No newline at end of file
+        return 'xlsx'
@@ -4,7 +4,7 @@ from django.contrib import admin
 from django.urls import path, include
 
 from .views import (
-    AdminDashboardView, AdminUserListView, AdminUserDetailView, 
+    AdminDashboardView, AdminActivityView, AdminUserListView, AdminUserDetailView, 
     AdminUserDeleteView, AdminRecipeListView, AdminRecipeDetailView, 
     AdminRecipeUpdateView, AdminRecipeDeleteView, AdminIngredientTypeListView, 
     AdminIngredientTypeDetailView, AdminIngredientTypeUpdateView, 
@@ -15,6 +15,7 @@ from .views import (
 
 urlpatterns = [
     path('dashboard/', AdminDashboardView.as_view(), name='admin_dashboard'),
+    path('dashboard/activity/', AdminActivityView.as_view(), name='admin_activity'),
     
     # Usuarios
     path("users/", AdminUserListView.as_view(), name="admin_user_list"),
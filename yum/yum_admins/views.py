@@ -13,10 +13,18 @@ from django.urls import reverse_lazy
 from core.forms import RecipeForm, MultimediaForm, IngredientTypeForm, InstructionForm, RecipeFilterForm
 from core.models import Multimedia
 from core.mixins import AdminRequiredMixin
+from core.conditional import RecipeConditionalMixin
+from core.pagination import EstimatedCountPaginationMixin
 from django.contrib.contenttypes.models import ContentType
 from django.views import View
 from .services.reports import ReportFactory
+from core.services.search import search_recipes
+from core.services import activity_rollups, dashboard_stats
+from core.services.ingredient_dependencies import recipes_using_types, scoring_fields_changed
 from django.utils.translation import gettext as _
+from django.utils import timezone
+from django.http import JsonResponse
+from datetime import timedelta
 
 
 User = get_user_model()
@@ -33,47 +41,70 @@ class AdminDashboardView(LoginRequiredMixin, UserPassesTestMixin, TemplateView):
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
 
-        context["total_users"] = User.objects.count()
-        context["total_recipes"] = Recipe.objects.count()
-        context["total_reviews"] = Review.objects.count()
-        context["total_ingredient_types"] = IngredientType.objects.count()
+        # Totales y rankings materializados (ver core/services/dashboard_stats.py)
+        totals = dashboard_stats.get_totals()
+        context["total_users"] = totals.get("users", 0)
+        context["total_recipes"] = totals.get("recipes", 0)
+        context["total_reviews"] = totals.get("reviews", 0)
+        context["total_ingredient_types"] = totals.get("ingredient_types", 0)
+        context["global_avg_score"] = totals["global_avg_score"]
 
-        context["top_recipes"] = (
-            Recipe.objects.annotate(
-                avg_rating=Avg("reviews__score"),
-                review_count=Count("reviews")
-            ).order_by("-avg_rating")[:5]
-        )
+        context["top_recipes"] = dashboard_stats.top("recipes", Recipe)
+        context["top_users"] = dashboard_stats.top_users("recipe_count")
+        context["top_reviewers"] = dashboard_stats.top_users("review_count")
 
-        context["top_users"] = (
-            User.objects.annotate(recipe_count=Count("recipes"))
-            .order_by("-recipe_count")[:5]
-        )
+        return context
 
 
-        context["top_reviewers"] = (
-            User.objects.annotate(review_count=Count("reviews"))
-            .order_by("-review_count")[:5]
-        )
+class AdminActivityView(AdminRequiredMixin, View):
+    """
+    Serie de actividad en JSON para las gráficas del panel, leída de los
+    resúmenes por hora/día (ver core/services/activity_rollups.py).
 
-        context["global_avg_score"] = Review.objects.aggregate(
-            global_avg=Avg("score")
-        )["global_avg"] or 0
+    Parámetros: metric (recipes, reviews, users, favorites), granularity
+    (hour, day, week; por defecto day), start y end (ISO 8601; por defecto
+    los últimos 30 días).
+    """
 
-        return context
+    def get(self, request, *args, **kwargs):
+        metric = request.GET.get("metric", "recipes")
+        granularity = request.GET.get("granularity", "day")
+        try:
+            end = activity_rollups.parse_moment(request.GET["end"]) if request.GET.get("end") else timezone.now()
+            start = (
+                activity_rollups.parse_moment(request.GET["start"]) if request.GET.get("start")
+                else end - timedelta(days=30)
+            )
+            buckets = activity_rollups.series(metric, granularity, start, end)
+        except ValueError as e:
+            return JsonResponse({"error": str(e)}, status=400)
+
+        return JsonResponse({
+            "metric": metric,
+            "granularity": granularity,
+            "buckets": [{"start": bucket.isoformat(), "count": count} for bucket, count in buckets],
+            "total": sum(count for _, count in buckets),
+        })
 
 # Gestión de Usuarios
-class AdminUserListView(AdminRequiredMixin, ListView):
+class AdminUserListView(AdminRequiredMixin, EstimatedCountPaginationMixin, ListView):
     model = User
     template_name = "yum_admins/users/list.html"
     context_object_name = "users"
     paginate_by = 20
+    count_stat = "users"
+
+    # Los contadores están guardados en User: ordenar por actividad no necesita joins
+    ORDERINGS = {
+        "recent": ("-date_joined",),
+        "recipes": ("-recipe_count", "-date_joined"),
+        "reviews": ("-review_count", "-date_joined"),
+        "favorites": ("-favorite_count", "-date_joined"),
+    }
 
     def get_queryset(self):
-        queryset = User.objects.annotate(
-            recipe_count=Count("recipes"),
-            review_count=Count("reviews")
-        ).order_by("-date_joined")
+        ordering = self.ORDERINGS.get(self.request.GET.get("order"), self.ORDERINGS["recent"])
+        queryset = User.objects.order_by(*ordering)
 
         search = self.request.GET.get("search")
         if search:
@@ -85,6 +116,11 @@ class AdminUserListView(AdminRequiredMixin, ListView):
 
         return queryset
 
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context["current_order"] = self.request.GET.get("order", "recent")
+        return context
+
 
 class AdminUserDetailView(AdminRequiredMixin, DetailView):
     model = User
@@ -93,12 +129,13 @@ class AdminUserDetailView(AdminRequiredMixin, DetailView):
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        user = self.get_object()
+        user = self.object
         context.update({
             "user_recipes": Recipe.objects.filter(user=user).order_by("-creation_date"),
             "user_reviews": Review.objects.filter(user=user).select_related("recipe").order_by("-creation_date"),
-            "recipe_count": Recipe.objects.filter(user=user).count(),
-            "review_count": Review.objects.filter(user=user).count(),
+            "recipe_count": user.recipe_count,
+            "review_count": user.review_count,
+            "favorite_count": user.favorite_count,
         })
         return context
 
@@ -116,17 +153,22 @@ class AdminUserDeleteView(AdminRequiredMixin, DeleteView):
 
 
 # Gestión de Recetas
-class AdminRecipeListView(AdminRequiredMixin, ListView):
+class AdminRecipeListView(AdminRequiredMixin, EstimatedCountPaginationMixin, ListView):
     model = Recipe
     template_name = "yum_admins/recipe/list.html"
     context_object_name = "recipes"
     paginate_by = 20
+    count_stat = "recipes"
+
+    # Ordenamientos disponibles: usan los agregados guardados en Recipe, sin joins
+    ORDERINGS = {
+        "recent": ("-creation_date",),
+        "rating": ("-media_score", "-review_count"),
+        "reviews": ("-review_count", "-media_score"),
+    }
 
     def get_queryset(self):
-        queryset = Recipe.objects.all().select_related("user").prefetch_related("ingredients").annotate(
-            review_count=Count("reviews"),
-            avg_rating=Avg("reviews__score")
-        )
+        queryset = Recipe.objects.all().select_related("user").prefetch_related("ingredients")
 
         form = RecipeFilterForm(self.request.GET)
         if form.is_valid():
@@ -136,7 +178,7 @@ class AdminRecipeListView(AdminRequiredMixin, ListView):
             max_value = form.cleaned_data.get("max_value")
 
             if name:
-                queryset = queryset.filter(title__icontains=name)
+                queryset = search_recipes(queryset, name)
 
             if ingredient_type:
                 queryset = queryset.filter(ingredients__ingredient_type=ingredient_type)
@@ -151,15 +193,21 @@ class AdminRecipeListView(AdminRequiredMixin, ListView):
         if user_filter:
             queryset = queryset.filter(user__username__icontains=user_filter)
 
-        return queryset.distinct().order_by("-creation_date")
+        order = self.request.GET.get("order", "relevance")
+        if order == "relevance" and self.request.GET.get("name"):
+            # search_recipes ya ordenó por relevancia
+            return queryset.distinct()
+        ordering = self.ORDERINGS.get(order, self.ORDERINGS["recent"])
+        return queryset.distinct().order_by(*ordering)
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         context["filter_form"] = RecipeFilterForm(self.request.GET)
+        context["current_order"] = self.request.GET.get("order", "relevance")
         return context
 
 
-class AdminRecipeDetailView(AdminRequiredMixin, DetailView):
+class AdminRecipeDetailView(AdminRequiredMixin, RecipeConditionalMixin, DetailView):
     model = Recipe
     template_name = "yum_admins/recipe/detail.html"
     context_object_name = "recipe"
@@ -173,10 +221,6 @@ class AdminRecipeDetailView(AdminRequiredMixin, DetailView):
                 "instructions",
                 "reviews__user",
             )
-            .annotate(
-                review_count=Count("reviews", distinct=True),
-                avg_rating=Avg("reviews__score"),
-            )
         )
 
     def get_context_data(self, **kwargs):
@@ -184,7 +228,7 @@ class AdminRecipeDetailView(AdminRequiredMixin, DetailView):
         recipe = self.object
 
         # solo calculamos los adicionales
-        context["review_count"] = recipe.review_count or 0
+        context["review_count"] = recipe.review_count
         context["avg_rating"] = round(recipe.avg_rating, 1) if recipe.avg_rating else None
 
         return context
@@ -250,11 +294,12 @@ class AdminRecipeDeleteView(AdminRequiredMixin, DeleteView):
         messages.success(request, f"Receta '{recipe.title}' eliminada correctamente.")
         return super().delete(request, *args, **kwargs)
 
-class AdminIngredientTypeListView(AdminRequiredMixin, ListView):
+class AdminIngredientTypeListView(AdminRequiredMixin, EstimatedCountPaginationMixin, ListView):
     model = IngredientType
     template_name = "yum_admins/ingredient_type/list.html"
     context_object_name = "ingredient_types"
     paginate_by = 20
+    count_stat = "ingredient_types"
 
     def get_queryset(self):
         queryset = IngredientType.objects.all().select_related("user")
@@ -297,11 +342,18 @@ class AdminIngredientTypeUpdateView(AdminRequiredMixin, UpdateView):
     template_name = "yum_admins/ingredient_type/edit.html"
 
     def form_valid(self, form):
+        previous = IngredientType.objects.filter(pk=form.instance.pk).values(*IngredientType.SCORING_FIELDS).first()
         ingredient_type = form.save()
         messages.success(
             self.request,
             f"Tipo de ingrediente '{ingredient_type.nombre}' actualizado correctamente."
         )
+        if scoring_fields_changed(previous, ingredient_type):
+            affected = len(recipes_using_types([ingredient_type.pk]))
+            messages.info(
+                self.request,
+                f"Se recalculará el valor nutricional de {affected} receta(s) que usan este ingrediente."
+            )
         return redirect(self.get_success_url())
 
     def get_success_url(self):
@@ -391,10 +443,7 @@ class AdminRecipeReportView(AdminRequiredMixin, View):
         report_format = request.GET.get('format', 'pdf').lower()
         
         # Obtener recetas con filtros aplicados (reutilizamos la lógica de AdminRecipeListView)
-        queryset = Recipe.objects.all().select_related("user").prefetch_related("ingredients").annotate(
-            review_count=Count("reviews"),
-            avg_rating=Avg("reviews__score")
-        )
+        queryset = Recipe.objects.all().select_related("user").prefetch_related("ingredients")
         
         # Aplicar filtros si existen
         form = RecipeFilterForm(request.GET)
@@ -405,7 +454,7 @@ class AdminRecipeReportView(AdminRequiredMixin, View):
             max_value = form.cleaned_data.get("max_value")
             
             if name:
-                queryset = queryset.filter(title__icontains=name)
+                queryset = search_recipes(queryset, name)
             if ingredient_type:
                 queryset = queryset.filter(ingredients__ingredient_type=ingredient_type)
             if min_value is not None:
@@ -10,6 +10,7 @@ from .views import (HomeView, IngredientTypeCreateView, IngredientTypeListView,
 
 urlpatterns = [
   path('home/', HomeView.as_view(), name='user_home'),
+  path('home/page/', HomeView.as_view(fragment=True), name='user_home_page'),  # scroll infinito
 
   # IngredientType URLs
   path('ingredienttypes/add/', IngredientTypeCreateView.as_view(), name='ingredienttype_add'),
@@ -39,6 +40,7 @@ urlpatterns = [
 
   # Favorites
   path("favorites/", FavoriteListView.as_view(), name="favorites"),
+  path("favorites/page/", FavoriteListView.as_view(fragment=True), name="favorites_page"),
   path("favorite/<int:recipe_id>/toggle/", ToggleFavoriteView.as_view(), name="toggle_favorite"),
 
   # External Recommendations
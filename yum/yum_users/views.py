@@ -3,6 +3,8 @@
 from django.shortcuts import redirect, get_object_or_404, render
 from django.views.generic import ListView, DetailView
 from django.views import View
+from django.http import Http404, JsonResponse
+from django.utils.http import url_has_allowed_host_and_scheme
 from core.models import Recipe, IngredientType, Ingredient, Instruction, Review, Multimedia
 from django.views.generic.edit import CreateView, UpdateView, DeleteView
 from django.urls import reverse_lazy
@@ -10,29 +12,44 @@ from core.forms import IngredientTypeForm, IngredientForm, RecipeForm, Instructi
 from django.core.exceptions import PermissionDenied
 from django.contrib.contenttypes.models import ContentType
 from core.mixins import CommonUserRequiredMixin
+from core.conditional import RecipeConditionalMixin
+from core.pagination import KeysetPaginationMixin
+from core.services.search import search_recipes
+from core.services.ingredient_index import filter_by_ingredients
 from django.utils.translation import gettext as _
 
 
-class HomeView(CommonUserRequiredMixin, ListView):
+class HomeView(CommonUserRequiredMixin, KeysetPaginationMixin, ListView):
     model = Recipe
     template_name = "yum_users/home.html"
     context_object_name = "recipes"
+    paginate_by = 24
+    fragment_template_name = "yum_users/partials/recipe_page.html"
+    fragment_url_name = "user_home_page"
+    card_template_name = "yum_users/partials/recipe_card.html"
+
+    # Órdenes explícitos; sin ?order= se usa la relevancia de la búsqueda
+    # (si la hay) o las más recientes
+    ORDERINGS = {
+        "recent": ("-creation_date",),
+        "rating": ("-media_score",),
+        "nutrition": ("-nutritional_value",),
+    }
 
     def get_queryset(self):
         queryset = Recipe.objects.all().select_related("user").prefetch_related("ingredients")
 
-        form = RecipeFilterForm(self.request.GET)
+        form = self.filter_form = RecipeFilterForm(self.request.GET)
         if form.is_valid():
             name = form.cleaned_data.get("name")
-            ingredient_type = form.cleaned_data.get("ingredient_type")
             min_value = form.cleaned_data.get("min_value")
             max_value = form.cleaned_data.get("max_value")
 
             if name:
-                queryset = queryset.filter(title__icontains=name)
+                queryset = search_recipes(queryset, name)
 
-            if ingredient_type:
-                queryset = queryset.filter(ingredients__ingredient_type=ingredient_type)
+            # Índice invertido en memoria: sin join con Ingredient ni distinct()
+            queryset = filter_by_ingredients(queryset, **form.ingredient_conditions())
 
             if min_value is not None:
                 queryset = queryset.filter(nutritional_value__gte=min_value)
@@ -40,11 +57,16 @@ class HomeView(CommonUserRequiredMixin, ListView):
             if max_value is not None:
                 queryset = queryset.filter(nutritional_value__lte=max_value)
 
-        return queryset.distinct()
+        order = self.request.GET.get("order")
+        if order in self.ORDERINGS:
+            queryset = queryset.order_by(*self.ORDERINGS[order])
+
+        return queryset.annotate(is_favorite=Recipe.favorite_flag(self.request.user))
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         context["filter_form"] = getattr(self, "filter_form", RecipeFilterForm())
+        context["current_order"] = self.request.GET.get("order", "")
         return context
 
 # IngredientType Views
@@ -165,7 +187,7 @@ class IngredientDetailView(CommonUserRequiredMixin, DetailView):
 
 # Recipe Views
 
-class RecipeDetailView(CommonUserRequiredMixin, DetailView):
+class RecipeDetailView(CommonUserRequiredMixin, RecipeConditionalMixin, DetailView):
     model = Recipe
     template_name = "yum_users/recipe/detail.html"
     context_object_name = "recipe"
@@ -343,24 +365,36 @@ class ReviewCreateView(CommonUserRequiredMixin, CreateView):
 # Favorites
 
 class ToggleFavoriteView(CommonUserRequiredMixin, View):
+    """
+    Marca o desmarca una receta como favorita. Si la petición pide JSON
+    (fetch desde las tarjetas) responde {"recipe_id", "is_favorite"} para
+    actualizar el botón sin recargar; si no, redirige como antes.
+    """
+
     def post(self, request, recipe_id, *args, **kwargs):
-        recipe = get_object_or_404(Recipe, id=recipe_id)
+        is_favorite = Recipe.toggle_favorite(request.user, recipe_id)
+        if is_favorite is None:
+            raise Http404("Receta no encontrada")
 
-        if recipe in request.user.favorite_recipes.all():
-            request.user.favorite_recipes.remove(recipe)  
-        else:
-            request.user.favorite_recipes.add(recipe)  
+        if "application/json" in request.headers.get("Accept", ""):
+            return JsonResponse({"recipe_id": recipe_id, "is_favorite": is_favorite})
 
-        return redirect("user_home")  
+        next_url = request.POST.get("next")
+        if next_url and url_has_allowed_host_and_scheme(next_url, allowed_hosts={request.get_host()}):
+            return redirect(next_url)
+        return redirect("user_home")
 
-class FavoriteListView(CommonUserRequiredMixin, ListView):
+class FavoriteListView(CommonUserRequiredMixin, KeysetPaginationMixin, ListView):
     model = Recipe
     template_name = "yum_users/favorites.html"
     context_object_name = "recipes"
-    
+    paginate_by = 24
+    fragment_template_name = "yum_users/partials/recipe_page.html"
+    fragment_url_name = "favorites_page"
+    card_template_name = "yum_users/partials/favorite_card.html"
 
     def get_queryset(self):
-        return self.request.user.favorite_recipes.all()
+        return self.request.user.favorite_recipes.annotate(is_favorite=Recipe.favorite_flag(self.request.user))
 
 
 class ExternalRecommendationsView(CommonUserRequiredMixin, View):